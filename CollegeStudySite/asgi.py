@@ -3,6 +3,11 @@ ASGI config for CollegeStudySite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The messaging event stream (communication.views.message_stream) only works
+under an ASGI server, e.g. ``pip install uvicorn`` and then
+``uvicorn CollegeStudySite.asgi:application``. Under runserver or another
+WSGI server the stream answers 204 and the chat widget polls the inbox.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
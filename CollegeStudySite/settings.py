@@ -67,6 +67,13 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'CollegeStudySite.wsgi.application'
+# serve with an ASGI server (uvicorn/daphne) for the messaging event stream,
+# see asgi.py; under WSGI the chat widget falls back to polling
+ASGI_APPLICATION = 'CollegeStudySite.asgi.application'
+
+# Pub/sub behind the messaging event stream; the default only reaches
+# clients connected to the same process (see communication/events.py)
+MESSAGING_EVENT_BROKER = os.environ.get("MESSAGING_EVENT_BROKER", "communication.events.InProcessBroker")
 
 
 # Database
@@ -142,4 +149,18 @@ TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN")
 TWILIO_API_KEY_SID = os.environ.get("TWILIO_API_KEY_SID")
 TWILIO_API_KEY_SECRET = os.environ.get("TWILIO_API_KEY_SECRET")
-TWILIO_CONVERSATIONS_SERVICE_SID = os.environ.get("TWILIO_CONVERSATIONS_SERVICE_SID")
\ No newline at end of file
+TWILIO_CONVERSATIONS_SERVICE_SID = os.environ.get("TWILIO_CONVERSATIONS_SERVICE_SID")
+# Shared Twilio client: pooled HTTPS connections and per-request timeout (seconds)
+TWILIO_HTTP_POOL_SIZE = int(os.environ.get("TWILIO_HTTP_POOL_SIZE", 10))
+TWILIO_HTTP_TIMEOUT = float(os.environ.get("TWILIO_HTTP_TIMEOUT", 10))
+# Thread pool for independent Twilio calls and the deadline shared by one fan-out
+TWILIO_MAX_WORKERS = int(os.environ.get("TWILIO_MAX_WORKERS", 8))
+TWILIO_REQUEST_DEADLINE = float(os.environ.get("TWILIO_REQUEST_DEADLINE", 8))
+# Public URL Twilio posts Conversations webhooks to (signature is computed over it);
+# only needed when the app sits behind a proxy that rewrites the host/scheme
+TWILIO_WEBHOOK_URL = os.environ.get("TWILIO_WEBHOOK_URL")
+
+# Recurring sessions: how far ahead occurrences are created (days)
+SESSION_SERIES_HORIZON_DAYS = int(os.environ.get("SESSION_SERIES_HORIZON_DAYS", 56))
+# Sessions older than this many days are moved to the archive tables (days)
+SESSION_ARCHIVE_AFTER_DAYS = int(os.environ.get("SESSION_ARCHIVE_AFTER_DAYS", 30))
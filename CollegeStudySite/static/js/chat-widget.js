@@ -22,14 +22,20 @@ class ChatWidgetManager {
         
         this.urls = {
             getToken: configEl.dataset.getTokenUrl,
+            bootstrap: configEl.dataset.bootstrapUrl,
             listConversations: configEl.dataset.listConversationsUrl,
+            stream: configEl.dataset.streamUrl,
             getMessages: configEl.dataset.getMessagesUrl,
             getOtherUser: configEl.dataset.getOtherUserUrl,
+            markRead: configEl.dataset.markReadUrl,
             getFriends: configEl.dataset.getFriendsUrl
         };
         
         console.log('Chat widget URLs loaded:', this.urls);
         this.unreadCounts = new Map();
+        this.seenMessageSids = new Set();
+        this.inboxPollInterval = 30000; // ms, only used without the event stream
+        this.inboxPoller = null;
         
         this.init();
     }
@@ -107,15 +113,88 @@ class ChatWidgetManager {
 
         console.log('Event listeners attached');
 
-        // Load friends and conversations first
-        this.loadFriendsAndConversations().catch(err => {
-            console.error('Error loading friends:', err);
+        // One request for token, friends and inbox; Twilio starts once the token arrives
+        this.loadFriendsAndConversations()
+            .then(tokenData => this.initializeTwilio(tokenData))
+            .catch(err => {
+                console.error('Error loading chat data:', err);
+            });
+
+        this.connectEventStream();
+    }
+
+    // Server-sent events: inbox updates (and messages, if the Twilio socket is down)
+    connectEventStream() {
+        if (!this.urls.stream || !window.EventSource) return;
+
+        this.eventSource = new EventSource(this.urls.stream);
+
+        this.eventSource.addEventListener('inbox', (e) => {
+            const entry = JSON.parse(e.data);
+            this.applyInboxUpdate(entry);
         });
-        
-        // Initialize Twilio in background
-        this.initializeTwilio().catch(err => {
-            console.error('Error initializing Twilio:', err);
+
+        this.eventSource.addEventListener('message', (e) => {
+            const data = JSON.parse(e.data);
+            const msg = data.message;
+            this.handleNewMessage({
+                sid: msg.sid,
+                conversation: { sid: data.conversation_sid },
+                author: msg.author,
+                body: msg.body,
+                dateCreated: msg.date_created
+            });
         });
+
+        this.eventSource.onerror = () => {
+            if (this.eventSource.readyState === EventSource.CLOSED) {
+                // Refused (204 when the site isn't served over ASGI): no reconnects
+                this.eventSource = null;
+                this.startInboxPolling();
+            } else {
+                console.log('Event stream interrupted, browser will reconnect');
+            }
+        };
+    }
+
+    // Fallback without the event stream; messages still arrive over the Twilio socket
+    startInboxPolling() {
+        if (this.inboxPoller || !this.urls.listConversations) return;
+        console.log('Event stream unavailable, polling the inbox');
+
+        this.inboxPoller = setInterval(async () => {
+            try {
+                const response = await fetch(this.urls.listConversations, { cache: 'no-cache' });
+                if (!response.ok) return;
+                const data = await response.json();
+                (data.conversations || []).forEach(entry => this.applyInboxUpdate(entry));
+            } catch (err) {
+                console.error('Error polling conversations:', err);
+            }
+        }, this.inboxPollInterval);
+    }
+
+    applyInboxUpdate(entry) {
+        if (!this.mergedFriendsList) return;
+
+        const friend = this.mergedFriendsList.find(f => Number(f.id) === Number(entry.other_user_id));
+        if (!friend) return;
+
+        friend.conversation_sid = entry.sid;
+        friend.has_conversation = true;
+        friend.last_message_body = entry.last_message_body || '';
+        friend.last_message_author = entry.last_message_author;
+        friend.last_message_date = entry.last_message_date_created;
+
+        if (this.openChats.has(entry.sid) || !entry.unread_count) {
+            this.unreadCounts.delete(entry.sid);
+        } else {
+            this.unreadCounts.set(entry.sid, entry.unread_count);
+        }
+
+        this.sortMergedFriendsList();
+        this.renderFriendsList();
+        this.updateNotificationBadge();
     }
 
     toggleFriendsPanel() {
@@ -139,17 +218,67 @@ class ChatWidgetManager {
         this.toggleBtn.classList.remove('active');
     }
 
-    async initializeTwilio() {
+    // Token is cached per tab so page loads reuse it until shortly before expiry
+    async getToken(forceRefresh = false) {
+        const storageKey = 'chatToken:' + this.currentUserId;
+        const now = Date.now() / 1000;
+
+        if (!forceRefresh) {
+            try {
+                const stored = JSON.parse(sessionStorage.getItem(storageKey) || 'null');
+                if (stored && stored.token && stored.refresh_at > now) {
+                    return stored;
+                }
+            } catch (e) {
+                sessionStorage.removeItem(storageKey);
+            }
+        }
+
+        const response = await fetch(this.urls.getToken);
+        const data = await response.json();
+        if (data.error) {
+            throw new Error(data.error);
+        }
+
+        this.storeToken(data);
+        return data;
+    }
+
+    storeToken(data) {
+        sessionStorage.setItem('chatToken:' + this.currentUserId, JSON.stringify(data));
+    }
+
+    scheduleTokenRefresh(tokenData) {
+        clearTimeout(this.tokenRefreshTimer);
+        const delayMs = Math.max(0, tokenData.refresh_at - Date.now() / 1000) * 1000;
+
+        this.tokenRefreshTimer = setTimeout(async () => {
+            try {
+                const fresh = await this.getToken(true);
+                if (this.twilioClient) {
+                    await this.twilioClient.updateToken(fresh.token);
+                }
+                this.scheduleTokenRefresh(fresh);
+            } catch (error) {
+                console.error('Error refreshing Twilio token:', error);
+            }
+        }, delayMs);
+    }
+
+    async initializeTwilio(tokenData = null) {
         try {
-            const response = await fetch(this.urls.getToken);
-            const data = await response.json();
-            
-            if (data.error) {
-                console.error('Failed to get Twilio token:', data.error);
-                return;
+            let data = tokenData;
+            if (!data) {
+                try {
+                    data = await this.getToken();
+                } catch (error) {
+                    console.error('Failed to get Twilio token:', error);
+                    return;
+                }
             }
 
             this.twilioClient = new Twilio.Conversations.Client(data.token);
+            this.scheduleTokenRefresh(data);
             
             this.twilioClient.on('stateChanged', (state) => {
                 console.log('Twilio client state:', state);
@@ -205,18 +334,24 @@ class ChatWidgetManager {
         });
     }
 
+    // Returns the access token from the bootstrap response (null if it failed).
+    // The browser revalidates with the ETag, so an unchanged payload is a 304.
     async loadFriendsAndConversations() {
+        let tokenData = null;
         try {
-            const [friendsResponse, conversationsResponse] = await Promise.all([
-                fetch(this.urls.getFriends),
-                fetch(this.urls.listConversations)
-            ]);
-            
-            const friendsData = await friendsResponse.json();
-            const conversationsData = await conversationsResponse.json();
-            
-            this.friends = friendsData.friends || [];
-            this.conversations = conversationsData.conversations || [];
+            const response = await fetch(this.urls.bootstrap, { cache: 'no-cache' });
+            const data = await response.json();
+            if (data.error) {
+                throw new Error(data.error);
+            }
+
+            tokenData = data.token || null;
+            if (tokenData) {
+                this.storeToken(tokenData);
+            }
+
+            this.friends = data.friends || [];
+            this.conversations = data.conversations || [];
             
             // ✅ NEW: Store friend avatars in the map
             this.friends.forEach(friend => {
@@ -234,6 +369,10 @@ class ChatWidgetManager {
                 if (conv.other_user_id) {
                     conversationsByUserId.set(Number(conv.other_user_id), conv);
                 }
+                // Seed unread counts from the server-side inbox index
+                if (conv.unread_count > 0 && !this.unreadCounts.has(conv.sid)) {
+                    this.unreadCounts.set(conv.sid, conv.unread_count);
+                }
             });
             
             console.log('🗺️ Conversation map:', conversationsByUserId);
@@ -263,6 +402,7 @@ class ChatWidgetManager {
             console.log('✅ Merged friends list:', this.mergedFriendsList);
 
             this.renderFriendsList();
+            this.updateNotificationBadge();
             
         } catch (error) {
             console.error('Error loading friends and conversations:', error);
@@ -270,6 +410,7 @@ class ChatWidgetManager {
                 this.friendsList.innerHTML = '<div class="chat-empty-state"><i class="fas fa-user-friends"></i><p>No friends to message yet</p></div>';
             }
         }
+        return tokenData;
     }
 
     async loadUnreadCounts() {
@@ -279,16 +420,22 @@ class ChatWidgetManager {
         }
 
         try {
-            let attempts = 0;
-            while (this.twilioClient.connectionState !== 'connected' && attempts < 50) {
-                console.log(`⏳ Waiting for Twilio connection... (attempt ${attempts + 1})`);
-                await new Promise(resolve => setTimeout(resolve, 200));
-                attempts++;
-            }
-
             if (this.twilioClient.connectionState !== 'connected') {
-                console.error('❌ Twilio client failed to connect after 50 attempts');
-                return;
+                console.log('⏳ Waiting for Twilio connection...');
+                const connected = await new Promise(resolve => {
+                    const onChange = (state) => {
+                        if (state === 'connected' || state === 'denied' || state === 'error') {
+                            this.twilioClient.removeListener('connectionStateChanged', onChange);
+                            resolve(state === 'connected');
+                        }
+                    };
+                    this.twilioClient.on('connectionStateChanged', onChange);
+                });
+
+                if (!connected) {
+                    console.error('❌ Twilio client failed to connect');
+                    return;
+                }
             }
 
             console.log('✅ Twilio connected, fetching conversations...');
@@ -530,8 +677,6 @@ class ChatWidgetManager {
             
             await this.loadMessages(conversationSid, userId);
             
-            await new Promise(resolve => setTimeout(resolve, 500));
-            
             console.log(`📖 Opening chat window for ${conversationSid}, marking as read...`);
             await this.markConversationAsRead(conversationSid);
             
@@ -546,7 +691,21 @@ class ChatWidgetManager {
         }
     }
 
+    postToConversation(urlTemplate, conversationSid, payload) {
+        if (!urlTemplate) return Promise.resolve();
+        return fetch(urlTemplate.replace('CONVERSATION_SID', conversationSid), {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': this.getCsrfToken()
+            },
+            body: JSON.stringify(payload || {})
+        }).catch(error => console.error('Error updating inbox:', error));
+    }
+
     async markConversationAsRead(conversationSid) {
+        this.postToConversation(this.urls.markRead, conversationSid);
+
         try {
             if (!this.twilioClient) {
                 console.log('⚠️ Cannot mark as read - Twilio client not ready');
@@ -745,6 +904,12 @@ class ChatWidgetManager {
     }
 
     handleNewMessage(message) {
+        // The same message can arrive from the Twilio socket and the event stream
+        if (message.sid) {
+            if (this.seenMessageSids.has(message.sid)) return;
+            this.seenMessageSids.add(message.sid);
+        }
+
         const conversationSid = message.conversation.sid;
         const messagesContainer = document.getElementById('messages-' + conversationSid);
         
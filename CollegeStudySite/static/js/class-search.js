@@ -0,0 +1,49 @@
+// Lazy class autocomplete shared by the signup, profile and session forms.
+// Queries /classes/search/ as the user types instead of embedding the whole
+// catalog in the page.
+const ClassSearch = (() => {
+    const SEARCH_URL = '/classes/search/';
+    const DEBOUNCE_MS = 150;
+    const cache = new Map();
+
+    async function query(text) {
+        const key = text.trim().toLowerCase();
+        if (!key) return [];
+        if (cache.has(key)) return cache.get(key);
+
+        const res = await fetch(`${SEARCH_URL}?q=${encodeURIComponent(key)}`, {
+            headers: { 'Accept': 'application/json' }
+        });
+        if (!res.ok) throw new Error(`Class search failed: ${res.status}`);
+        const data = await res.json();
+        cache.set(key, data.results);
+        return data.results;
+    }
+
+    // Call onResults(results) after the user pauses typing in inputEl.
+    // Responses that arrive after a newer keystroke are dropped.
+    function bind(inputEl, onResults) {
+        let timer = null;
+        let latest = 0;
+        inputEl.addEventListener('input', () => {
+            clearTimeout(timer);
+            const text = inputEl.value;
+            const seq = ++latest;
+            timer = setTimeout(async () => {
+                try {
+                    const results = await query(text);
+                    if (seq === latest) onResults(results);
+                } catch (err) {
+                    console.error(err);
+                }
+            }, text.trim() ? DEBOUNCE_MS : 0);
+        });
+    }
+
+    // Newly created classes would otherwise be missing from cached results.
+    function clearCache() {
+        cache.clear();
+    }
+
+    return { query, bind, clearCache };
+})();
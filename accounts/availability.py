@@ -0,0 +1,94 @@
+"""
+Weekly availability as a bitset of 15-minute slots.
+
+Bit (weekday * SLOTS_PER_DAY + slot) of a Python int is set when the user
+is free then, weekday 0 being Monday, in the site's local time. A whole
+week is 672 bits (84 bytes), so combining thousands of students is a few
+big-int AND/XOR operations each rather than a loop over slots.
+"""
+import re
+from datetime import time
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+MASK_BYTES = WEEK_SLOTS // 8
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+_RANGE_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$")
+
+
+def slot_of(t):
+    """Index of the slot starting at or before `t` (24:00 is SLOTS_PER_DAY)."""
+    return (t.hour * 60 + t.minute) // SLOT_MINUTES
+
+
+def slot_time(slot):
+    minutes = (slot % SLOTS_PER_DAY) * SLOT_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+def block_mask(weekday, start_slot, end_slot):
+    """Bits for slots [start_slot, end_slot) of one day."""
+    if end_slot <= start_slot:
+        return 0
+    return ((1 << (end_slot - start_slot)) - 1) << (weekday * SLOTS_PER_DAY + start_slot)
+
+
+def blocks_to_mask(blocks):
+    """`blocks` is an iterable of (weekday, start_slot, end_slot)."""
+    mask = 0
+    for weekday, start_slot, end_slot in blocks:
+        mask |= block_mask(weekday, start_slot, end_slot)
+    return mask
+
+
+def mask_to_blocks(mask):
+    """The contiguous runs in `mask` as (weekday, start_slot, end_slot), per day."""
+    blocks = []
+    for weekday in range(7):
+        day = (mask >> (weekday * SLOTS_PER_DAY)) & ((1 << SLOTS_PER_DAY) - 1)
+        slot = 0
+        while day:
+            # skip to the next set bit, then to the end of its run
+            skip = (day & -day).bit_length() - 1
+            day >>= skip
+            slot += skip
+            run = (~day & (day + 1)).bit_length() - 1
+            blocks.append((weekday, slot, slot + run))
+            day >>= run
+            slot += run
+    return blocks
+
+
+def parse_ranges(text):
+    """
+    "9:00-11:30, 14:00-16:00" -> [(start_slot, end_slot), ...]. Times are
+    rounded outwards to whole slots; "24:00" ends the day. Raises ValueError.
+    """
+    ranges = []
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        m = _RANGE_RE.match(part)
+        if not m:
+            raise ValueError(f'"{part}" is not a range like 14:00-16:00')
+        h1, m1, h2, m2 = map(int, m.groups())
+        start, end = h1 * 60 + m1, h2 * 60 + m2
+        if not (0 <= start < end <= 24 * 60) or m1 > 59 or m2 > 59:
+            raise ValueError(f'"{part}" is not a valid time range')
+        ranges.append((start // SLOT_MINUTES, -(-end // SLOT_MINUTES)))
+    return ranges
+
+
+def format_ranges(runs):
+    def fmt(slot):
+        return "24:00" if slot == SLOTS_PER_DAY else slot_time(slot).strftime("%H:%M")
+    return ", ".join(f"{fmt(start)}-{fmt(end)}" for start, end in runs)
+
+
+def encode_mask(mask):
+    return mask.to_bytes(MASK_BYTES, "little")
+
+
+def decode_mask(data):
+    return int.from_bytes(bytes(data), "little") if data else 0
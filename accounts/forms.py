@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from .models import StudentProfile, TutorProfile, StudentClassSkill
+from .availability import WEEKDAY_NAMES, block_mask, format_ranges, mask_to_blocks, parse_ranges
 from classes.models import Class
 import json
 
@@ -185,4 +186,32 @@ class StudentProfileForm(forms.ModelForm):
                 except (json.JSONDecodeError, ValueError, KeyError) as e:
                     print(f"Error parsing classes data: {e}")
         
-        return instance
\ No newline at end of file
+        return instance
+
+
+class AvailabilityForm(forms.Form):
+    """Weekly free time, one field per day: "9:00-11:00, 14:00-16:00" """
+
+    def __init__(self, *args, mask=0, **kwargs):
+        super().__init__(*args, **kwargs)
+        runs = {}
+        for weekday, start, end in mask_to_blocks(mask):
+            runs.setdefault(weekday, []).append((start, end))
+        for weekday, name in enumerate(WEEKDAY_NAMES):
+            self.fields[f"day_{weekday}"] = forms.CharField(
+                required=False, label=name,
+                initial=format_ranges(runs.get(weekday, [])),
+                widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'e.g. 9:00-11:00, 14:00-16:00'}),
+            )
+
+    def clean(self):
+        cleaned = super().clean()
+        mask = 0
+        for weekday in range(7):
+            try:
+                for start, end in parse_ranges(cleaned.get(f"day_{weekday}", "")):
+                    mask |= block_mask(weekday, start, end)
+            except ValueError as e:
+                self.add_error(f"day_{weekday}", str(e))
+        cleaned["mask"] = mask
+        return cleaned
@@ -8,6 +8,12 @@ def avatar_upload_path(instance, filename):
     return f"avatars/user_{instance.user_id}/{filename}"
 
 
+def initials_avatar_url(name):
+    """Use UI Avatars as fallback - generates user initials"""
+    initials = '+'.join(word[0].upper() for word in name.split()[:2]) if name else 'U'
+    return f"https://ui-avatars.com/api/?name={initials}&background=3b82f6&color=fff&size=200"
+
+
 class StudentProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     major = models.CharField(max_length=100, blank=True, null=True)
@@ -64,11 +70,7 @@ class StudentProfile(models.Model):
         if self.avatar:
             return self.avatar.url  # Django will handle the URL properly
         
-        # Use UI Avatars as fallback - generates user initials
-        name = self.user.get_full_name() or self.user.username
-        initials = '+'.join(word[0].upper() for word in name.split()[:2]) if name else 'U'
-        placeholder = f"https://ui-avatars.com/api/?name={initials}&background=3b82f6&color=fff&size=200"
-        return placeholder
+        return initials_avatar_url(self.user.get_full_name() or self.user.username)
 
     def __str__(self):
         return f"{self.user.username} - Student"
@@ -130,11 +132,7 @@ class TutorProfile(models.Model):
         if self.avatar:
             return self.avatar.url  # Django will handle the URL properly
         
-        # Use UI Avatars as fallback - generates user initials
-        name = self.user.get_full_name() or self.user.username
-        initials = '+'.join(word[0].upper() for word in name.split()[:2]) if name else 'U'
-        placeholder = f"https://ui-avatars.com/api/?name={initials}&background=3b82f6&color=fff&size=200"
-        return placeholder
+        return initials_avatar_url(self.user.get_full_name() or self.user.username)
 
     def __str__(self):
         return f"{self.user.username} - Tutor"
@@ -222,4 +220,23 @@ class StudentClassSkill(models.Model):
     
     def get_color(self):
         """Return the hex color for this skill level"""
-        return self.SKILL_COLORS.get(self.skill_level, '#eab308')
\ No newline at end of file
+        return self.SKILL_COLORS.get(self.skill_level, '#eab308')
+
+class WeeklyAvailability(models.Model):
+    """When a user is usually free, as a bitset of 15-minute slots (see availability.py)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='weekly_availability')
+    slots = models.BinaryField(default=bytes, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username}'s availability"
+
+    @property
+    def mask(self):
+        from .availability import decode_mask
+        return decode_mask(self.slots)
+
+    @mask.setter
+    def mask(self, value):
+        from .availability import encode_mask
+        self.slots = encode_mask(value)
@@ -1,3 +1,38 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .availability import SLOTS_PER_DAY, blocks_to_mask, decode_mask, encode_mask, mask_to_blocks, parse_ranges
+from .models import WeeklyAvailability
+
+
+class AvailabilityBitsetTests(TestCase):
+    def test_blocks_round_trip(self):
+        blocks = [(0, 36, 44), (0, 50, 52), (6, 0, SLOTS_PER_DAY)]
+        mask = blocks_to_mask(blocks)
+
+        self.assertEqual(mask_to_blocks(mask), blocks)
+        self.assertEqual(decode_mask(encode_mask(mask)), mask)
+
+    def test_parse_ranges_rounds_outwards(self):
+        self.assertEqual(parse_ranges("9:10-11:05, 14:00-24:00"), [(36, 45), (56, 96)])
+        with self.assertRaises(ValueError):
+            parse_ranges("11:00-9:00")
+
+    def test_edit_availability(self):
+        user = User.objects.create(username="student")
+        self.client.force_login(user)
+
+        self.client.post(reverse("accounts:availability"), {"day_0": "9:00-10:00", "day_2": "13:00-14:30"})
+
+        mask = WeeklyAvailability.objects.get(user=user).mask
+        self.assertEqual(mask_to_blocks(mask), [(0, 36, 40), (2, 52, 58)])
+
+    def test_viewing_availability_does_not_create_a_row(self):
+        user = User.objects.create(username="student")
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("accounts:availability"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(WeeklyAvailability.objects.filter(user=user).exists())
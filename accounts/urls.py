@@ -10,6 +10,7 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('profile/edit/', views.edit_profile_view, name='edit_profile'),  # Move this BEFORE the username pattern
+    path('profile/availability/', views.edit_availability, name='availability'),
     path('profile/<str:username>/', views.profile_view, name='profile'),
     path('profile/', views.profile_view, name='profile'),
     path('connect/', views.connect_list, name='connect'),
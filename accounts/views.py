@@ -8,12 +8,11 @@ from django.contrib.auth.models import User
 from django.conf import settings
 from django.templatetags.static import static
 from django.db.models import Q
-from .models import StudentProfile, TutorProfile, Friendship, FriendRequest
+from .models import StudentProfile, TutorProfile, Friendship, FriendRequest, WeeklyAvailability
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
-from .forms import TutorProfileForm, StudentProfileForm, TutorSignUpForm, StudentSignUpForm
+from .forms import AvailabilityForm, TutorProfileForm, StudentProfileForm, TutorSignUpForm, StudentSignUpForm
 from tutoringsession.utils import haversine, batch_road_distance_and_time
-from classes.models import Class
 
 
 # ------------------------------------
@@ -36,14 +35,12 @@ def signup_student(request):
     else:
         form = StudentSignUpForm()
     
-    # ✅ Pass classes AND skill levels to template
-    classes = list(Class.objects.values('id', 'name'))
+    # ✅ Classes are searched lazily via classes:search; only skill levels are passed
     from .models import StudentClassSkill
     skill_levels = StudentClassSkill.SKILL_LEVELS
     
     return render(request, 'accounts/signup_student.html', {
         'form': form,
-        'classes': classes,
         'skill_levels': skill_levels,
     })
 
@@ -61,10 +58,8 @@ def signup_tutor(request):
     else:
         form = TutorSignUpForm()
     
-    classes = list(Class.objects.values('id', 'name'))
     return render(request, 'accounts/signup_tutor.html', {
         'form': form,
-        'classes': classes,
     })
 
 # ------------------------------------
@@ -186,9 +181,6 @@ def edit_profile_view(request):
         'profile_type': profile_type,
     }
     
-    # ✅ Add classes data for both student AND tutor profiles
-    classes = list(Class.objects.values('id', 'name'))
-    
     if profile_type == 'Student':
         # ✅ FIXED: Get classes with skill levels for students
         from .models import StudentClassSkill
@@ -199,18 +191,39 @@ def edit_profile_view(request):
                 'name': skill.class_taken.name,
                 'skill_level': skill.skill_level
             })
-        context['classes'] = classes
         context['current_classes'] = current_classes
         context['skill_levels'] = StudentClassSkill.SKILL_LEVELS
         
     elif profile_type == 'Tutor':
         current_classes = list(profile.classes.values('id', 'name'))
-        context['classes'] = classes
         context['current_classes'] = current_classes
     
     return render(request, 'accounts/edit_profile.html', context)
 
 
+# ------------------------------------
+# Weekly Availability (used to suggest session times)
+# ------------------------------------
+@login_required
+def edit_availability(request):
+    # only saving creates the row; viewing the page must not declare "never free"
+    availability = WeeklyAvailability.objects.filter(user=request.user).first()
+    if availability is None:
+        availability = WeeklyAvailability(user=request.user)
+
+    if request.method == 'POST':
+        form = AvailabilityForm(request.POST, mask=availability.mask)
+        if form.is_valid():
+            availability.mask = form.cleaned_data['mask']
+            availability.save()
+            messages.success(request, 'Availability updated!')
+            return redirect('accounts:profile')
+    else:
+        form = AvailabilityForm(mask=availability.mask)
+
+    return render(request, 'accounts/availability.html', {'form': form})
+
+
 # ------------------------------------
 # Connections Page & View
 # ------------------------------------
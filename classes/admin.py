@@ -9,16 +9,22 @@ class ClassAdmin(admin.ModelAdmin):
     ordering = ['name']
     readonly_fields = ['created_at']
     
-    # Add custom columns to show usage
+    list_select_related = ['stats']
+    
+    # Add custom columns to show usage (read from ClassStats, no per-row counts)
     def student_count(self, obj):
         """Show how many students are taking this class"""
-        return obj.student_skills.count()
+        stats = getattr(obj, 'stats', None)
+        return stats.students_total if stats else 0
     student_count.short_description = 'Students Taking'
+    student_count.admin_order_field = 'stats__students_total'
     
     def tutor_count(self, obj):
         """Show how many tutors are teaching this class"""
-        return obj.tutors.count()
+        stats = getattr(obj, 'stats', None)
+        return stats.tutors if stats else 0
     tutor_count.short_description = 'Tutors Teaching'
+    tutor_count.admin_order_field = 'stats__tutors'
     
     # Optional: Add actions for bulk management
     actions = ['mark_for_review', 'approve_classes']
@@ -34,12 +40,6 @@ class ClassAdmin(admin.ModelAdmin):
         self.message_user(request, f"{queryset.count()} classes approved.")
     approve_classes.short_description = "Approve selected classes"
     
-    # Show sessions using this class
-    def get_queryset(self, request):
-        """Optimize queries by prefetching related data"""
-        qs = super().get_queryset(request)
-        return qs.prefetch_related('student_skills', 'tutors')
-    
     # Make it easy to see related objects
     fieldsets = (
         ('Class Information', {
@@ -0,0 +1,88 @@
+"""
+Bulk loading of class catalogs (the built-in PREDEFINED_CLASSES list or a
+school's data file with thousands of courses).
+
+Each source is stamped with a hash of its contents in ClassCatalog, so
+re-running migrate or the load command is a single lookup when nothing
+changed. A changed source costs one query for the existing keys and one
+bulk insert for the rest.
+"""
+import csv
+import hashlib
+import json
+from pathlib import Path
+
+from django.db import transaction
+
+from .models import Class, ClassCatalog, bump_catalog_revision, normalize_class_name
+
+BATCH_SIZE = 500
+
+
+def catalog_version(names):
+    digest = hashlib.sha1()
+    for name in sorted(names):
+        digest.update(name.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def read_catalog_file(path):
+    """
+    Class names from a data file: a JSON list of names, a CSV with a "name"
+    column, or plain text with one name per line.
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        with path.open(encoding="utf-8") as f:
+            names = json.load(f)
+    elif path.suffix == ".csv":
+        with path.open(encoding="utf-8", newline="") as f:
+            names = [row["name"] for row in csv.DictReader(f)]
+    else:
+        with path.open(encoding="utf-8") as f:
+            names = f.read().splitlines()
+    return [name.strip() for name in names if name and name.strip()]
+
+
+def load_catalog(names, source, using="default", force=False):
+    """
+    Insert the classes in `names` that are not already in the catalog.
+    Returns the number created, or None when `source` is already at this
+    version and nothing was done.
+    """
+    version = catalog_version(names)
+    if not force and ClassCatalog.objects.using(using).filter(source=source, version=version).exists():
+        return None
+
+    # one Class per normalized key, skipping keys already taken
+    existing = set(Class.objects.using(using).exclude(name_key=None).values_list("name_key", flat=True))
+    new_classes = []
+    for name in names:
+        key = normalize_class_name(name)
+        if key in existing:
+            continue
+        existing.add(key)
+        # bulk_create skips save(), so the key is set here
+        new_classes.append(Class(name=name[:200], name_key=key))
+
+    with transaction.atomic(using=using):
+        # rows inserted concurrently since the key query, or names held by an
+        # unkeyed duplicate, are skipped rather than errors. bulk_create hands
+        # back every object either way, so count the table instead
+        before = Class.objects.using(using).count()
+        Class.objects.using(using).bulk_create(
+            new_classes, batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        created = Class.objects.using(using).count() - before if new_classes else 0
+        ClassCatalog.objects.using(using).update_or_create(
+            source=source, defaults={"version": version},
+        )
+        if created:
+            bump_catalog_revision(using)
+
+    if created:
+        from .search import class_index
+        # bulk_create sends no post_save; rebuild lazily on the next search
+        transaction.on_commit(class_index.reset, using=using)
+    return created
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from classes.catalog import load_catalog, read_catalog_file
+
+
+class Command(BaseCommand):
+    help = "Bulk-load class names from a catalog file (.json list, .csv with a 'name' column, or one name per line)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Catalog data file.")
+        parser.add_argument("--source", help="Catalog identifier for version tracking (defaults to the file name).")
+        parser.add_argument("--force", action="store_true", help="Reload even if this version was already loaded.")
+
+    def handle(self, *args, **options):
+        try:
+            names = read_catalog_file(options["path"])
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Could not read catalog {options['path']}: {e}")
+
+        source = options["source"] or f"file:{options['path'].rsplit('/', 1)[-1]}"
+        created = load_catalog(names, source=source, force=options["force"])
+        if created is None:
+            self.stdout.write(f"Catalog {source} is already at this version; nothing to do.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Loaded {source}: {created} new classes from {len(names)} names."))
@@ -0,0 +1,86 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import StudentClassSkill, StudentProfile, TutorProfile
+from classes.models import Class, normalize_class_name
+from tutoringsession.models import ArchivedSession, SessionSeries, TutoringSession
+
+
+def _repoint(model, owner_field, class_field, keeper_id, dup_ids, prefer=None):
+    """
+    Move `model` rows from the duplicate classes onto the keeper. Tables that
+    are unique on (owner, class) keep one row per owner: the keeper's own row
+    if it has one, otherwise the best duplicate by `prefer`. Returns
+    (moved, dropped).
+    """
+    rows = list(
+        model.objects
+        .filter(**{f"{class_field}__in": [keeper_id, *dup_ids]})
+        .values("pk", owner_field, class_field, *([prefer] if prefer else []))
+    )
+    kept = {}
+    for row in rows:
+        owner = row[owner_field]
+        current = kept.get(owner)
+        if current is None or current[class_field] != keeper_id and (
+            row[class_field] == keeper_id
+            or (prefer and row[prefer] > current[prefer])
+        ):
+            kept[owner] = row
+
+    keep_pks = {row["pk"] for row in kept.values()}
+    drop = [row["pk"] for row in rows if row["pk"] not in keep_pks]
+    move = [row["pk"] for row in kept.values() if row[class_field] != keeper_id]
+
+    if drop:
+        model.objects.filter(pk__in=drop).delete()
+    if move:
+        model.objects.filter(pk__in=move).update(**{f"{class_field}_id": keeper_id})
+    return len(move), len(drop)
+
+
+class Command(BaseCommand):
+    help = "Merge classes whose names normalize to the same key, rewriting every reference to the surviving class."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report the groups without changing anything.")
+
+    def handle(self, *args, **options):
+        groups = defaultdict(list)
+        for class_id, name, name_key in Class.objects.order_by("id").values_list("id", "name", "name_key"):
+            groups[normalize_class_name(name)].append((class_id, name, name_key))
+
+        merged = 0
+        for key, members in groups.items():
+            if len(members) < 2:
+                continue
+            # the row that already owns the key survives; otherwise the oldest
+            keeper = next((m for m in members if m[2] == key), members[0])
+            dup_ids = [m[0] for m in members if m[0] != keeper[0]]
+            self.stdout.write(f"{keeper[1]!r} <- {[m[1] for m in members if m is not keeper]}")
+            merged += len(dup_ids)
+            if options["dry_run"]:
+                continue
+
+            with transaction.atomic():
+                sessions = TutoringSession.objects.filter(subject_id__in=dup_ids).update(subject_id=keeper[0])
+                # SessionSeries.subject cascades; a missed repoint deletes whole series
+                series = SessionSeries.objects.filter(subject_id__in=dup_ids).update(subject_id=keeper[0])
+                ArchivedSession.objects.filter(subject_id__in=dup_ids).update(subject_id=keeper[0])
+                skills = _repoint(StudentClassSkill, "student_id", "class_taken", keeper[0], dup_ids, prefer="skill_level")
+                students = _repoint(StudentProfile.classes.through, "studentprofile_id", "class", keeper[0], dup_ids)
+                tutors = _repoint(TutorProfile.classes.through, "tutorprofile_id", "class", keeper[0], dup_ids)
+                Class.objects.filter(id__in=dup_ids).delete()
+                if keeper[2] != key:
+                    Class.objects.get(id=keeper[0]).save()  # claims the freed name_key
+
+            # moved/dropped rows per table
+            self.stdout.write(
+                f"  sessions={sessions} series={series} skills={skills[0]}/{skills[1]} "
+                f"students={students[0]}/{students[1]} tutors={tutors[0]}/{tutors[1]}"
+            )
+
+        verb = "Would merge" if options["dry_run"] else "Merged"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {merged} duplicate classes."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from classes.stats import refresh_all_class_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute ClassStats for every class. Run after bulk imports and daily so upcoming-session counts stay current."
+
+    def handle(self, *args, **options):
+        count = refresh_all_class_stats()
+        self.stdout.write(self.style.SUCCESS(f"Refreshed stats for {count} classes."))
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:42
+
+import re
+
+from django.db import migrations, models
+
+# frozen copy of classes.models.normalize_class_name as of this migration
+_COURSE_CODE_RE = re.compile(r"^([a-z]{2,5})\s*(\d{3,4}[a-z]?)\b")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_class_name(name):
+    text = _NON_ALNUM_RE.sub(" ", name.casefold()).strip()
+    match = _COURSE_CODE_RE.match(text)
+    if match:
+        return match.group(1) + match.group(2)
+    return text
+
+
+def populate_name_keys(apps, schema_editor):
+    """
+    Fill name_key for existing rows. When several classes normalize to the
+    same key only the oldest gets it; the rest stay NULL until
+    `manage.py merge_duplicate_classes` folds them into it.
+    """
+    Class = apps.get_model('classes', 'Class')
+    seen = set()
+    updated = []
+    for cls in Class.objects.order_by('id').only('id', 'name'):
+        key = normalize_class_name(cls.name)
+        if key in seen:
+            continue
+        seen.add(key)
+        cls.name_key = key
+        updated.append(cls)
+    Class.objects.bulk_update(updated, ['name_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='class',
+            name='name_key',
+            field=models.CharField(editable=False, max_length=200, null=True, unique=True),
+        ),
+        migrations.RunPython(populate_name_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0004_catalogrevision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassStats',
+            fields=[
+                ('class_obj', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='classes.class')),
+                ('level_1_students', models.PositiveIntegerField(default=0)),
+                ('level_2_students', models.PositiveIntegerField(default=0)),
+                ('level_3_students', models.PositiveIntegerField(default=0)),
+                ('level_4_students', models.PositiveIntegerField(default=0)),
+                ('level_5_students', models.PositiveIntegerField(default=0)),
+                ('students_total', models.PositiveIntegerField(default=0)),
+                ('students_needing_help', models.PositiveIntegerField(db_index=True, default=0)),
+                ('tutors', models.PositiveIntegerField(default=0)),
+                ('upcoming_sessions', models.PositiveIntegerField(default=0)),
+                ('open_seats', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Class stats',
+                'verbose_name_plural': 'Class stats',
+            },
+        ),
+    ]
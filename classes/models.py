@@ -1,6 +1,9 @@
-from django.db import models
-from django.db.models.signals import post_migrate
+import re
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 
 # Predefined classes list for initial population
 PREDEFINED_CLASSES = [
@@ -79,8 +82,27 @@ PREDEFINED_CLASSES = [
 ]
 
 
+_COURSE_CODE_RE = re.compile(r"^([a-z]{2,5})\s*(\d{3,4}[a-z]?)\b")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_class_name(name):
+    """
+    Dedup key for a class name: casefolded, punctuation and whitespace
+    collapsed, and reduced to the course code when one leads the name, so
+    "CS 1332 - Data Structures" and "cs1332 data structures" share a key.
+    """
+    text = _NON_ALNUM_RE.sub(" ", name.casefold()).strip()
+    match = _COURSE_CODE_RE.match(text)
+    if match:
+        return match.group(1) + match.group(2)
+    return text
+
+
 class Class(models.Model):
     name = models.CharField(max_length=200, unique=True)
+    # nullable only so pre-existing duplicates can migrate; see merge_duplicate_classes
+    name_key = models.CharField(max_length=200, unique=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -91,15 +113,234 @@ class Class(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        key = normalize_class_name(self.name)
+        if self.pk and self.name_key is None and Class.objects.filter(name_key=key).exclude(pk=self.pk).exists():
+            # a duplicate migration 0002 left unkeyed stays so until merged
+            key = None
+        self.name_key = key
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def get_or_create_by_name(cls, name):
+        """
+        Look the class up by normalized key, creating it if missing. A
+        concurrent insert of the same key loses the race on the unique index
+        and returns the winner's row. Returns (class, created).
+        """
+        key = normalize_class_name(name)
+        existing = cls.objects.filter(name_key=key).first()
+        if existing:
+            return existing, False
+        try:
+            with transaction.atomic():
+                return cls.objects.create(name=name), True
+        except IntegrityError:
+            existing = cls.objects.filter(models.Q(name_key=key) | models.Q(name=name)).first()
+            if existing is None:
+                raise
+            return existing, False
+
+
+class ClassCatalog(models.Model):
+    """Version stamp of each catalog source loaded by classes.catalog"""
+    source = models.CharField(max_length=255, unique=True)
+    version = models.CharField(max_length=40)
+    loaded_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.version[:8]}"
+
+
+class CatalogRevision(models.Model):
+    """
+    Single-row counter bumped on every change to the Class table. The
+    catalog endpoint uses it as its version and ETag.
+    """
+    number = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+def bump_catalog_revision(using='default'):
+    updated = CatalogRevision.objects.using(using).filter(pk=1).update(
+        number=models.F('number') + 1, updated_at=timezone.now(),
+    )
+    if not updated:
+        CatalogRevision.objects.using(using).get_or_create(pk=1, defaults={'number': 1})
+
+
+def current_catalog_revision(using='default'):
+    return CatalogRevision.objects.using(using).filter(pk=1).values_list('number', flat=True).first() or 0
+
+
+class ClassStats(models.Model):
+    """
+    Denormalized supply/demand counters per class, recomputed by
+    classes.stats whenever a skill, tutor link, session or request touching
+    the class changes. "Upcoming" is relative to the last refresh; the
+    refresh_class_stats command brings everything current.
+    """
+    class_obj = models.OneToOneField(Class, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    level_1_students = models.PositiveIntegerField(default=0)
+    level_2_students = models.PositiveIntegerField(default=0)
+    level_3_students = models.PositiveIntegerField(default=0)
+    level_4_students = models.PositiveIntegerField(default=0)
+    level_5_students = models.PositiveIntegerField(default=0)
+    students_total = models.PositiveIntegerField(default=0)
+    # skill levels 1-2 ("Need Help", "Learning")
+    students_needing_help = models.PositiveIntegerField(default=0, db_index=True)
+    tutors = models.PositiveIntegerField(default=0)
+    upcoming_sessions = models.PositiveIntegerField(default=0)
+    open_seats = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Class stats'
+        verbose_name_plural = 'Class stats'
+
+    def __str__(self):
+        return f"{self.class_obj} ({self.students_needing_help} need help, {self.tutors} tutors)"
+
 
 @receiver(post_migrate)
-def create_default_classes(sender, **kwargs):
+def create_default_classes(sender, using='default', **kwargs):
     """Automatically populate classes after running migrations"""
     if sender.name == 'classes':
-        print("Creating default classes...")
-        created_count = 0
-        for class_name in PREDEFINED_CLASSES:
-            cls, created = Class.objects.get_or_create(name=class_name)
-            if created:
-                created_count += 1
-        print(f"Classes setup complete! Created {created_count} new classes.")
\ No newline at end of file
+        from .catalog import load_catalog
+        created_count = load_catalog(PREDEFINED_CLASSES, source='predefined', using=using)
+        if created_count is not None:
+            print(f"Classes setup complete! Created {created_count} new classes.")
+
+
+@receiver(post_save, sender=Class)
+def index_class(sender, instance, **kwargs):
+    """Keep the catalog revision and autocomplete index in step with the table"""
+    from .search import class_index
+    bump_catalog_revision(kwargs.get('using', 'default'))
+    pk, name = instance.pk, instance.name
+    transaction.on_commit(lambda: class_index.update(pk, name))
+
+
+@receiver(post_delete, sender=Class)
+def unindex_class(sender, instance, **kwargs):
+    from .search import class_index
+    bump_catalog_revision(kwargs.get('using', 'default'))
+    pk = instance.pk
+    transaction.on_commit(lambda: class_index.remove(pk))
+
+
+
+# ------------------------------------
+# ClassStats maintenance
+# ------------------------------------
+class _PendingStatsRefresh:
+    """
+    Class (and session) ids whose ClassStats are refreshed once, together,
+    when the current atomic block commits. Kept on the connection, one per
+    level of savepoints.
+    """
+
+    def __init__(self, connection, key):
+        self.connection = connection
+        self.key = key
+        self.class_ids = set()
+        self.session_ids = set()
+        self.position = len(connection.run_on_commit)
+        transaction.on_commit(self.flush, using=connection.alias)
+
+    @classmethod
+    def current(cls, connection):
+        key = tuple(sid for sid in connection.savepoint_ids if sid)
+        queues = connection.__dict__.setdefault('_pending_stats_refresh', {})
+        pending = queues.get(key)
+        if pending is None or not pending.is_queued():
+            # drop queues whose callbacks a rollback discarded
+            for stale in [k for k, p in queues.items() if not p.is_queued()]:
+                del queues[stale]
+            pending = queues[key] = cls(connection, key)
+        return pending
+
+    def is_queued(self):
+        callbacks = self.connection.run_on_commit
+        return self.position < len(callbacks) and callbacks[self.position][1] == self.flush
+
+    def flush(self):
+        queues = self.connection.__dict__.get('_pending_stats_refresh', {})
+        if queues.get(self.key) is self:
+            del queues[self.key]
+        _refresh_stats(self.class_ids, self.session_ids)
+
+
+def _refresh_stats(class_ids, session_ids=()):
+    from tutoringsession.models import TutoringSession
+    from .stats import refresh_class_stats
+    ids = set(class_ids)
+    if session_ids:
+        ids.update(TutoringSession.objects.filter(pk__in=session_ids).values_list('subject_id', flat=True))
+    ids.discard(None)
+    if ids:
+        refresh_class_stats(ids)
+
+
+def _refresh_stats_on_commit(*class_ids, session_ids=()):
+    """
+    Queue a stats refresh for `class_ids` (and the classes of `session_ids`,
+    looked up at commit). Every change in a transaction joins the same
+    queue, so bulk deletes refresh each class once.
+    """
+    class_ids = {i for i in class_ids if i}
+    session_ids = {i for i in session_ids if i}
+    if not class_ids and not session_ids:
+        return
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _refresh_stats(class_ids, session_ids)
+        return
+    pending = _PendingStatsRefresh.current(connection)
+    pending.class_ids |= class_ids
+    pending.session_ids |= session_ids
+
+
+@receiver(post_save, sender='accounts.StudentClassSkill')
+@receiver(post_delete, sender='accounts.StudentClassSkill')
+def class_skill_changed(sender, instance, **kwargs):
+    _refresh_stats_on_commit(instance.class_taken_id)
+
+
+@receiver(m2m_changed, sender='accounts.TutorProfile_classes')
+def tutor_classes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # class.tutors.add(...) and friends
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _refresh_stats_on_commit(instance.pk)
+    elif action == 'pre_clear':
+        instance._cleared_class_ids = list(instance.classes.values_list('id', flat=True))
+    elif action == 'post_clear':
+        _refresh_stats_on_commit(*getattr(instance, '_cleared_class_ids', ()))
+    elif action in ('post_add', 'post_remove'):
+        _refresh_stats_on_commit(*(pk_set or ()))
+
+
+@receiver(pre_save, sender='tutoringsession.TutoringSession')
+def remember_session_subject(sender, instance, **kwargs):
+    # an edit can move a session to another class; both need refreshing
+    instance._previous_subject_id = (
+        sender.objects.filter(pk=instance.pk).values_list('subject_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender='tutoringsession.TutoringSession')
+@receiver(post_delete, sender='tutoringsession.TutoringSession')
+def session_changed(sender, instance, **kwargs):
+    _refresh_stats_on_commit(instance.subject_id, getattr(instance, '_previous_subject_id', None))
+
+
+@receiver(post_save, sender='tutoringsession.SessionRequest')
+@receiver(post_delete, sender='tutoringsession.SessionRequest')
+def session_request_changed(sender, instance, **kwargs):
+    if sender.session.is_cached(instance):
+        _refresh_stats_on_commit(instance.session.subject_id)
+    else:
+        # resolved in one query at commit, not one per request
+        _refresh_stats_on_commit(session_ids=[instance.session_id])
@@ -0,0 +1,123 @@
+"""
+In-memory autocomplete index over class names.
+
+Names are split into tokens ("cs", "1332", "data", "structures") plus a
+joined course code ("cs1332"). A sorted token list gives prefix lookups
+with bisect, and each token maps to the ids of the classes containing
+it, so a query costs a few binary searches and set intersections instead
+of a scan over the catalog. The index is loaded lazily per process and
+kept current by the Class save/delete signals in classes.models.
+"""
+import re
+import threading
+from bisect import bisect_left, insort
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(name):
+    tokens = _TOKEN_RE.findall(name.casefold())
+    # "CS 1332" is also searchable as "cs1332"
+    if len(tokens) >= 2 and tokens[0].isalpha() and tokens[1].isdigit():
+        tokens.append(tokens[0] + tokens[1])
+    return tokens
+
+
+class ClassNameIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._names = {}     # class id -> name
+        self._postings = {}  # token -> set of class ids
+        self._tokens = []    # sorted keys of _postings
+
+    # ---- maintenance ----
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        from .models import Class
+        with self._lock:
+            if self._loaded:
+                return
+            for class_id, name in Class.objects.values_list("id", "name"):
+                self._add(class_id, name)
+            self._loaded = True
+
+    def _add(self, class_id, name):
+        self._names[class_id] = name
+        for token in set(tokenize(name)):
+            ids = self._postings.get(token)
+            if ids is None:
+                self._postings[token] = ids = set()
+                insort(self._tokens, token)
+            ids.add(class_id)
+
+    def _remove(self, class_id):
+        name = self._names.pop(class_id, None)
+        if name is None:
+            return
+        for token in set(tokenize(name)):
+            ids = self._postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(class_id)
+            if not ids:
+                del self._postings[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+
+    def update(self, class_id, name):
+        with self._lock:
+            if not self._loaded:
+                return  # picked up by the first load
+            self._remove(class_id)
+            self._add(class_id, name)
+
+    def remove(self, class_id):
+        with self._lock:
+            if self._loaded:
+                self._remove(class_id)
+
+    def reset(self):
+        with self._lock:
+            self._loaded = False
+            self._names, self._postings, self._tokens = {}, {}, []
+
+    # ---- lookup ----
+
+    def _ids_with_prefix(self, prefix):
+        ids = set()
+        i = bisect_left(self._tokens, prefix)
+        while i < len(self._tokens) and self._tokens[i].startswith(prefix):
+            ids |= self._postings[self._tokens[i]]
+            i += 1
+        return ids
+
+    def search(self, query, limit=10):
+        """Top `limit` classes whose tokens start with every query token."""
+        self._ensure_loaded()
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            # narrowest term first keeps the intersections small
+            candidates = None
+            for term in sorted(set(terms), key=len, reverse=True):
+                ids = self._ids_with_prefix(term)
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+            names = {class_id: self._names[class_id] for class_id in candidates}
+
+        folded = query.strip().casefold()
+
+        def rank(class_id):
+            name = names[class_id].casefold()
+            return (not name.startswith(folded), len(name), name)
+
+        best = sorted(names, key=rank)[:limit]
+        return [{"id": class_id, "name": names[class_id]} for class_id in best]
+
+
+class_index = ClassNameIndex()
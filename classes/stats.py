@@ -0,0 +1,93 @@
+"""
+Recompute ClassStats rows from the source tables.
+
+Every refresh works on a set of class ids with a fixed number of grouped
+queries, so the signal path (the classes one transaction touched) and the
+repair command (all classes, in chunks) share the same code.
+"""
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from accounts.models import StudentClassSkill, TutorProfile
+from tutoringsession.models import TutoringSession
+
+from .models import Class, ClassStats
+
+LEVEL_FIELDS = {level: f"level_{level}_students" for level in range(1, 6)}
+NEEDS_HELP_LEVELS = (1, 2)
+STAT_FIELDS = [
+    *LEVEL_FIELDS.values(), "students_total", "students_needing_help",
+    "tutors", "upcoming_sessions", "open_seats", "updated_at",
+]
+
+
+def refresh_class_stats(class_ids):
+    """Recompute and upsert the stats for `class_ids`. Returns the row count."""
+    ids = list(Class.objects.filter(id__in=list(class_ids)).values_list("id", flat=True))
+    if not ids:
+        return 0
+
+    now = timezone.now()
+    rows = {class_id: ClassStats(class_obj_id=class_id, updated_at=now) for class_id in ids}
+
+    skill_counts = (
+        StudentClassSkill.objects
+        .filter(class_taken_id__in=ids)
+        .values_list("class_taken_id", "skill_level")
+        .annotate(n=Count("id"))
+    )
+    for class_id, level, n in skill_counts:
+        row = rows[class_id]
+        if level in LEVEL_FIELDS:
+            setattr(row, LEVEL_FIELDS[level], getattr(row, LEVEL_FIELDS[level]) + n)
+        row.students_total += n
+        if level in NEEDS_HELP_LEVELS:
+            row.students_needing_help += n
+
+    tutor_counts = (
+        TutorProfile.classes.through.objects
+        .filter(class_id__in=ids)
+        .values_list("class_id")
+        .annotate(n=Count("id"))
+    )
+    for class_id, n in tutor_counts:
+        rows[class_id].tutors = n
+
+    # undated sessions are treated as upcoming
+    sessions = (
+        TutoringSession.objects
+        .filter(subject_id__in=ids)
+        .filter(Q(date__isnull=True) | Q(date__gte=timezone.localdate()))
+        .values_list("id", "subject_id", "capacity")
+        .annotate(taken=Count("requests", filter=Q(requests__status="approved")))
+    )
+    for _, class_id, capacity, taken in sessions:
+        row = rows[class_id]
+        row.upcoming_sessions += 1
+        row.open_seats += max(capacity - taken, 0)
+
+    ClassStats.objects.bulk_create(
+        rows.values(),
+        update_conflicts=True,
+        unique_fields=["class_obj"],
+        update_fields=STAT_FIELDS,
+    )
+    return len(rows)
+
+
+def refresh_all_class_stats(chunk_size=500):
+    ids = list(Class.objects.values_list("id", flat=True))
+    total = 0
+    for start in range(0, len(ids), chunk_size):
+        total += refresh_class_stats(ids[start:start + chunk_size])
+    return total
+
+
+def classes_needing_tutors(limit=50):
+    """Classes with students needing help: fewest tutors first, then most demand."""
+    return (
+        ClassStats.objects
+        .filter(students_needing_help__gt=0)
+        .select_related("class_obj")
+        .order_by("tutors", "-students_needing_help", "class_obj__name")[:limit]
+    )
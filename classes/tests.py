@@ -1,3 +1,339 @@
-from django.test import TestCase
+import gzip
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from django.urls import reverse
+
+from accounts.models import StudentClassSkill, StudentProfile, TutorProfile
+from tutoringsession.models import SessionRequest, SessionSeries, TutoringSession
+
+from .catalog import load_catalog
+from .models import Class, ClassStats, current_catalog_revision, normalize_class_name
+from .search import class_index, tokenize
+
+
+class ClassNameIndexTests(TestCase):
+    def setUp(self):
+        # the predefined catalog is loaded by post_migrate
+        class_index.reset()
+        self.addCleanup(class_index.reset)
+
+    def _names(self, query, limit=10):
+        return [r["name"] for r in class_index.search(query, limit=limit)]
+
+    def test_tokenize_adds_joined_course_code(self):
+        self.assertEqual(tokenize("CS 1332 - Data Structures"), ["cs", "1332", "data", "structures", "cs1332"])
+        self.assertEqual(tokenize("Intro to Philosophy"), ["intro", "to", "philosophy"])
+
+    def test_prefix_hits(self):
+        self.assertEqual(self._names("cs1332"), ["CS 1332 - Data Structures and Algorithms"])
+        self.assertEqual(self._names("data struct"), ["CS 1332 - Data Structures and Algorithms"])
+        self.assertEqual(self._names("linear alg"), ["MATH 1553 - Linear Algebra", "MATH 1554 - Linear Algebra"])
+        self.assertEqual(self._names("cs 9"), [])
+        self.assertEqual(self._names("  "), [])
+
+    def test_limit_keeps_best_ranked(self):
+        # names starting with the query first, then the shortest
+        self.assertEqual(self._names("cs 13"), [
+            "CS 1301 - Intro to Computing",
+            "CS 1332 - Data Structures and Algorithms",
+            "CS 1331 - Intro to Object-Oriented Programming",
+        ])
+        self.assertEqual(self._names("cs 13", limit=2), [
+            "CS 1301 - Intro to Computing",
+            "CS 1332 - Data Structures and Algorithms",
+        ])
+
+    def test_follows_saves_and_deletes(self):
+        self.assertEqual(self._names("quantum"), [])  # loads the index
+        with self.captureOnCommitCallbacks(execute=True):
+            cls = Class.objects.create(name="QNTM 1000 - Quantum Basket Weaving")
+        self.assertEqual(self._names("quantum bask"), [cls.name])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cls.name = "QNTM 1000 - Quantum Knitting"
+            cls.save()
+        self.assertEqual(self._names("basket"), [])
+        self.assertEqual(self._names("qntm1000"), [cls.name])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cls.delete()
+        self.assertEqual(self._names("qntm"), [])
+        self.assertNotIn("knitting", class_index._tokens)  # emptied tokens leave the sorted list
+
+
+class ClassDedupTests(TestCase):
+    def test_normalize_class_name(self):
+        for name in ("CS 1332 - Data Structures", "cs1332 data structures", "CS-1332", "  cs 1332: DSA "):
+            self.assertEqual(normalize_class_name(name), "cs1332")
+        self.assertEqual(normalize_class_name("MATH 1554a Linear Algebra"), "math1554a")
+        self.assertEqual(normalize_class_name("Intro  to Philosophy!"), "intro to philosophy")
+
+    def test_get_or_create_by_name_reuses_near_duplicates(self):
+        existing = Class.objects.get(name="CS 1332 - Data Structures and Algorithms")
+        self.assertEqual(Class.get_or_create_by_name("cs1332 data structures"), (existing, False))
+
+        cls, created = Class.get_or_create_by_name("Underwater Basket Weaving")
+        self.assertTrue(created)
+        self.assertEqual(cls.name_key, "underwater basket weaving")
+        self.assertEqual(Class.get_or_create_by_name("underwater  basket-weaving"), (cls, False))
+
+    def _unmerged_duplicate(self, name):
+        # what migration 0002 leaves for every duplicate but the oldest
+        return Class.objects.bulk_create([Class(name=name, name_key=None)])[0]
+
+    def test_unmerged_duplicate_can_still_be_saved(self):
+        dup = self._unmerged_duplicate("cs1332 (old)")
+        dup.name = "cs1332 (old, renamed)"
+        dup.save()
+        dup.refresh_from_db()
+        self.assertIsNone(dup.name_key)
+
+    def test_merge_repoints_references_and_frees_the_key(self):
+        keeper = Class.objects.create(name="MRG 1000 - Merging")
+        dup = self._unmerged_duplicate("mrg1000 merging (copy)")
+        only_dup = self._unmerged_duplicate("MRG-1000")
+
+        tutor = User.objects.create(username="merge_tutor")
+        both = StudentProfile.objects.create(user=User.objects.create(username="merge_both"))
+        dup_only = StudentProfile.objects.create(user=User.objects.create(username="merge_dup"))
+        StudentClassSkill.objects.create(student=both, class_taken=keeper, skill_level=2)
+        StudentClassSkill.objects.create(student=both, class_taken=dup, skill_level=5)
+        StudentClassSkill.objects.create(student=dup_only, class_taken=only_dup, skill_level=1)
+        TutorProfile.objects.create(user=tutor).classes.add(dup, only_dup)
+        session = TutoringSession.objects.create(tutor=tutor, subject=dup, capacity=1)
+
+        call_command("merge_duplicate_classes", stdout=StringIO())
+
+        self.assertFalse(Class.objects.filter(pk__in=[dup.pk, only_dup.pk]).exists())
+        self.assertEqual(
+            set(StudentClassSkill.objects.filter(class_taken=keeper).values_list("student_id", "skill_level")),
+            {(both.pk, 2), (dup_only.pk, 1)},  # the keeper's own row wins
+        )
+        self.assertEqual(list(tutor.tutorprofile.classes.all()), [keeper])
+        session.refresh_from_db()
+        self.assertEqual(session.subject, keeper)
+
+    def test_merge_keeps_series_of_duplicates(self):
+        keeper = Class.objects.create(name="MRG 3000 - Series")
+        dup = self._unmerged_duplicate("mrg3000 series (copy)")
+        series = SessionSeries.objects.create(
+            tutor=User.objects.create(username="merge_series_tutor"), subject=dup,
+            weekdays=1, start_date=timezone.localdate(), is_remote=True,
+        )
+        call_command("merge_duplicate_classes", stdout=StringIO())
+        series.refresh_from_db()  # deleting the duplicate must not cascade to it
+        self.assertEqual(series.subject, keeper)
+
+    def test_merge_gives_the_key_to_an_unkeyed_survivor(self):
+        first = self._unmerged_duplicate("MRG 2000 - First")
+        self._unmerged_duplicate("mrg2000 second")
+        call_command("merge_duplicate_classes", stdout=StringIO())
+        first.refresh_from_db()
+        self.assertEqual(first.name_key, "mrg2000")
+        self.assertEqual(Class.objects.filter(name__icontains="mrg").count(), 1)
+
+
+class CreateClassViewTests(TestCase):
+    def _post(self, body):
+        return self.client.post(reverse("classes:create_class"), body, content_type="application/json")
+
+    def test_creates_then_reuses_class(self):
+        response = self._post(json.dumps({"name": "Create View 1000"}))
+        self.assertEqual(response.status_code, 201)
+        again = self._post(json.dumps({"name": "create view 1000"}))
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()["id"], response.json()["id"])
+
+    def test_non_object_json_is_a_client_error(self):
+        for body in ("[]", '["Create View 2000"]', '"Create View 2000"', "null"):
+            self.assertEqual(self._post(body).status_code, 400, body)
+        self.assertFalse(Class.objects.filter(name="Create View 2000").exists())
+
+
+class LoadCatalogTests(TestCase):
+    NAMES = ["LDC 1000 - Loading", "LDC 2000 - More Loading", "ldc1000 loading again"]
+
+    def test_counts_only_new_rows(self):
+        revision = current_catalog_revision()
+        self.assertEqual(load_catalog(self.NAMES, source="test"), 2)
+        self.assertEqual(current_catalog_revision(), revision + 1)
+
+        # same version: skipped outright; forced: nothing new to insert
+        self.assertIsNone(load_catalog(self.NAMES, source="test"))
+        self.assertEqual(load_catalog(self.NAMES, source="test", force=True), 0)
+        self.assertEqual(current_catalog_revision(), revision + 1)
+
+    def test_name_held_by_unkeyed_duplicate_is_not_counted(self):
+        Class.objects.bulk_create([Class(name="LDC 3000 - Held", name_key=None)])
+        revision = current_catalog_revision()
+        self.assertEqual(load_catalog(["LDC 3000 - Held"], source="test"), 0)
+        self.assertEqual(current_catalog_revision(), revision)
+
+
+class CatalogViewTests(TestCase):
+    def setUp(self):
+        cache.clear()  # bodies are cached per revision, and revisions repeat across tests
+        self.addCleanup(cache.clear)
+        self.url = reverse("classes:catalog")
+
+    def test_versioned_json_with_etag(self):
+        revision = current_catalog_revision()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], f'"catalog-{revision}"')
+        self.assertEqual(response["X-Catalog-Version"], str(revision))
+        self.assertEqual(response["Cache-Control"], "public, no-cache")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        data = json.loads(response.content)
+        self.assertEqual(data["version"], revision)
+        self.assertEqual(len(data["classes"]), Class.objects.count())
+
+        pinned = self.client.get(self.url, {"v": revision})
+        self.assertIn("immutable", pinned["Cache-Control"])
+
+    def test_revalidation_until_the_catalog_changes(self):
+        etag = self.client.get(self.url)["ETag"]
+        unchanged = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.content, b"")
+
+        Class.objects.create(name="CTLG 1000 - Catalog Changes")
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertIn("CTLG 1000 - Catalog Changes", [c["name"] for c in json.loads(changed.content)["classes"]])
+
+    def test_gzip_when_accepted(self):
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertLess(len(compressed.content), len(plain.content))
+
+
+class ClassStatsTests(TestCase):
+    def setUp(self):
+        self.cls = Class.objects.create(name="STAT 9000 - Counting Things")
+        self.tutor = User.objects.create(username="stats_tutor")
+
+    def _stats(self):
+        return ClassStats.objects.get(class_obj=self.cls)
+
+    def _student(self, username, level):
+        profile = StudentProfile.objects.create(user=User.objects.create(username=username))
+        return StudentClassSkill.objects.create(student=profile, class_taken=self.cls, skill_level=level)
+
+    def test_skill_changes_update_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._student("s1", 1)
+            self._student("s2", 2)
+            skill = self._student("s3", 4)
+        stats = self._stats()
+        self.assertEqual(
+            (stats.level_1_students, stats.level_2_students, stats.level_4_students),
+            (1, 1, 1),
+        )
+        self.assertEqual((stats.students_total, stats.students_needing_help), (3, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            skill.skill_level = 1
+            skill.save()
+        self.assertEqual(self._stats().students_needing_help, 3)
+
+    def test_tutor_links_update_counters(self):
+        profile = TutorProfile.objects.create(user=self.tutor)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.classes.add(self.cls)
+        self.assertEqual(self._stats().tutors, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.classes.clear()
+        self.assertEqual(self._stats().tutors, 0)
+
+    def test_sessions_and_requests_update_open_seats(self):
+        today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            session = TutoringSession.objects.create(tutor=self.tutor, subject=self.cls, capacity=3, date=today)
+            TutoringSession.objects.create(
+                tutor=self.tutor, subject=self.cls, capacity=5, date=today - timedelta(days=1),
+            )
+        stats = self._stats()
+        self.assertEqual((stats.upcoming_sessions, stats.open_seats), (1, 3))
+
+        student = User.objects.create(username="stats_student")
+        with self.captureOnCommitCallbacks(execute=True):
+            SessionRequest.objects.create(session=session, student=student, status="approved")
+        self.assertEqual(self._stats().open_seats, 2)
+
+        other = Class.objects.create(name="STAT 9001 - Moved Here")
+        with self.captureOnCommitCallbacks(execute=True):
+            session.subject = other
+            session.save()
+        self.assertEqual((self._stats().upcoming_sessions, self._stats().open_seats), (0, 0))
+        self.assertEqual(ClassStats.objects.get(class_obj=other).open_seats, 2)
+
+    def test_one_refresh_per_transaction(self):
+        other = Class.objects.create(name="STAT 9002 - Batched")
+        session = TutoringSession.objects.create(tutor=self.tutor, subject=self.cls, capacity=3)
+        with mock.patch("classes.stats.refresh_class_stats") as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self._student("s1", 1)
+                self._student("s2", 2)
+                StudentClassSkill.objects.create(
+                    student=StudentProfile.objects.get(user__username="s1"), class_taken=other, skill_level=3,
+                )
+                for name in ("r1", "r2", "r3"):
+                    SessionRequest.objects.create(session=session, student=User.objects.create(username=name))
+                # deleting through the ORM sends a signal per session and request
+                session.delete()
+        refresh.assert_called_once_with({self.cls.id, other.id})
+
+    def test_request_signal_uses_the_cached_session(self):
+        session = TutoringSession.objects.create(tutor=self.tutor, subject=self.cls, capacity=3)
+        student = User.objects.create(username="stats_student")
+        with self.assertNumQueries(1):  # the INSERT; no subject lookup
+            request = SessionRequest.objects.create(session=session, student=student)
+
+        request = SessionRequest.objects.get(pk=request.pk)
+        with mock.patch("classes.stats.refresh_class_stats") as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic(), self.assertNumQueries(1):  # the UPDATE; the subject is looked up at commit
+                request.status = "approved"
+                request.save()
+        refresh.assert_called_once_with({self.cls.id})
+
+    def test_refresh_command_repairs_drift(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._student("s1", 1)
+        ClassStats.objects.filter(class_obj=self.cls).update(students_needing_help=40, tutors=7)
+        call_command("refresh_class_stats", stdout=StringIO())
+        stats = self._stats()
+        self.assertEqual((stats.students_needing_help, stats.tutors), (1, 0))
+
+
+class ClassStatsTransactionTests(TransactionTestCase):
+    def test_rolled_back_transaction_leaves_nothing_queued(self):
+        cls = Class.objects.create(name="STAT 9003 - Rolled Back")
+        profile = StudentProfile.objects.create(user=User.objects.create(username="s1"))
+        with mock.patch("classes.stats.refresh_class_stats") as refresh:
+            try:
+                with transaction.atomic():
+                    StudentClassSkill.objects.create(student=profile, class_taken=cls, skill_level=1)
+                    raise DatabaseError("rolled back")
+            except DatabaseError:
+                pass
+            refresh.assert_not_called()
+
+            with transaction.atomic():
+                StudentClassSkill.objects.create(student=profile, class_taken=cls, skill_level=2)
+        refresh.assert_called_once_with({cls.id})
@@ -5,4 +5,7 @@ app_name = 'classes'
 
 urlpatterns = [
     path('api/create/', views.create_class, name='create_class'),
+    path('search/', views.search_classes, name='search'),
+    path('catalog/', views.catalog, name='catalog'),
+    path('needs-tutors/', views.needs_tutors, name='needs_tutors'),
 ]
\ No newline at end of file
@@ -1,10 +1,18 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+import gzip
 import json
-from .models import Class
+from .models import Class, current_catalog_revision
+from .search import class_index
+from .stats import classes_needing_tutors
+
+SEARCH_LIMIT = 10
+CATALOG_MAX_AGE = 365 * 24 * 3600
 
 
 @require_http_methods(["POST"])
@@ -12,21 +20,84 @@ def create_class(request):
     """API endpoint to create a new class dynamically"""
     try:
         data = json.loads(request.body)
-        class_name = data.get('name', '').strip()
+        if not isinstance(data, dict):
+            return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+        class_name = str(data.get('name') or '').strip()
         
         if not class_name:
             return JsonResponse({'error': 'Class name is required'}, status=400)
         
-        # Check if class already exists (case-insensitive)
-        existing = Class.objects.filter(name__iexact=class_name).first()
-        if existing:
-            return JsonResponse({'id': existing.id, 'name': existing.name})
-        
-        # Create new class
-        new_class = Class.objects.create(name=class_name)
-        return JsonResponse({'id': new_class.id, 'name': new_class.name}, status=201)
+        # Near-duplicates ("cs1332 data structures") resolve to the existing class
+        cls, created = Class.get_or_create_by_name(class_name)
+        return JsonResponse({'id': cls.id, 'name': cls.name}, status=201 if created else 200)
         
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+def search_classes(request):
+    """Autocomplete: top matching classes for ?q=, served from the in-memory index"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', SEARCH_LIMIT)), 50)
+    except ValueError:
+        limit = SEARCH_LIMIT
+    results = class_index.search(query, limit=max(limit, 1)) if query else []
+    return JsonResponse({'results': results})
+
+
+
+def _catalog_bodies(revision):
+    """(json, gzipped json) for a catalog revision, built once per revision"""
+    key = f"class_catalog:{revision}"
+    bodies = cache.get(key)
+    if bodies is None:
+        payload = json.dumps({
+            'version': revision,
+            'classes': list(Class.objects.order_by('name').values('id', 'name')),
+        }, separators=(',', ':')).encode()
+        bodies = (payload, gzip.compress(payload, compresslevel=9))
+        # keyed by revision, so entries never go stale; old ones just age out
+        cache.set(key, bodies, timeout=None)
+    return bodies
+
+
+@require_http_methods(["GET", "HEAD"])
+def catalog(request):
+    """
+    Full class list as JSON, versioned by CatalogRevision. Clients revalidate
+    with If-None-Match; requests for /classes/catalog/?v=<version> are
+    immutable and cached for a year.
+    """
+    revision = current_catalog_revision()
+    etag = f'"catalog-{revision}"'
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        payload, compressed = _catalog_bodies(revision)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(compressed, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(payload, content_type='application/json')
+        response['X-Catalog-Version'] = str(revision)
+
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if request.GET.get('v') == str(revision):
+        response['Cache-Control'] = f'public, max-age={CATALOG_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+
+def needs_tutors(request):
+    """Public list of classes where students need help and tutors are scarce"""
+    return render(request, 'classes/needs_tutors.html', {
+        'class_stats': classes_needing_tutors(),
+    })
@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import Conversation
 
-# Register your models here.
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('unique_name', 'sid', 'user_a', 'user_b', 'created_at')
+    search_fields = ('sid', 'unique_name', 'user_a__username', 'user_b__username')
+    readonly_fields = ('created_at',)
@@ -0,0 +1,90 @@
+"""
+Pub/sub for real-time messaging events (new messages, inbox updates).
+
+The default broker only reaches subscribers in the current process, which
+is enough for a single ASGI worker. Deployments with several workers can
+point MESSAGING_EVENT_BROKER at a class with the same publish/subscribe
+interface backed by a shared channel (e.g. Redis pub/sub).
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = "communication.events.InProcessBroker"
+
+
+class InProcessBroker:
+    """
+    Fan events out to asyncio queues, one per open stream. publish() may be
+    called from any thread (sync views, webhook handlers); delivery is
+    handed to each subscriber's event loop.
+    """
+    queue_size = 100
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, user_id: int, event: str, data: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(int(user_id), ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, (event, data))
+            except RuntimeError:
+                # loop already closed; the stream's finally block will unregister it
+                continue
+
+    @staticmethod
+    def _offer(queue, item):
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # slow client: drop rather than grow without bound, it resyncs on reconnect
+            pass
+
+    async def subscribe(self, user_id: int, heartbeat: float = 15):
+        """
+        Async iterator of (event, data) for a user. Yields (None, None) every
+        `heartbeat` seconds without events so the caller can keep the
+        connection alive.
+        """
+        entry = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size))
+        with self._lock:
+            self._subscribers[int(user_id)].add(entry)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(entry[1].get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None, None
+        finally:
+            with self._lock:
+                self._subscribers[int(user_id)].discard(entry)
+                if not self._subscribers[int(user_id)]:
+                    del self._subscribers[int(user_id)]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, "MESSAGING_EVENT_BROKER", DEFAULT_BROKER)
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(user_id: int, event: str, data: dict):
+    try:
+        get_broker().publish(user_id, event, data)
+    except Exception as e:
+        # real-time delivery is best effort; never fail the request that caused it
+        print(f"[events.publish] Error publishing {event} to user {user_id}: {e}")
@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from communication import services as dm
+
+
+class Command(BaseCommand):
+    help = "One-time import of existing Twilio conversations into the local Conversation registry and inbox index."
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        client = dm.get_twilio_client()
+        svc = client.conversations.v1.services(dm.CONV_SERVICE_SID)
+
+        known_users = set(User.objects.values_list("id", flat=True))
+        recorded = skipped = 0
+        batch = []
+
+        def flush():
+            # last-message previews are independent calls; fetch a page of them at once
+            lasts = dm.run_parallel(
+                [
+                    (lambda sid=conv.sid: svc.conversations(sid).messages.list(limit=1, order="desc"))
+                    for conv, _ in batch
+                ],
+                timeout=60,
+                return_exceptions=True,
+            )
+            for (conv, pair), last in zip(batch, lasts):
+                dm.record_conversation(conv.sid, *pair)
+                # seed the inbox preview; unread counts start at zero
+                if last and not isinstance(last, Exception):
+                    dm.record_message(
+                        conv.sid, last[0].author, last[0].body,
+                        date_created=last[0].date_created, count_unread=False,
+                    )
+            batch.clear()
+
+        # stream() pages through the whole service instead of stopping at a fixed limit
+        for conv in svc.conversations.stream(page_size=100):
+            pair = dm._pair_from_unique_name(getattr(conv, "unique_name", None))
+            if not pair or pair[0] == pair[1] or not set(pair) <= known_users:
+                skipped += 1
+                continue
+            batch.append((conv, pair))
+            recorded += 1
+            if len(batch) >= 100:
+                flush()
+        flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Recorded {recorded} conversations ({skipped} skipped)."
+        ))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0002_inboxentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Message',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sid', models.CharField(max_length=34, unique=True)),
+                ('index', models.PositiveIntegerField()),
+                ('author', models.CharField(blank=True, max_length=64)),
+                ('body', models.TextField(blank=True)),
+                ('media', models.JSONField(blank=True, default=list)),
+                ('date_created', models.DateTimeField(blank=True, null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='communication.conversation')),
+            ],
+            options={
+                'ordering': ['index'],
+                'indexes': [models.Index(fields=['conversation', '-index'], name='message_conv_index_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communication', '0004_conversation_backfilled_from'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='backfilled_through',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,124 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.auth.models import User
+from accounts.models import Friendship, StudentProfile, TutorProfile
 
 # reusing friendship model for messaging system
+
+
+class Conversation(models.Model):
+    """
+    Local registry of Twilio conversations, one per canonical user pair.
+    Twilio stays the source of truth; this table only saves us from
+    listing every conversation in the service to find one by unique_name.
+    """
+    sid = models.CharField(max_length=34, unique=True)
+    unique_name = models.CharField(max_length=64, unique=True)
+    user_a = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversations_as_a")
+    user_b = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversations_as_b")
+    # index range a backfill pulled from Twilio (from 0: the whole older
+    # history); missing indexes inside it are deletions, not gaps
+    backfilled_from = models.PositiveIntegerField(null=True, blank=True)
+    backfilled_through = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user_a", "user_b"], name="unique_conversation_pair"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # keep the pair in canonical (lo, hi) order, same as Friendship
+        if self.user_a_id and self.user_b_id and self.user_a_id > self.user_b_id:
+            self.user_a_id, self.user_b_id = self.user_b_id, self.user_a_id
+        super().save(*args, **kwargs)
+
+    def participant_ids(self):
+        return (self.user_a_id, self.user_b_id)
+
+    def __str__(self):
+        return f"{self.unique_name} ({self.sid})"
+
+
+class InboxEntry(models.Model):
+    """
+    Per-user row for each conversation, kept current as messages are sent
+    so the inbox can be served with one indexed query.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="inbox_entries")
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="inbox_entries")
+    other_user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_message_body = models.TextField(blank=True)
+    last_message_author = models.CharField(max_length=64, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "conversation"], name="unique_inbox_entry"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-last_message_at"], name="inbox_user_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} inbox: {self.conversation.unique_name} ({self.unread_count} unread)"
+
+
+class Message(models.Model):
+    """
+    Local copy of conversation history, appended from Twilio webhooks and
+    backfilled from the REST API when we find gaps. Idempotent by SID.
+    """
+    sid = models.CharField(max_length=34, unique=True)
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name="messages")
+    index = models.PositiveIntegerField()
+    author = models.CharField(max_length=64, blank=True)
+    body = models.TextField(blank=True)
+    media = models.JSONField(default=list, blank=True)
+    date_created = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["index"]
+        indexes = [
+            models.Index(fields=["conversation", "-index"], name="message_conv_index_idx"),
+        ]
+
+    def as_dict(self):
+        return {
+            "sid": self.sid,
+            "index": self.index,
+            "author": self.author,
+            "body": self.body,
+            "date_created": self.date_created.isoformat() if self.date_created else None,
+            "media": self.media,
+        }
+
+    def __str__(self):
+        return f"{self.conversation.unique_name} #{self.index} ({self.sid})"
+
+
+# ---- friends-list cache invalidation (see services.get_friends) ----
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_friends_on_friendship_change(sender, instance, **kwargs):
+    from .services import invalidate_friends
+    invalidate_friends(instance.user_id, instance.friend_id)
+
+
+@receiver(post_save, sender=StudentProfile)
+@receiver(post_save, sender=TutorProfile)
+@receiver(post_delete, sender=StudentProfile)
+@receiver(post_delete, sender=TutorProfile)
+@receiver(post_save, sender=User)
+def invalidate_friends_on_profile_change(sender, instance, **kwargs):
+    """A changed name or avatar shows up in every friend's cached list."""
+    if sender is User and kwargs.get("update_fields") == frozenset({"last_login"}):
+        return  # every login saves the user; nothing we show changed
+    from .services import friend_ids, invalidate_friends
+    user_id = instance.pk if sender is User else instance.user_id
+    invalidate_friends(*friend_ids(user_id))
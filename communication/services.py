@@ -1,11 +1,25 @@
 import os
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
 from twilio.jwt.access_token import AccessToken
 from twilio.jwt.access_token.grants import ChatGrant
 from twilio.base.exceptions import TwilioRestException
-from accounts.models import Friendship
+from django.core.files.storage import default_storage
+from accounts.models import Friendship, initials_avatar_url
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from . import events
+from .models import Conversation, InboxEntry, Message
 
 # basically just env variables but easier declaration
 ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
@@ -14,12 +28,104 @@ API_KEY_SID = os.environ.get("TWILIO_API_KEY_SID")
 API_KEY_SECRET = os.environ.get("TWILIO_API_KEY_SECRET")
 CONV_SERVICE_SID = os.environ.get("TWILIO_CONVERSATIONS_SERVICE_SID")
 
+# access tokens live an hour; hand out a fresh one in the last five minutes
+TOKEN_TTL = 3600
+TOKEN_REFRESH_MARGIN = 300
+
+# membership follows from the conversation's user pair, which never changes;
+# "not a member" is only kept briefly since the conversation may not be recorded yet
+MEMBERSHIP_CACHE_TTL = 60 * 60
+MEMBERSHIP_NEGATIVE_TTL = 60
+
+# media descriptors never change once sent; an evicted or expired entry
+# just costs one refetch, and ingested messages also keep theirs in Message.media
+MEDIA_CACHE_TTL = 60 * 60 * 24 * 7
+
+# friends lists are invalidated by signals; the TTL is only a backstop
+FRIENDS_CACHE_TTL = 60 * 60 * 24
+
 User = get_user_model()
 
+_twilio_client = None
+_twilio_client_lock = threading.Lock()
+
+def _build_http_client():
+    """Twilio HTTP client on a pooled requests session (TWILIO_HTTP_POOL_SIZE connections)."""
+    pool_size = getattr(settings, "TWILIO_HTTP_POOL_SIZE", 10)
+    http_client = TwilioHttpClient(
+        pool_connections=True,
+        timeout=getattr(settings, "TWILIO_HTTP_TIMEOUT", 10),
+    )
+    http_client.session.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    return http_client
+
 def get_twilio_client():
-    if not all([ACCOUNT_SID, AUTH_TOKEN]):
-        raise RuntimeError("Twilio ACCOUNT_SID/AUTH_TOKEN missing")
-    return Client(ACCOUNT_SID, AUTH_TOKEN)
+    """
+    Process-wide Twilio client, created on first use. The underlying
+    urllib3 pool is thread-safe, so one client (and its warm TLS
+    connections) is shared by every request and worker thread.
+    """
+    global _twilio_client
+    if _twilio_client is None:
+        with _twilio_client_lock:
+            if _twilio_client is None:
+                if not all([ACCOUNT_SID, AUTH_TOKEN]):
+                    raise RuntimeError("Twilio ACCOUNT_SID/AUTH_TOKEN missing")
+                _twilio_client = Client(ACCOUNT_SID, AUTH_TOKEN, http_client=_build_http_client())
+    return _twilio_client
+
+def set_twilio_client(client):
+    """Swap the shared client (e.g. for a fake in tests); None resets to lazy creation."""
+    global _twilio_client
+    with _twilio_client_lock:
+        _twilio_client = client
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "TWILIO_MAX_WORKERS", 8),
+                    thread_name_prefix="twilio",
+                )
+    return _executor
+
+def run_parallel(calls, timeout=None, return_exceptions=False):
+    """
+    Run independent zero-argument Twilio calls on the shared pool and return
+    their results in the order given. Keep database work in the request
+    thread: each pool thread would open a connection of its own. All calls
+    share one deadline (TWILIO_REQUEST_DEADLINE seconds by default); a call
+    still running then yields a TimeoutError. With return_exceptions the
+    exception is put in that call's slot, otherwise the first one is raised.
+    """
+    calls = list(calls)
+    if not calls:
+        return []
+    if timeout is None:
+        timeout = getattr(settings, "TWILIO_REQUEST_DEADLINE", 8)
+
+    futures = [_get_executor().submit(call) for call in calls]
+    wait(futures, timeout=timeout)
+
+    results = []
+    for future in futures:
+        if not future.done():
+            future.cancel()
+            error = TimeoutError("Twilio call exceeded the request deadline")
+        else:
+            error = future.exception()
+        if error is not None:
+            if not return_exceptions:
+                raise error
+            results.append(error)
+        else:
+            results.append(future.result())
+    return results
 
 def _unique_name_for_pair(a_id: int, b_id: int) -> str:
     lo, hi = sorted([int(a_id), int(b_id)])
@@ -31,13 +137,130 @@ def create_twilio_access_token(django_user) -> str:
 
     identity = f"user_{django_user.id}"
     token = AccessToken(ACCOUNT_SID, API_KEY_SID, API_KEY_SECRET, identity=identity)
-    token.ttl = 3600
+    token.ttl = TOKEN_TTL
     grant = ChatGrant(service_sid=CONV_SERVICE_SID)
     token.add_grant(grant)
     jwt = token.to_jwt()
     return jwt.decode("utf-8") if isinstance(jwt, (bytes, bytearray)) else jwt
 
+def get_cached_access_token(django_user) -> dict:
+    """
+    Reuse the user's access token until it is within TOKEN_REFRESH_MARGIN
+    of expiring, then mint a new one. Returns token, identity and expiry.
+    """
+    key = f"twilio_token:{django_user.id}"
+    cached = cache.get(key)
+    now = time.time()
+    if cached and cached["expires_at"] - now > TOKEN_REFRESH_MARGIN:
+        return cached
+
+    entry = {
+        "token": create_twilio_access_token(django_user),
+        "identity": f"user_{django_user.id}",
+        "expires_at": int(now) + TOKEN_TTL,
+    }
+    cache.set(key, entry, timeout=TOKEN_TTL - TOKEN_REFRESH_MARGIN)
+    return entry
+
+def _pair_from_unique_name(unique: str):
+    """Inverse of _unique_name_for_pair; returns (lo, hi) or None."""
+    if not unique or not unique.startswith("userpair_"):
+        return None
+    try:
+        lo, hi = unique[len("userpair_"):].split("_")
+        return int(lo), int(hi)
+    except ValueError:
+        return None
+
+def record_conversation(conversation_sid: str, a_id: int, b_id: int) -> Conversation:
+    lo, hi = sorted([int(a_id), int(b_id)])
+    conv, _ = Conversation.objects.update_or_create(
+        unique_name=_unique_name_for_pair(lo, hi),
+        defaults={"sid": conversation_sid, "user_a_id": lo, "user_b_id": hi},
+    )
+    InboxEntry.objects.get_or_create(user_id=lo, conversation=conv, defaults={"other_user_id": hi})
+    InboxEntry.objects.get_or_create(user_id=hi, conversation=conv, defaults={"other_user_id": lo})
+    invalidate_membership(conversation_sid, lo, hi)
+    return conv
+
+def _user_id_from_identity(identity):
+    if not identity or not str(identity).startswith("user_"):
+        return None
+    try:
+        return int(str(identity).replace("user_", ""))
+    except ValueError:
+        return None
+
+def record_message(conversation_sid: str, author: str, body: str, date_created=None, count_unread: bool = True) -> int:
+    """
+    Update the inbox previews of a conversation for a new message.
+    Every participant other than the author gets their unread count bumped.
+    Older messages than the current preview are ignored. Returns rows updated.
+    """
+    date_created = date_created or timezone.now()
+    entries = InboxEntry.objects.filter(conversation__sid=conversation_sid).filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=date_created)
+    )
+    updated = entries.update(
+        last_message_body=body or "",
+        last_message_author=author or "",
+        last_message_at=date_created,
+    )
+    if count_unread:
+        author_id = _user_id_from_identity(author)
+        InboxEntry.objects.filter(conversation__sid=conversation_sid)\
+            .exclude(user_id=author_id)\
+            .update(unread_count=F("unread_count") + 1)
+    return updated
+
+def mark_conversation_read(conversation_sid: str, user_id: int) -> int:
+    updated = InboxEntry.objects.filter(conversation__sid=conversation_sid, user_id=user_id)\
+        .update(unread_count=0)
+    if updated:
+        transaction.on_commit(lambda: publish_inbox_update(conversation_sid, [user_id]))
+    return updated
+
+def get_inbox(user_id: int):
+    """The user's conversations, most recent first (one query)."""
+    entries = (
+        InboxEntry.objects
+        .filter(user_id=user_id)
+        .select_related("conversation", "other_user")
+        .order_by(F("last_message_at").desc(nulls_last=True), "-updated_at")
+    )
+    return [_inbox_entry_dict(e) for e in entries]
+
+def _inbox_entry_dict(e):
+    return {
+        "sid": e.conversation.sid,
+        "friendly_name": e.other_user.username,
+        "other_user_id": e.other_user_id,
+        "other_username": e.other_user.username,
+        "last_message_body": e.last_message_body,
+        "last_message_author": e.last_message_author or None,
+        "last_message_date_created": e.last_message_at.isoformat() if e.last_message_at else None,
+        "unread_count": e.unread_count,
+    }
+
+def publish_inbox_update(conversation_sid: str, user_ids=None):
+    """Push the current inbox row(s) of a conversation to the users' event streams."""
+    entries = InboxEntry.objects.filter(conversation__sid=conversation_sid)\
+        .select_related("conversation", "other_user")
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    for e in entries:
+        events.publish(e.user_id, "inbox", _inbox_entry_dict(e))
+
+def get_conversation_sid_for_pair(a_id: int, b_id: int):
+    unique = _unique_name_for_pair(a_id, b_id)
+    return Conversation.objects.filter(unique_name=unique).values_list("sid", flat=True).first()
+
 def get_or_create_conversation(a_id: int, b_id: int) -> str:
+    # Single indexed lookup; Twilio is only consulted when we have no record.
+    existing_sid = get_conversation_sid_for_pair(a_id, b_id)
+    if existing_sid:
+        return existing_sid
+
     client = get_twilio_client()
     unique = _unique_name_for_pair(a_id, b_id)
     
@@ -57,34 +280,22 @@ def get_or_create_conversation(a_id: int, b_id: int) -> str:
     }
     attributes_json = json.dumps(attributes)
     
+    svc = client.conversations.v1.services(CONV_SERVICE_SID)
     try:
-        svc = client.conversations.v1.services(CONV_SERVICE_SID)
-        for conv in svc.conversations.list(limit=1000):
-            if getattr(conv, "unique_name", None) == unique:
-                try:
-                    client.conversations.v1.services(CONV_SERVICE_SID)\
-                        .conversations(conv.sid).update(attributes=attributes_json)
-                except Exception:
-                    pass
-                return conv.sid
-    except Exception:
-        pass
-    
-    try:
-        svc = client.conversations.v1.services(CONV_SERVICE_SID)
         conv = svc.conversations.create(
             unique_name=unique,
             attributes=attributes_json,
             friendly_name=f"{username_a} & {username_b}"
         )
-        return conv.sid
     except TwilioRestException as e:
-        if getattr(e, "status", None) == 409:
-            svc = client.conversations.v1.services(CONV_SERVICE_SID)
-            for conv in svc.conversations.list(limit=1000):
-                if getattr(conv, "unique_name", None) == unique:
-                    return conv.sid
-        raise
+        if getattr(e, "status", None) != 409:
+            raise
+        # Created before we had a local record (or by a concurrent request):
+        # Twilio accepts the unique_name in place of the SID.
+        conv = svc.conversations(unique).fetch()
+
+    record_conversation(conv.sid, a_id, b_id)
+    return conv.sid
 
 def ensure_participant(conversation_sid: str, user_id: int):
     identity = f"user_{user_id}"
@@ -99,43 +310,251 @@ def ensure_participant(conversation_sid: str, user_id: int):
             return
         raise
 
+def _media_cache_key(message_sid: str) -> str:
+    return f"twilio_media:{message_sid}"
+
+def get_message_media(conversation_sid: str, message_sids) -> dict:
+    """
+    Media descriptors for each message SID. Media never changes once sent,
+    so descriptors are cached for MEDIA_CACHE_TTL and only misses (including
+    entries the cache has culled) hit Twilio, all in one parallel round.
+    """
+    keys = {sid: _media_cache_key(sid) for sid in message_sids}
+    cached = cache.get_many(keys.values())
+    result = {sid: cached[key] for sid, key in keys.items() if key in cached}
+    misses = [sid for sid in keys if sid not in result]
+    if not misses:
+        return result
+
+    svc = get_twilio_client().conversations.v1.services(CONV_SERVICE_SID)
+    media_lists = run_parallel(
+        [
+            (lambda sid=sid: svc.conversations(conversation_sid).messages(sid).media.list())
+            for sid in misses
+        ],
+        return_exceptions=True,
+    )
+    fetched = {}
+    for sid, media_list in zip(misses, media_lists):
+        if isinstance(media_list, Exception):
+            continue
+        fetched[sid] = [
+            {
+                "sid": media.sid,
+                "content_type": media.content_type,
+                "size": media.size,
+                "filename": media.filename,
+            }
+            for media in media_list
+        ]
+    cache.set_many({keys[sid]: media for sid, media in fetched.items()}, timeout=MEDIA_CACHE_TTL)
+    result.update(fetched)
+    return result
+
 def get_conversation_messages(conversation_sid: str, limit: int = 50):
+    """The newest `limit` messages straight from Twilio, oldest first."""
     client = get_twilio_client()
     
+    svc = client.conversations.v1.services(CONV_SERVICE_SID)
+    messages = list(reversed(svc.conversations(conversation_sid).messages.list(order="desc", limit=limit)))
+
+    with_media = [msg.sid for msg in messages if getattr(msg, "media", None)]
+    media_by_sid = get_message_media(conversation_sid, with_media)
+
+    return [
+        {
+            "sid": msg.sid,
+            "index": msg.index,
+            "author": msg.author,
+            "body": msg.body,
+            "date_created": msg.date_created.isoformat() if msg.date_created else None,
+            "media": media_by_sid.get(msg.sid, []),
+        }
+        for msg in messages
+    ]
+
+def _resolve_conversation(conversation_sid: str):
+    """Local Conversation for a SID, recording it from Twilio if we have never seen it."""
+    conv = Conversation.objects.filter(sid=conversation_sid).first()
+    if conv:
+        return conv
+    client = get_twilio_client()
+    remote = client.conversations.v1.services(CONV_SERVICE_SID).conversations(conversation_sid).fetch()
+    pair = _pair_from_unique_name(getattr(remote, "unique_name", None))
+    if not pair:
+        return None
+    return record_conversation(remote.sid, *pair)
+
+def _normalize_webhook_media(raw):
+    """Webhooks send Media as a JSON string with Twilio's capitalized keys."""
+    if not raw:
+        return []
     try:
-        svc = client.conversations.v1.services(CONV_SERVICE_SID)
-        messages = svc.conversations(conversation_sid).messages.list(limit=limit)
-        
-        result = []
-        for msg in messages:
-            message_data = {
-                "sid": msg.sid,
-                "author": msg.author,
-                "body": msg.body,
-                "date_created": msg.date_created.isoformat() if msg.date_created else None,
-                "media": []
-            }
-            
-            if hasattr(msg, 'media') and msg.media:
-                try:
-                    media_list = svc.conversations(conversation_sid)\
-                        .messages(msg.sid).media.list()
-                    
-                    for media in media_list:
-                        message_data["media"].append({
-                            "sid": media.sid,
-                            "content_type": media.content_type,
-                            "size": media.size,
-                            "filename": media.filename,
-                        })
-                except Exception:
-                    pass
-            
-            result.append(message_data)
-        
-        return result
-    except Exception as e:
-        raise
+        items = json.loads(raw) if isinstance(raw, str) else raw
+    except ValueError:
+        return []
+    return [
+        {
+            "sid": m.get("Sid") or m.get("sid"),
+            "content_type": m.get("ContentType") or m.get("content_type"),
+            "size": m.get("Size") or m.get("size"),
+            "filename": m.get("Filename") or m.get("filename"),
+        }
+        for m in items
+    ]
+
+def ingest_message(conversation, sid, index, author, body, date_created=None, media=None) -> bool:
+    """
+    Store one message and update the inbox. Returns False if the SID was
+    already stored, so redelivered webhooks never double-count unread messages.
+    """
+    if isinstance(date_created, str):
+        date_created = parse_datetime(date_created)
+    message, created = Message.objects.get_or_create(
+        sid=sid,
+        defaults={
+            "conversation": conversation,
+            "index": int(index),
+            "author": author or "",
+            "body": body or "",
+            "date_created": date_created,
+            "media": media or [],
+        },
+    )
+    if created:
+        if media:
+            cache.set(_media_cache_key(sid), media, timeout=MEDIA_CACHE_TTL)
+        record_message(conversation.sid, author, body, date_created=date_created)
+        transaction.on_commit(lambda: _publish_new_message(conversation, message))
+    return created
+
+def _publish_new_message(conversation, message):
+    payload = {"conversation_sid": conversation.sid, "message": message.as_dict()}
+    for user_id in conversation.participant_ids():
+        events.publish(user_id, "message", payload)
+    publish_inbox_update(conversation.sid)
+
+def handle_webhook_event(params) -> bool:
+    """
+    Apply a (signature-verified) Conversations post-event webhook.
+    Returns True if it changed local state.
+    """
+    event = params.get("EventType")
+    conversation_sid = params.get("ConversationSid")
+    if not conversation_sid:
+        return False
+
+    if event in ("onMessageAdded", "onMediaMessage"):
+        conv = _resolve_conversation(conversation_sid)
+        if conv is None:
+            return False
+        return ingest_message(
+            conv,
+            sid=params.get("MessageSid"),
+            index=params.get("Index") or 0,
+            author=params.get("Author"),
+            body=params.get("Body"),
+            date_created=params.get("DateCreated"),
+            media=_normalize_webhook_media(params.get("Media")),
+        )
+
+    if event == "onParticipantAdded":
+        # membership comes from the user pair, so the only thing to do is
+        # record conversations started outside this app
+        return _resolve_conversation(conversation_sid) is not None
+
+    return False
+
+def backfill_messages(conversation, limit: int = 50) -> int:
+    """Pull the newest `limit` messages from Twilio into the local store."""
+    fetched = get_conversation_messages(conversation.sid, limit=limit)
+    new = Message.objects.bulk_create(
+        [
+            Message(
+                sid=m["sid"],
+                conversation=conversation,
+                index=m["index"],
+                author=m["author"] or "",
+                body=m["body"] or "",
+                date_created=parse_datetime(m["date_created"]) if m["date_created"] else None,
+                media=m["media"],
+            )
+            for m in fetched
+        ],
+        ignore_conflicts=True,
+    )
+    if fetched:
+        last = fetched[-1]
+        record_message(
+            conversation.sid, last["author"], last["body"],
+            date_created=parse_datetime(last["date_created"]) if last["date_created"] else None,
+            count_unread=False,
+        )
+
+    # everything Twilio has from the oldest fetched index up to the newest is
+    # now local; a short answer means all of it
+    reached = 0 if len(fetched) < limit else fetched[0]["index"]
+    newest = fetched[-1]["index"] if fetched else None
+    covered_from, covered_through = conversation.backfilled_from, conversation.backfilled_through
+    if covered_from is not None and covered_through is not None and reached <= covered_through + 1:
+        # overlaps (or touches) the range an earlier backfill covered
+        reached = min(reached, covered_from)
+        newest = covered_through if newest is None else max(newest, covered_through)
+    if (reached, newest) != (covered_from, covered_through):
+        conversation.backfilled_from, conversation.backfilled_through = reached, newest
+        Conversation.objects.filter(pk=conversation.pk).update(
+            backfilled_from=reached, backfilled_through=newest,
+        )
+    return len(new)
+
+def _page_has_gap(page, limit: int, backfilled_from=None, backfilled_through=None) -> bool:
+    """
+    Whether Twilio may have messages this page (newest first) is missing.
+    Indexes inside the range a backfill covered (backfilled_from through
+    backfilled_through) that are still missing were deleted. Any other hole,
+    e.g. above the range after a dropped webhook, is a gap, and so is older
+    history below a short page.
+    """
+    def covered(lo, hi):
+        return (
+            backfilled_from is not None and backfilled_through is not None
+            and backfilled_from <= lo and hi <= backfilled_through
+        )
+
+    if not page:
+        return backfilled_from != 0
+    indexes = [m.index for m in page]
+    for newer, older in zip(indexes, indexes[1:]):
+        if newer - older > 1 and not covered(older + 1, newer - 1):
+            return True
+    # a short page that doesn't reach message #0 means older history is missing
+    lowest = indexes[-1]
+    return len(page) < limit and lowest > 0 and not covered(0, lowest - 1)
+
+def get_message_history(conversation, before=None, limit: int = 50):
+    """
+    One page of history from the local store, oldest first, paging
+    backwards with `before` (a message index). Gaps are filled from Twilio.
+    Returns (messages, next_cursor); next_cursor is None on the last page.
+    """
+    def _page():
+        qs = Message.objects.filter(conversation=conversation)
+        if before is not None:
+            qs = qs.filter(index__lt=before)
+        return list(qs.order_by("-index")[:limit])
+
+    page = _page()
+    if _page_has_gap(page, limit, conversation.backfilled_from, conversation.backfilled_through):
+        newer = Message.objects.filter(conversation=conversation, index__gte=before).count() if before is not None else 0
+        try:
+            backfill_messages(conversation, limit=min(newer + limit, 1000))
+            page = _page()
+        except Exception as e:
+            print(f"[get_message_history] backfill failed for {conversation.sid}: {e}")
+
+    page.reverse()
+    next_cursor = page[0].index if page and page[0].index > 0 else None
+    return [m.as_dict() for m in page], next_cursor
 
 def can_message(viewer_user, target_user) -> bool:
     if viewer_user.id == target_user.id:
@@ -146,14 +565,99 @@ def is_friends(a_id: int, b_id: int) -> bool:
     lo, hi = sorted([a_id, b_id])
     return Friendship.objects.filter(user_id=lo, friend_id=hi).exists()
 
+def _membership_cache_key(conversation_sid: str, user_id: int) -> str:
+    return f"conv_member:{conversation_sid}:{user_id}"
+
+def is_conversation_participant(conversation_sid: str, user_id: int) -> bool:
+    """
+    Authorization check for conversation endpoints, answered from the cache
+    or the local Conversation table. Twilio is only asked about conversations
+    we have never recorded. Refusals expire after MEMBERSHIP_NEGATIVE_TTL.
+    """
+    key = _membership_cache_key(conversation_sid, user_id)
+    member = cache.get(key)
+    if member is not None:
+        return member
+
+    conv = Conversation.objects.filter(sid=conversation_sid).only("user_a_id", "user_b_id").first()
+    if conv is None:
+        conv = _resolve_conversation(conversation_sid)
+    member = conv is not None and int(user_id) in conv.participant_ids()
+    cache.set(key, member, timeout=MEMBERSHIP_CACHE_TTL if member else MEMBERSHIP_NEGATIVE_TTL)
+    return member
+
+def invalidate_membership(conversation_sid: str, *user_ids):
+    cache.delete_many([_membership_cache_key(conversation_sid, uid) for uid in user_ids])
+
+def _friends_cache_key(user_id: int) -> str:
+    return f"friends:{user_id}"
+
+def friend_ids(user_id: int):
+    pairs = Friendship.objects.filter(Q(user_id=user_id) | Q(friend_id=user_id)).values_list("user_id", "friend_id")
+    return [f if u == user_id else u for u, f in pairs]
+
+def get_friends(user_id: int):
+    """
+    The user's friends with avatar URLs (relative for uploaded files),
+    sorted by username. Built from one query and cached until a
+    friendship or one of the friends' profiles changes.
+    """
+    key = _friends_cache_key(user_id)
+    friends = cache.get(key)
+    if friends is not None:
+        return friends
+
+    rows = (
+        User.objects
+        .filter(Q(friendships_from__friend_id=user_id) | Q(friendships_to__user_id=user_id))
+        .values(
+            "id", "username", "first_name", "last_name",
+            "studentprofile__id", "studentprofile__avatar",
+            "tutorprofile__id", "tutorprofile__avatar",
+        )
+        .distinct()
+    )
+
+    friends = []
+    for row in rows:
+        avatar_url = None
+        if row["studentprofile__id"] or row["tutorprofile__id"]:
+            # student profile wins, same as avatar_url_or_default on the profile
+            avatar = row["studentprofile__avatar"] if row["studentprofile__id"] else row["tutorprofile__avatar"]
+            if avatar:
+                avatar_url = default_storage.url(avatar)
+            else:
+                full_name = f"{row['first_name']} {row['last_name']}".strip()
+                avatar_url = initials_avatar_url(full_name or row["username"])
+        friends.append({
+            "id": row["id"],
+            "username": row["username"],
+            "first_name": row["first_name"],
+            "last_name": row["last_name"],
+            "avatar_url": avatar_url,
+        })
+
+    friends.sort(key=lambda x: x["username"].lower())
+    cache.set(key, friends, timeout=FRIENDS_CACHE_TTL)
+    return friends
+
+def invalidate_friends(*user_ids):
+    cache.delete_many([_friends_cache_key(uid) for uid in user_ids])
+
 def get_other_user_in_conversation(conversation_sid: str, current_user_id: int):
     """
     Try to find the 'other' user in a 1–1 conversation.
 
     Priority:
+      0. The local Conversation registry (no Twilio call).
       1. Use conversation.attributes (our preferred schema).
       2. Fallback to Twilio participants: identity = 'user_<id>'.
     """
+    local = Conversation.objects.select_related("user_a", "user_b").filter(sid=conversation_sid).first()
+    if local and int(current_user_id) in local.participant_ids():
+        other = local.user_b if local.user_a_id == int(current_user_id) else local.user_a
+        return {"user_id": other.id, "username": other.username}
+
     client = get_twilio_client()
 
     try:
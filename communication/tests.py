@@ -1,3 +1,655 @@
-from django.test import TestCase
+import asyncio
+import itertools
+import threading
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from twilio.base.exceptions import TwilioRestException
+from twilio.request_validator import RequestValidator
+
+from . import events
+from . import services as dm
+from accounts.models import Friendship, StudentProfile, TutorProfile, initials_avatar_url
+
+from .models import Conversation, InboxEntry, Message
+
+TEST_AUTH_TOKEN = "test-auth-token"
+WEBHOOK_URL = "https://example.com/communication/messaging/webhook/"
+JWT_SERIALS = itertools.count()
+
+# Recorded Conversations post-event payloads (values trimmed to what we use)
+MESSAGE_ADDED = {
+    "EventType": "onMessageAdded",
+    "AccountSid": "AC00000000000000000000000000000000",
+    "ChatServiceSid": "IS00000000000000000000000000000000",
+    "ConversationSid": "CH00000000000000000000000000000001",
+    "MessageSid": "IM00000000000000000000000000000001",
+    "Index": "0",
+    "Author": "user_2",
+    "Body": "hey, still on for the CS 1332 review?",
+    "Attributes": "{}",
+    "DateCreated": "2025-11-20T18:04:11.000Z",
+    "Source": "SDK",
+}
+
+MEDIA_MESSAGE = {
+    "EventType": "onMessageAdded",
+    "AccountSid": "AC00000000000000000000000000000000",
+    "ChatServiceSid": "IS00000000000000000000000000000000",
+    "ConversationSid": "CH00000000000000000000000000000001",
+    "MessageSid": "IM00000000000000000000000000000002",
+    "Index": "1",
+    "Author": "user_1",
+    "Body": "",
+    "Media": '[{"Sid": "ME00000000000000000000000000000001", "Filename": "notes.pdf", '
+             '"ContentType": "application/pdf", "Size": 48213, "Category": "media"}]',
+    "DateCreated": "2025-11-20T18:05:02.000Z",
+    "Source": "SDK",
+}
+
+
+class NoNetworkClient:
+    """Stand-in for the shared Twilio client; any API use fails the test."""
+    def __getattr__(self, name):
+        raise AssertionError(f"Twilio should not be called (client.{name})")
+
+
+class FakeHistoryClient:
+    """Just enough of the Conversations API to serve backfills; counts the message listings."""
+    def __init__(self, indexes=()):
+        self.messages = [
+            SimpleNamespace(sid=f"IM{i:032d}", index=i, author="user_1", body=f"msg {i}",
+                            date_created=None, media=None)
+            for i in indexes
+        ]
+        self.list_calls = 0
+        conversation = SimpleNamespace(messages=SimpleNamespace(list=self._list))
+        service = SimpleNamespace(conversations=lambda sid: conversation)
+        self.conversations = SimpleNamespace(v1=SimpleNamespace(services=lambda sid: service))
+
+    def _list(self, order="desc", limit=50):
+        self.list_calls += 1
+        return sorted(self.messages, key=lambda m: -m.index)[:limit]
+
+
+@override_settings(TWILIO_WEBHOOK_URL=WEBHOOK_URL)
+@mock.patch.object(dm, "AUTH_TOKEN", TEST_AUTH_TOKEN)
+class TwilioWebhookTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        dm.set_twilio_client(NoNetworkClient())
+        self.addCleanup(dm.set_twilio_client, None)
+        self.alice = User.objects.create_user("alice", password="pw")
+        self.bob = User.objects.create_user("bob", password="pw")
+        self.conversation = dm.record_conversation(
+            MESSAGE_ADDED["ConversationSid"], self.alice.id, self.bob.id
+        )
+
+    def _post(self, payload, signature=None):
+        if signature is None:
+            signature = RequestValidator(TEST_AUTH_TOKEN).compute_signature(WEBHOOK_URL, payload)
+        return self.client.post(
+            reverse("communication:twilio_webhook"), payload,
+            HTTP_X_TWILIO_SIGNATURE=signature,
+        )
+
+    def test_rejects_bad_signature(self):
+        response = self._post(MESSAGE_ADDED, signature="not-a-signature")
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Message.objects.exists())
+
+    def test_message_added_is_stored_and_updates_inbox(self):
+        payload = dict(MESSAGE_ADDED, Author=f"user_{self.bob.id}")
+        self.assertEqual(self._post(payload).status_code, 204)
+
+        message = Message.objects.get(sid=payload["MessageSid"])
+        self.assertEqual(message.body, payload["Body"])
+        self.assertEqual(message.conversation, self.conversation)
+
+        alice_entry = InboxEntry.objects.get(user=self.alice)
+        self.assertEqual(alice_entry.unread_count, 1)
+        self.assertEqual(alice_entry.last_message_body, payload["Body"])
+        self.assertEqual(InboxEntry.objects.get(user=self.bob).unread_count, 0)
+
+    def test_redelivery_is_idempotent(self):
+        payload = dict(MESSAGE_ADDED, Author=f"user_{self.bob.id}")
+        self._post(payload)
+        self._post(payload)
+        self.assertEqual(Message.objects.count(), 1)
+        self.assertEqual(InboxEntry.objects.get(user=self.alice).unread_count, 1)
+
+    def test_media_metadata_is_stored(self):
+        self._post(MEDIA_MESSAGE)
+        media = Message.objects.get(sid=MEDIA_MESSAGE["MessageSid"]).media
+        self.assertEqual(media, [{
+            "sid": "ME00000000000000000000000000000001",
+            "content_type": "application/pdf",
+            "size": 48213,
+            "filename": "notes.pdf",
+        }])
+
+    def test_history_pages_backwards_from_local_store(self):
+        for i in range(5):
+            dm.ingest_message(self.conversation, f"IM{i:032d}", i, "user_1", f"msg {i}")
+
+        page, cursor = dm.get_message_history(self.conversation, limit=3)
+        self.assertEqual([m["index"] for m in page], [2, 3, 4])
+        self.assertEqual(cursor, 2)
+
+        page, cursor = dm.get_message_history(self.conversation, before=cursor, limit=3)
+        self.assertEqual([m["index"] for m in page], [0, 1])
+        self.assertIsNone(cursor)
+
+    def test_participant_check_is_local(self):
+        carol = User.objects.create_user("carol", password="pw")
+        sid = self.conversation.sid
+        self.assertTrue(dm.is_conversation_participant(sid, self.alice.id))
+        self.assertFalse(dm.is_conversation_participant(sid, carol.id))
+
+        self.client.force_login(carol)
+        response = self.client.get(reverse("communication:get_messages", args=[sid]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_refusals_are_cached_briefly(self):
+        carol = User.objects.create(username="carol")
+        sid = self.conversation.sid
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            dm.is_conversation_participant(sid, self.alice.id)
+            dm.is_conversation_participant(sid, carol.id)
+        timeouts = [c.kwargs["timeout"] for c in cache_set.call_args_list]
+        self.assertEqual(timeouts, [dm.MEMBERSHIP_CACHE_TTL, dm.MEMBERSHIP_NEGATIVE_TTL])
+
+    def _use_client(self, client):
+        dm.set_twilio_client(client)
+        return client
+
+    def test_empty_conversation_is_backfilled_once(self):
+        twilio = self._use_client(FakeHistoryClient())
+        self.assertEqual(dm.get_message_history(self.conversation, limit=3), ([], None))
+        self.assertEqual(twilio.list_calls, 1)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.backfilled_from, 0)
+
+        self.assertEqual(dm.get_message_history(self.conversation, limit=3), ([], None))
+        self.assertEqual(twilio.list_calls, 1)
+
+    def test_deleted_messages_trigger_one_backfill(self):
+        # #2 was deleted in Twilio, so the hole can never be filled
+        for i in (0, 1, 3, 4):
+            dm.ingest_message(self.conversation, f"IM{i:032d}", i, "user_1", f"msg {i}")
+        twilio = self._use_client(FakeHistoryClient([0, 1, 3, 4]))
+
+        page, _ = dm.get_message_history(self.conversation, limit=10)
+        self.assertEqual([m["index"] for m in page], [0, 1, 3, 4])
+        self.assertEqual(twilio.list_calls, 1)
+
+        page, _ = dm.get_message_history(self.conversation, limit=10)
+        self.assertEqual([m["index"] for m in page], [0, 1, 3, 4])
+        self.assertEqual(twilio.list_calls, 1)
+
+    def test_dropped_webhook_above_backfill_is_fetched(self):
+        twilio = self._use_client(FakeHistoryClient(range(5)))
+        dm.get_message_history(self.conversation, limit=10)
+        self.assertEqual(twilio.list_calls, 1)
+        # #5's webhook never arrived, #6's did
+        dm.ingest_message(self.conversation, f"IM{6:032d}", 6, "user_1", "msg 6")
+        twilio = self._use_client(FakeHistoryClient(range(7)))
+
+        page, _ = dm.get_message_history(self.conversation, limit=10)
+        self.assertEqual([m["index"] for m in page], list(range(7)))
+        self.assertEqual(twilio.list_calls, 1)
+        self.conversation.refresh_from_db()
+        self.assertEqual((self.conversation.backfilled_from, self.conversation.backfilled_through), (0, 6))
+
+        dm.get_message_history(self.conversation, limit=10)
+        self.assertEqual(twilio.list_calls, 1)
+
+    def test_backfill_extends_into_older_history(self):
+        for i in range(6, 10):
+            dm.ingest_message(self.conversation, f"IM{i:032d}", i, "user_1", f"msg {i}")
+        twilio = self._use_client(FakeHistoryClient(range(10)))
+
+        page, cursor = dm.get_message_history(self.conversation, limit=3)
+        self.assertEqual([m["index"] for m in page], [7, 8, 9])
+        self.assertEqual(twilio.list_calls, 0)
+
+        page, cursor = dm.get_message_history(self.conversation, before=cursor, limit=3)
+        self.assertEqual([m["index"] for m in page], [4, 5, 6])
+        page, cursor = dm.get_message_history(self.conversation, before=cursor, limit=3)
+        self.assertEqual([m["index"] for m in page], [1, 2, 3])
+        self.assertEqual(twilio.list_calls, 2)
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+        self.carol = User.objects.create(username="carol")
+        self.dave = User.objects.create(username="dave")
+        self.with_bob = dm.record_conversation("CH_BOB", self.alice.id, self.bob.id)
+        self.with_carol = dm.record_conversation("CH_CAROL", self.carol.id, self.alice.id)
+        self.with_dave = dm.record_conversation("CH_DAVE", self.alice.id, self.dave.id)
+
+    def _at(self, minutes):
+        return timezone.now() - timedelta(minutes=minutes)
+
+    def test_most_recent_first_and_silent_last(self):
+        dm.record_message("CH_BOB", f"user_{self.bob.id}", "older", date_created=self._at(10))
+        dm.record_message("CH_CAROL", f"user_{self.carol.id}", "newer", date_created=self._at(5))
+
+        inbox = dm.get_inbox(self.alice.id)
+        self.assertEqual([e["other_username"] for e in inbox], ["carol", "bob", "dave"])
+        self.assertEqual(inbox[0]["last_message_body"], "newer")
+        self.assertIsNone(inbox[2]["last_message_date_created"])
+
+    def test_late_message_keeps_newer_preview(self):
+        dm.record_message("CH_BOB", f"user_{self.bob.id}", "latest", date_created=self._at(1))
+        self.assertEqual(dm.record_message("CH_BOB", f"user_{self.bob.id}", "delayed", date_created=self._at(9)), 0)
+        self.assertEqual(dm.get_inbox(self.alice.id)[0]["last_message_body"], "latest")
+
+    def test_unread_counts_everyone_but_the_author_until_read(self):
+        for body in ("one", "two"):
+            dm.record_message("CH_BOB", f"user_{self.bob.id}", body)
+        dm.record_message("CH_BOB", f"user_{self.alice.id}", "reply")
+
+        unread = dict(InboxEntry.objects.filter(conversation=self.with_bob).values_list("user_id", "unread_count"))
+        self.assertEqual(unread, {self.alice.id: 2, self.bob.id: 1})
+
+        self.client.force_login(self.alice)
+        self.client.post(reverse("communication:mark_read", args=["CH_BOB"]))
+        unread = dict(InboxEntry.objects.filter(conversation=self.with_bob).values_list("user_id", "unread_count"))
+        self.assertEqual(unread, {self.alice.id: 0, self.bob.id: 1})
+
+    def test_list_conversations_view(self):
+        dm.record_message("CH_DAVE", f"user_{self.dave.id}", "hi alice")
+        self.client.force_login(self.alice)
+
+        with self.assertNumQueries(3):  # session, user, inbox
+            response = self.client.get(reverse("communication:list_conversations"))
+        conversations = response.json()["conversations"]
+        entry = InboxEntry.objects.get(user=self.alice, conversation=self.with_dave)
+        self.assertEqual(conversations[0]["sid"], "CH_DAVE")
+        self.assertEqual({c["sid"] for c in conversations[1:]}, {"CH_BOB", "CH_CAROL"})
+        self.assertEqual(conversations[0], {
+            "sid": "CH_DAVE",
+            "friendly_name": "dave",
+            "other_user_id": self.dave.id,
+            "other_username": "dave",
+            "last_message_body": "hi alice",
+            "last_message_author": f"user_{self.dave.id}",
+            "last_message_date_created": entry.last_message_at.isoformat(),
+            "unread_count": 1,
+        })
+
+
+@mock.patch.object(dm, "create_twilio_access_token", side_effect=lambda user: f"jwt-{next(JWT_SERIALS)}")
+class AccessTokenCacheTests(TestCase):
+    NOW = 1_800_000_000
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="alice")
+
+    def _at(self, seconds):
+        return mock.patch("time.time", return_value=self.NOW + seconds)
+
+    def test_reused_until_the_refresh_margin(self, mint):
+        with self._at(0):
+            first = dm.get_cached_access_token(self.user)
+        self.assertEqual(first["expires_at"], self.NOW + dm.TOKEN_TTL)
+        with self._at(dm.TOKEN_TTL - dm.TOKEN_REFRESH_MARGIN - 1):
+            self.assertEqual(dm.get_cached_access_token(self.user), first)
+        self.assertEqual(mint.call_count, 1)
+
+        refresh_at = dm.TOKEN_TTL - dm.TOKEN_REFRESH_MARGIN
+        with self._at(refresh_at):
+            second = dm.get_cached_access_token(self.user)
+        self.assertNotEqual(second["token"], first["token"])
+        self.assertEqual(second["expires_at"], self.NOW + refresh_at + dm.TOKEN_TTL)
+        self.assertEqual(mint.call_count, 2)
+
+    def test_token_view_payload(self, mint):
+        self.client.force_login(self.user)
+        with self._at(0):
+            first = self.client.get(reverse("communication:get_twilio_token")).json()
+        with self._at(600):
+            payload = self.client.get(reverse("communication:get_twilio_token")).json()
+
+        expires_at = self.NOW + dm.TOKEN_TTL
+        self.assertEqual(payload, {
+            "token": first["token"],
+            "identity": f"user_{self.user.id}",
+            "expires_at": expires_at,
+            "refresh_at": expires_at - dm.TOKEN_REFRESH_MARGIN,
+            "refresh_in": dm.TOKEN_TTL - 600 - dm.TOKEN_REFRESH_MARGIN,
+        })
+        self.assertEqual(mint.call_count, 1)
+
+
+class FakeConversationsClient:
+    """Conversation create/fetch/stream over a list of remote conversations; records each call."""
+    def __init__(self, remote=(), conflict=False):
+        self.remote = list(remote)
+        self.conflict = conflict
+        self.created, self.fetched = [], []
+        conversations = mock.Mock(side_effect=self._conversation, create=self._create, stream=self._stream)
+        service = SimpleNamespace(conversations=conversations)
+        self.conversations = SimpleNamespace(v1=SimpleNamespace(services=lambda sid: service))
+
+    def _create(self, unique_name, **kwargs):
+        self.created.append(unique_name)
+        if self.conflict:
+            raise TwilioRestException(409, "/Conversations", "Conversation with provided unique name already exists")
+        conv = SimpleNamespace(sid=f"CH{len(self.remote):032d}", unique_name=unique_name, last=None)
+        self.remote.append(conv)
+        return conv
+
+    def _stream(self, page_size=50):
+        return iter(self.remote)
+
+    def _conversation(self, sid):
+        def fetch():
+            self.fetched.append(sid)
+            return next(c for c in self.remote if sid in (c.sid, c.unique_name))
+
+        def last_messages(limit=50, order="desc"):
+            conv = next(c for c in self.remote if c.sid == sid)
+            return [conv.last] if conv.last else []
+
+        return SimpleNamespace(fetch=fetch, messages=SimpleNamespace(list=last_messages))
+
+
+class ConversationRegistryTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+        self.addCleanup(dm.set_twilio_client, None)
+
+    def test_recorded_pair_skips_twilio(self):
+        dm.record_conversation("CH00000000000000000000000000000001", self.bob.id, self.alice.id)
+        dm.set_twilio_client(NoNetworkClient())
+        with self.assertNumQueries(1):
+            sid = dm.get_or_create_conversation(self.alice.id, self.bob.id)
+        self.assertEqual(sid, "CH00000000000000000000000000000001")
+
+    def test_new_pair_is_created_and_recorded(self):
+        twilio = FakeConversationsClient()
+        dm.set_twilio_client(twilio)
+        sid = dm.get_or_create_conversation(self.bob.id, self.alice.id)
+
+        unique = f"userpair_{self.alice.id}_{self.bob.id}"
+        self.assertEqual(twilio.created, [unique])
+        conv = Conversation.objects.get(sid=sid)
+        self.assertEqual((conv.unique_name, conv.user_a, conv.user_b), (unique, self.alice, self.bob))
+        self.assertEqual(InboxEntry.objects.filter(conversation=conv).count(), 2)
+
+    def test_conflict_fetches_by_unique_name(self):
+        # created in Twilio before this app kept a record of it
+        unique = f"userpair_{self.alice.id}_{self.bob.id}"
+        twilio = FakeConversationsClient(
+            [SimpleNamespace(sid="CH00000000000000000000000000000009", unique_name=unique, last=None)],
+            conflict=True,
+        )
+        dm.set_twilio_client(twilio)
+
+        sid = dm.get_or_create_conversation(self.alice.id, self.bob.id)
+        self.assertEqual(sid, "CH00000000000000000000000000000009")
+        self.assertEqual(twilio.fetched, [unique])
+        self.assertTrue(Conversation.objects.filter(sid=sid, unique_name=unique).exists())
+
+    def test_backfill_command_records_only_known_user_pairs(self):
+        sent = timezone.now()
+        remote = [
+            SimpleNamespace(sid="CH1", unique_name=f"userpair_{self.alice.id}_{self.bob.id}",
+                            last=SimpleNamespace(author=f"user_{self.bob.id}", body="see you there", date_created=sent)),
+            SimpleNamespace(sid="CH2", unique_name=f"userpair_{self.alice.id}_{self.alice.id}", last=None),
+            SimpleNamespace(sid="CH3", unique_name=f"userpair_{self.alice.id}_999999", last=None),
+            SimpleNamespace(sid="CH4", unique_name="study-group", last=None),
+            SimpleNamespace(sid="CH5", unique_name=None, last=None),
+        ]
+        dm.set_twilio_client(FakeConversationsClient(remote))
+        out = StringIO()
+        call_command("backfill_conversations", stdout=out)
+
+        self.assertIn("Recorded 1 conversations (4 skipped)", out.getvalue())
+        self.assertEqual(list(Conversation.objects.values_list("sid", flat=True)), ["CH1"])
+        entry = InboxEntry.objects.get(user=self.alice)
+        self.assertEqual((entry.last_message_body, entry.last_message_at, entry.unread_count), ("see you there", sent, 0))
+
+
+@mock.patch.object(dm, "ACCOUNT_SID", "AC-test")
+@mock.patch.object(dm, "AUTH_TOKEN", TEST_AUTH_TOKEN)
+@mock.patch.object(dm, "Client", side_effect=lambda *args, **kwargs: object())
+class SharedTwilioClientTests(SimpleTestCase):
+    def setUp(self):
+        dm.set_twilio_client(None)
+        self.addCleanup(dm.set_twilio_client, None)
+
+    def test_built_once_and_shared_across_threads(self, client_cls):
+        started = threading.Barrier(8, timeout=5)
+        clients = []
+
+        def get():
+            started.wait()
+            clients.append(dm.get_twilio_client())
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(client_cls.call_count, 1)
+        self.assertEqual(len(clients), 8)
+        self.assertTrue(all(c is clients[0] for c in clients))
+        self.assertIs(dm.get_twilio_client(), clients[0])
+        self.assertIsNotNone(client_cls.call_args.kwargs["http_client"])
+
+    def test_reset_builds_a_new_client(self, client_cls):
+        first = dm.get_twilio_client()
+        dm.set_twilio_client(None)
+        second = dm.get_twilio_client()
+
+        self.assertIsNot(second, first)
+        self.assertEqual(client_cls.call_count, 2)
+
+
+class RunParallelTests(SimpleTestCase):
+    def test_results_keep_call_order(self):
+        started = threading.Barrier(3, timeout=5)
+
+        def call(value):
+            started.wait()  # only passes if all three run at once
+            return value
+
+        results = dm.run_parallel([lambda v=v: call(v) for v in ("a", "b", "c")])
+        self.assertEqual(results, ["a", "b", "c"])
+
+    def test_errors_raise_or_fill_their_slot(self):
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            dm.run_parallel([lambda: 1, fail])
+        results = dm.run_parallel([lambda: 1, fail], return_exceptions=True)
+        self.assertEqual(results[0], 1)
+        self.assertIsInstance(results[1], ValueError)
+
+    def test_deadline_times_out_slow_calls(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        results = dm.run_parallel([lambda: 1, lambda: release.wait(5)], timeout=0.05, return_exceptions=True)
+        self.assertEqual(results[0], 1)
+        self.assertIsInstance(results[1], TimeoutError)
+
+
+class FakeMediaClient:
+    """Answers media.list() for any message; records which SIDs were fetched."""
+    def __init__(self):
+        self.fetched = []
+        service = SimpleNamespace(conversations=lambda sid: SimpleNamespace(messages=self._message))
+        self.conversations = SimpleNamespace(v1=SimpleNamespace(services=lambda sid: service))
+
+    def _message(self, sid):
+        def media_list():
+            self.fetched.append(sid)
+            return [SimpleNamespace(sid=f"ME-{sid}", content_type="image/png", size=10, filename=f"{sid}.png")]
+        return SimpleNamespace(media=SimpleNamespace(list=media_list))
+
+
+class MessageMediaCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.twilio = FakeMediaClient()
+        dm.set_twilio_client(self.twilio)
+        self.addCleanup(dm.set_twilio_client, None)
+
+    def test_only_misses_are_fetched(self):
+        first = dm.get_message_media("CH1", ["IM1", "IM2"])
+        self.assertEqual(sorted(self.twilio.fetched), ["IM1", "IM2"])
+        self.assertEqual(first["IM1"][0]["filename"], "IM1.png")
+
+        second = dm.get_message_media("CH1", ["IM1", "IM2", "IM3"])
+        self.assertEqual(sorted(self.twilio.fetched), ["IM1", "IM2", "IM3"])
+        self.assertEqual(second["IM1"], first["IM1"])
+        self.assertEqual(set(second), {"IM1", "IM2", "IM3"})
+
+    def test_all_hits_skip_twilio(self):
+        dm.get_message_media("CH1", ["IM1"])
+        dm.set_twilio_client(NoNetworkClient())
+        self.assertEqual(dm.get_message_media("CH1", ["IM1"])["IM1"][0]["sid"], "ME-IM1")
+
+    def test_entries_expire(self):
+        with mock.patch.object(cache, "set_many", wraps=cache.set_many) as set_many:
+            dm.get_message_media("CH1", ["IM1"])
+        self.assertEqual(set_many.call_args.kwargs["timeout"], dm.MEDIA_CACHE_TTL)
+
+
+class EventBrokerTests(SimpleTestCase):
+    async def _subscribed(self, broker, user_id, heartbeat=5):
+        stream = broker.subscribe(user_id, heartbeat=heartbeat)
+        receive = asyncio.ensure_future(stream.__anext__())
+        while user_id not in broker._subscribers:
+            await asyncio.sleep(0)
+        return stream, receive
+
+    async def test_publish_reaches_only_that_users_streams(self):
+        broker = events.InProcessBroker()
+        stream, receive = await self._subscribed(broker, 7)
+        broker.publish(8, "inbox", {"sid": "CH2"})
+        # publish is called from sync code on other threads
+        await asyncio.to_thread(broker.publish, 7, "inbox", {"sid": "CH1"})
+        self.assertEqual(await asyncio.wait_for(receive, 1), ("inbox", {"sid": "CH1"}))
+
+        await stream.aclose()
+        self.assertNotIn(7, broker._subscribers)
+
+    async def test_idle_stream_yields_heartbeats(self):
+        broker = events.InProcessBroker()
+        stream, receive = await self._subscribed(broker, 7, heartbeat=0.01)
+        self.assertEqual(await asyncio.wait_for(receive, 1), (None, None))
+        await stream.aclose()
+
+
+class MessageStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="streamer")
+
+    def test_wsgi_requests_are_turned_away(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("communication:message_stream"))
+        self.assertEqual(response.status_code, 204)
+
+    async def test_published_event_arrives_on_the_stream(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("communication:message_stream"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b"retry: 5000\n\n")
+        receive = asyncio.ensure_future(anext(chunks))
+        broker = events.get_broker()
+        while self.user.id not in broker._subscribers:
+            await asyncio.sleep(0)
+        events.publish(self.user.id, "inbox", {"sid": "CH1", "unread_count": 2})
+
+        chunk = await asyncio.wait_for(receive, 1)
+        self.assertEqual(chunk, b'event: inbox\ndata: {"sid": "CH1", "unread_count": 2}\n\n')
+        await chunks.aclose()
+
+
+@mock.patch.object(dm, "create_twilio_access_token", return_value="signed.jwt")
+class BootstrapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        dm.set_twilio_client(NoNetworkClient())
+        self.addCleanup(dm.set_twilio_client, None)
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+        self.client.force_login(self.alice)
+        self.url = reverse("communication:bootstrap")
+
+    def test_payload_and_revalidation(self, _):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["token"]["token"], "signed.jwt")
+        etag = response["ETag"]
+
+        unchanged = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged["ETag"], etag)
+
+        Friendship.objects.create(user=self.alice, friend=self.bob)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual([f["username"] for f in changed.json()["friends"]], ["bob"])
+
+
+class FriendsListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob", first_name="Bob", last_name="Jones")
+        self.carol = User.objects.create(username="Carol")
+        self.dave = User.objects.create(username="dave")
+        StudentProfile.objects.create(user=self.bob)
+        TutorProfile.objects.create(user=self.carol, avatar="avatars/carol.png")
+        for friend in (self.bob, self.carol, self.dave):
+            Friendship.objects.create(user=self.alice, friend=friend)
+
+    def test_built_from_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            friends = dm.get_friends(self.alice.id)
+        self.assertEqual([f["username"] for f in friends], ["bob", "Carol", "dave"])
+        self.assertEqual(
+            [f["avatar_url"] for f in friends],
+            [initials_avatar_url("Bob Jones"), default_storage.url("avatars/carol.png"), None],
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(dm.get_friends(self.alice.id), friends)
+
+    def test_friendship_changes_clear_both_lists(self):
+        dm.get_friends(self.alice.id)
+        self.assertEqual(dm.get_friends(self.dave.id)[0]["username"], "alice")
+
+        eve = User.objects.create(username="eve")
+        friendship = Friendship.objects.create(user=eve, friend=self.alice)
+        self.assertIn("eve", [f["username"] for f in dm.get_friends(self.alice.id)])
+        self.assertEqual([f["username"] for f in dm.get_friends(eve.id)], ["alice"])
+
+        friendship.delete()
+        Friendship.objects.get(user=self.alice, friend=self.dave).delete()
+        self.assertEqual([f["username"] for f in dm.get_friends(self.alice.id)], ["bob", "Carol"])
+        self.assertEqual(dm.get_friends(self.dave.id), [])
+        self.assertEqual(dm.get_friends(eve.id), [])
@@ -5,10 +5,14 @@ app_name = "communication"
 
 urlpatterns = [
     path("messaging/token/", views.get_twilio_token, name="get_twilio_token"),
+    path("messaging/bootstrap/", views.bootstrap, name="bootstrap"),
     path("messaging/start/<int:user_id>/", views.start_conversation, name="start_conversation"),
     path("messaging/list/", views.list_conversations, name="list_conversations"),
+    path("messaging/stream/", views.message_stream, name="message_stream"),
     path("messaging/conversation/<str:conversation_sid>/", views.conversation_view, name="conversation_view"),
     path("messaging/conversation/<str:conversation_sid>/messages/", views.get_messages, name="get_messages"),
+    path("messaging/conversation/<str:conversation_sid>/read/", views.mark_read, name="mark_read"),
     path("messaging/conversation/<str:conversation_sid>/other-user/", views.get_other_user, name="get_other_user"),
+    path("messaging/webhook/", views.twilio_webhook, name="twilio_webhook"),
     path("messaging/friends/", views.get_friends_list, name="get_friends_list"),
 ]
\ No newline at end of file
@@ -1,20 +1,34 @@
+import hashlib
+import json
+import time
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-from django.views.decorators.http import require_GET
-from django.http import JsonResponse
-from django.db.models import Q
+from django.views.decorators.http import require_GET, require_POST
+from django.conf import settings
+from django.http import (
+    JsonResponse, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.views.decorators.csrf import csrf_exempt
+from django.core.handlers.asgi import ASGIRequest
 from twilio.base.exceptions import TwilioRestException
-from accounts.models import StudentProfile, TutorProfile, Friendship
+from twilio.request_validator import RequestValidator
+from accounts.models import StudentProfile, TutorProfile
+from . import events
 from . import services as dm
 from .services import (
-    create_twilio_access_token,
+    get_cached_access_token,
     get_or_create_conversation,
     ensure_participant,
+    run_parallel,
     can_message,
-    get_twilio_client,
-    get_conversation_messages,
+    get_message_history,
     get_other_user_in_conversation,
+    get_inbox,
+    get_friends,
+    is_conversation_participant,
+    handle_webhook_event,
+    mark_conversation_read,
 )
 
 User = get_user_model()
@@ -35,6 +49,15 @@ def _get_profile_for_user_id(user_id: int):
         return sp
     return get_object_or_404(TutorProfile.objects.select_related("user"), user_id=user_id)
 
+def _token_payload(entry):
+    return {
+        "token": entry["token"],
+        "identity": entry["identity"],
+        "expires_at": entry["expires_at"],
+        "refresh_at": entry["expires_at"] - dm.TOKEN_REFRESH_MARGIN,
+        "refresh_in": max(0, int(entry["expires_at"] - time.time()) - dm.TOKEN_REFRESH_MARGIN),
+    }
+
 # ===================================================================
 # API ENDPOINTS
 # ===================================================================
@@ -42,15 +65,12 @@ def _get_profile_for_user_id(user_id: int):
 @login_required
 @require_GET
 def get_twilio_token(request):
+    """
+    Cached access token plus its expiry (epoch seconds) and how long the
+    client can wait before asking again.
+    """
     try:
-        token = create_twilio_access_token(request.user)
-        if isinstance(token, (bytes, bytearray)):
-            token = token.decode("utf-8")
-        identity = f"user_{request.user.id}"
-        return JsonResponse({
-            "token": token,
-            "identity": identity
-        })
+        return JsonResponse(_token_payload(get_cached_access_token(request.user)))
     except Exception as e:
         print(f"[get_twilio_token] Error: {e}")
         return JsonResponse({
@@ -78,9 +98,11 @@ def start_conversation(request, user_id: int):
         # Create or get conversation
         conv_sid = get_or_create_conversation(request.user.id, other.id)
         
-        # Ensure both users are participants
-        ensure_participant(conv_sid, request.user.id)
-        ensure_participant(conv_sid, other.id)
+        # Ensure both users are participants (independent calls, run together)
+        run_parallel([
+            lambda: ensure_participant(conv_sid, request.user.id),
+            lambda: ensure_participant(conv_sid, other.id),
+        ])
         
         return JsonResponse({
             "ok": True,
@@ -112,106 +134,91 @@ def start_conversation(request, user_id: int):
 @require_GET
 def list_conversations(request):
     """
-    Returns all conversations where the current user is a participant.
+    Returns all conversations where the current user is a participant,
+    most recent first, from the local inbox index.
     """
-    client = get_twilio_client()
-    identity = f"user_{request.user.id}"
-    data = []
-
     try:
-        # Get all conversations in the service
-        svc = client.conversations.v1.services(dm.CONV_SERVICE_SID)
-        all_conversations = svc.conversations.list(limit=100)
-        
-        print(f"[list_conversations] Found {len(all_conversations)} total conversations")
-        
-        # Filter for conversations where this user is a participant
-        for conv in all_conversations:
-            try:
-                # Check if user is a participant in this conversation
-                participants = conv.participants.list()
-                participant_identities = [p.identity for p in participants]
-                
-                if identity not in participant_identities:
-                    continue  # Skip this conversation
-                
-                print(f"[list_conversations] User is participant in {conv.sid}")
-                
-                # Get "other" user in this conversation (for 1-1 DMs)
-                other_user = get_other_user_in_conversation(conv.sid, request.user.id)
-                friendly_name = other_user["username"] if other_user else conv.sid
+        data = get_inbox(request.user.id)
+        return JsonResponse({"conversations": data})
 
-                # Fetch last message in this conversation
-                last_list = conv.messages.list(limit=1, order='desc')
-                last_msg = last_list[0] if last_list else None
+    except Exception as e:
+        print(f"[list_conversations] Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return JsonResponse({"conversations": []})
 
-                if last_msg:
-                    last_body = last_msg.body or ""
-                    last_author = last_msg.author
-                    last_date = last_msg.date_created.isoformat() if last_msg.date_created else None
-                else:
-                    last_body = ""
-                    last_author = None
-                    last_date = None
+@csrf_exempt
+@require_POST
+def twilio_webhook(request):
+    """
+    Conversations post-event webhook (onMessageAdded, onMediaMessage,
+    onParticipantAdded). Only requests signed with our auth token are applied.
+    """
+    signature = request.headers.get("X-Twilio-Signature", "")
+    url = getattr(settings, "TWILIO_WEBHOOK_URL", None) or request.build_absolute_uri()
 
-                data.append({
-                    "sid": conv.sid,
-                    "friendly_name": friendly_name,
-                    "other_user_id": other_user["user_id"] if other_user else None,
-                    "other_username": other_user["username"] if other_user else None,
+    if not dm.AUTH_TOKEN or not RequestValidator(dm.AUTH_TOKEN).validate(url, request.POST, signature):
+        return HttpResponseForbidden("Invalid signature")
 
-                    # Preview fields
-                    "last_message_body": last_body,
-                    "last_message_author": last_author,
-                    "last_message_date_created": last_date,
-                })
+    try:
+        handle_webhook_event(request.POST)
+    except Exception as e:
+        # Twilio retries on errors; a bad event shouldn't be retried forever
+        print(f"[twilio_webhook] Error handling {request.POST.get('EventType')}: {e}")
+    return HttpResponse(status=204)
 
-            except Exception as e:
-                print(f"[list_conversations] Error processing conversation {conv.sid}: {e}")
-                import traceback
-                traceback.print_exc()
-                continue
+async def _sse_stream(user_id: int):
+    # tell EventSource how long to wait before reconnecting
+    yield "retry: 5000\n\n"
+    async for event, data in events.get_broker().subscribe(user_id):
+        if event is None:
+            yield ": keepalive\n\n"
+        else:
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        print(f"[list_conversations] Returning {len(data)} conversations for user {request.user.id}")
-        return JsonResponse({"conversations": data})
+@require_GET
+async def message_stream(request):
+    """
+    Server-Sent Events stream of 'message' and 'inbox' events for the
+    logged-in user. Only served by the ASGI app, where each open stream is
+    a coroutine rather than a worker thread.
+    """
+    if not isinstance(request, ASGIRequest):
+        # WSGI would drain the endless stream before sending a byte and hold
+        # a worker forever; 204 stops EventSource reconnecting, and the
+        # widget polls the inbox instead
+        return HttpResponse(status=204)
 
-    except TwilioRestException as e:
-        print(f"[list_conversations] Twilio error: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({"conversations": []})
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required"}, status=401)
 
-    except Exception as e:
-        print(f"[list_conversations] Error: {e}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({"conversations": []})
+    response = StreamingHttpResponse(_sse_stream(user.id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
+
+@login_required
+@require_POST
+def mark_read(request, conversation_sid: str):
+    mark_conversation_read(conversation_sid, request.user.id)
+    return JsonResponse({"ok": True})
 
 @login_required
 @require_GET
 def conversation_view(request, conversation_sid: str):
-    client = get_twilio_client()
-    identity = f"user_{request.user.id}"
-    
     try:
-        # Fetch conversation
-        conv = client.conversations.v1.services(dm.CONV_SERVICE_SID)\
-            .conversations(conversation_sid).fetch()
-        
         # Verify user is a participant
-        participants = conv.participants.list()
-        participant_identities = [p.identity for p in participants]
-        
-        if identity not in participant_identities:
-            print(f"[conversation_view] Unauthorized access attempt by {identity}")
+        if not is_conversation_participant(conversation_sid, request.user.id):
+            print(f"[conversation_view] Unauthorized access attempt by user_{request.user.id}")
             return JsonResponse({"error": "Unauthorized"}, status=403)
         
         # Get other user info
         other_user = get_other_user_in_conversation(conversation_sid, request.user.id)
-        friendly_name = other_user['username'] if other_user else conv.sid
+        friendly_name = other_user['username'] if other_user else conversation_sid
         
         return JsonResponse({
-            "sid": conv.sid,
+            "sid": conversation_sid,
             "friendly_name": friendly_name,
             "other_user_id": other_user['user_id'] if other_user else None,
             "other_username": other_user['username'] if other_user else None,
@@ -228,30 +235,28 @@ def conversation_view(request, conversation_sid: str):
 @login_required
 @require_GET
 def get_messages(request, conversation_sid: str):
-    client = get_twilio_client()
-    identity = f"user_{request.user.id}"
-    
     try:
         # Verify user is a participant
-        conv = client.conversations.v1.services(dm.CONV_SERVICE_SID)\
-            .conversations(conversation_sid).fetch()
-        
-        participants = conv.participants.list()
-        participant_identities = [p.identity for p in participants]
-        
-        if identity not in participant_identities:
+        if not is_conversation_participant(conversation_sid, request.user.id):
             return JsonResponse({"error": "Unauthorized"}, status=403)
         
         # Get message limit from query params
         limit = int(request.GET.get('limit', 50))
         limit = min(limit, 100)  # Cap at 100
+        before = request.GET.get('before')
+        before = int(before) if before and before.isdigit() else None
         
-        # Fetch messages with media
-        messages = get_conversation_messages(conversation_sid, limit=limit)
+        # Served from the local store; Twilio only fills gaps
+        conversation = dm._resolve_conversation(conversation_sid)
+        if conversation is None:
+            return JsonResponse({"error": "Conversation not found"}, status=404)
+        messages, next_cursor = get_message_history(conversation, before=before, limit=limit)
         
         return JsonResponse({
             "messages": messages,
-            "count": len(messages)
+            "count": len(messages),
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None,
         })
         
     except TwilioRestException as e:
@@ -266,18 +271,9 @@ def get_messages(request, conversation_sid: str):
 @login_required
 @require_GET
 def get_other_user(request, conversation_sid: str):
-    client = get_twilio_client()
-    identity = f"user_{request.user.id}"
-    
     try:
         # Verify user is a participant
-        conv = client.conversations.v1.services(dm.CONV_SERVICE_SID)\
-            .conversations(conversation_sid).fetch()
-        
-        participants = conv.participants.list()
-        participant_identities = [p.identity for p in participants]
-        
-        if identity not in participant_identities:
+        if not is_conversation_participant(conversation_sid, request.user.id):
             return JsonResponse({"error": "Unauthorized"}, status=403)
         
         # Get other user from conversation attributes
@@ -336,47 +332,60 @@ def get_other_user(request, conversation_sid: str):
         traceback.print_exc()
         return JsonResponse({"error": "Internal error"}, status=500)
     
+def _friends_for(request):
+    friends = []
+    for friend in get_friends(request.user.id):
+        avatar_url = friend['avatar_url']
+        # Only build absolute URI for local files, not external URLs
+        if avatar_url and not avatar_url.startswith('http'):
+            avatar_url = request.build_absolute_uri(avatar_url)
+        friends.append(dict(friend, avatar_url=avatar_url))
+    return friends
+
 @login_required
 def get_friends_list(request):
     """
     Returns a list of all friends with their basic info.
     """
     try:
-        friendships = Friendship.objects.filter(
-            Q(user=request.user) | Q(friend=request.user)
-        ).select_related('user', 'friend')
-        
-        friends = []
-        for friendship in friendships:
-            friend_user = friendship.friend if friendship.user == request.user else friendship.user
-            
-            # Get profile for avatar
-            student_profile = getattr(friend_user, 'studentprofile', None)
-            tutor_profile = getattr(friend_user, 'tutorprofile', None)
-            profile = student_profile or tutor_profile
-            
-            # ✅ Get avatar URL and make it absolute
-            avatar_url = None
-            if profile:
-                avatar_relative = profile.avatar_url_or_default()
-                # Only build absolute URI for local files, not external URLs
-                if avatar_relative and not avatar_relative.startswith('http'):
-                    avatar_url = request.build_absolute_uri(avatar_relative)
-                else:
-                    avatar_url = avatar_relative
-            
-            friends.append({
-                'id': friend_user.id,
-                'username': friend_user.username,
-                'first_name': friend_user.first_name,
-                'last_name': friend_user.last_name,
-                'avatar_url': avatar_url,
-            })
-        
-        friends.sort(key=lambda x: x['username'].lower())
-        
-        return JsonResponse({'friends': friends})
+        return JsonResponse({'friends': _friends_for(request)})
     
     except Exception as e:
         print(f"Error getting friends list: {e}")
-        return JsonResponse({'error': str(e), 'friends': []}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e), 'friends': []}, status=500)
+
+@login_required
+@require_GET
+def bootstrap(request):
+    """
+    Everything the chat widget needs on page load in one response: access
+    token, friends and inbox. None of it calls Twilio (the token is signed
+    locally, the rest is cached or indexed reads), so it is all built in the
+    request thread. The ETag covers all three (the token by its expiry), so
+    a revalidation with nothing changed is a 304.
+    """
+    try:
+        token = get_cached_access_token(request.user)
+        friends = _friends_for(request)
+        conversations = get_inbox(request.user.id)
+    except Exception as e:
+        print(f"[bootstrap] Error: {e}")
+        return JsonResponse({"error": "Failed to load messaging data"}, status=500)
+
+    token = _token_payload(token)
+    digest = hashlib.sha1(json.dumps(
+        [token["expires_at"], friends, conversations], sort_keys=True, default=str
+    ).encode()).hexdigest()
+    etag = f'"{digest}"'
+
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse({
+            "token": token,
+            "friends": friends,
+            "conversations": conversations,
+        })
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
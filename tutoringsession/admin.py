@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import TutoringSession, SessionRequest
+from .models import ArchivedSession, ArchivedSessionRequest, SessionSeries, TutoringSession, SessionRequest
+from .services import fill_open_seats, recount_seats
 
 
 class SessionRequestInline(admin.TabularInline):
@@ -37,15 +38,25 @@ class TutoringSessionAdmin(admin.ModelAdmin):
     def seats_taken(self, obj):
         return obj.seats_taken()
     seats_taken.short_description = 'Seats Taken'
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # request statuses edited inline bypass the seat counter
+        recount_seats(form.instance.pk)
+        fill_open_seats(form.instance.pk)
 
 
 @admin.register(SessionRequest)
 class SessionRequestAdmin(admin.ModelAdmin):
-    list_display = ('student', 'session', 'status', 'created_at')
+    list_display = ('student', 'session', 'status', 'waitlist_position', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('student__username', 'session__subject', 'note')
     readonly_fields = ('created_at',)
     
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recount_seats(obj.session_id)
+    
     fieldsets = (
         ('Request Information', {
             'fields': ('session', 'student', 'note')
@@ -53,4 +64,30 @@ class SessionRequestAdmin(admin.ModelAdmin):
         ('Status', {
             'fields': ('status', 'created_at')
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(SessionSeries)
+class SessionSeriesAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'tutor', 'start_date', 'end_date', 'weekdays', 'interval_weeks', 'materialized_until')
+    list_filter = ('is_remote', 'subject', 'tutor')
+    search_fields = ('tutor__username', 'location', 'description')
+    readonly_fields = ('latitude', 'longitude', 'materialized_until', 'created_at')
+
+
+class ArchivedSessionRequestInline(admin.TabularInline):
+    model = ArchivedSessionRequest
+    extra = 0
+    fields = ('student', 'status', 'note', 'created_at')
+    readonly_fields = fields
+    can_delete = False
+
+
+@admin.register(ArchivedSession)
+class ArchivedSessionAdmin(admin.ModelAdmin):
+    list_display = ('subject_name', 'tutor', 'date', 'approved_count', 'capacity', 'archived_at')
+    list_filter = ('is_remote',)
+    search_fields = ('subject_name', 'tutor__username', 'location')
+    date_hierarchy = 'date'
+    readonly_fields = [f.name for f in ArchivedSession._meta.fields]
+    inlines = [ArchivedSessionRequestInline]
@@ -0,0 +1,103 @@
+"""
+Moving past sessions out of the hot tables.
+
+Sessions dated before the cutoff (SESSION_ARCHIVE_AFTER_DAYS ago) are copied
+with their requests into ArchivedSession / ArchivedSessionRequest and deleted,
+one batch per transaction, so the listing, seat and waitlist queries only
+ever scan current sessions. Undated sessions are never archived. The
+archive_sessions management command is meant to run daily.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedSession, ArchivedSessionRequest, SessionRequest, TutoringSession
+
+BATCH_SIZE = 500
+
+SESSION_FIELDS = [
+    "id", "tutor_id", "subject_id", "subject__name", "date", "start_time", "end_time",
+    "is_remote", "location", "description", "capacity", "approved_count", "created_at",
+]
+REQUEST_FIELDS = ["id", "session_id", "student_id", "note", "status", "created_at"]
+
+
+def archive_cutoff(today=None):
+    today = today or timezone.localdate()
+    return today - timedelta(days=getattr(settings, "SESSION_ARCHIVE_AFTER_DAYS", 30))
+
+
+def archive_sessions(cutoff=None, batch_size=BATCH_SIZE):
+    """Archive every session dated before `cutoff`. Returns the number moved."""
+    cutoff = cutoff or archive_cutoff()
+    total = 0
+    while True:
+        moved = _archive_batch(cutoff, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+def _archive_batch(cutoff, batch_size):
+    with transaction.atomic():
+        # oldest first over session_date_idx
+        sessions = list(
+            TutoringSession.objects
+            .select_for_update(of=("self",))
+            .filter(date__lt=cutoff)
+            .order_by("date", "pk")
+            .values(*SESSION_FIELDS)[:batch_size]
+        )
+        if not sessions:
+            return 0
+        session_ids = [row["id"] for row in sessions]
+
+        archived = ArchivedSession.objects.bulk_create([
+            ArchivedSession(
+                original_id=row["id"],
+                tutor_id=row["tutor_id"],
+                subject_id=row["subject_id"],
+                subject_name=row["subject__name"],
+                date=row["date"],
+                start_time=row["start_time"],
+                end_time=row["end_time"],
+                is_remote=row["is_remote"],
+                location=row["location"],
+                description=row["description"],
+                capacity=row["capacity"],
+                approved_count=row["approved_count"],
+                created_at=row["created_at"],
+            )
+            for row in sessions
+        ])
+        # not every backend returns pks from bulk_create
+        archived_ids = dict(
+            ArchivedSession.objects
+            .filter(original_id__in=[a.original_id for a in archived])
+            .values_list("original_id", "pk")
+        )
+
+        requests = SessionRequest.objects.filter(session_id__in=session_ids)
+        ArchivedSessionRequest.objects.bulk_create(
+            [
+                ArchivedSessionRequest(
+                    original_id=row["id"],
+                    session_id=archived_ids[row["session_id"]],
+                    student_id=row["student_id"],
+                    note=row["note"],
+                    status=row["status"],
+                    created_at=row["created_at"],
+                )
+                for row in requests.values(*REQUEST_FIELDS).iterator()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        # through the ORM, so the post_delete receivers (ClassStats) still
+        # run; the cascade takes the requests copied above with the sessions
+        TutoringSession.objects.filter(pk__in=session_ids).delete()
+
+    print(f"[archive] Archived {len(sessions)} sessions dated before {cutoff}")
+    return len(sessions)
@@ -0,0 +1,99 @@
+"""
+Schedule conflict checks for tutors and students.
+
+A person's schedule is loaded once (the sessions they tutor plus the ones
+they have requested, from the start of the window being checked) into a
+list sorted by start time. No session spans more than MAX_SESSION_SPAN, so
+everything overlapping [starts_at, ends_at) starts inside
+(starts_at - MAX_SESSION_SPAN, ends_at): two binary searches and a short
+scan per check, however many sessions the person has. Checking a whole
+series against one loaded index costs one query, not one per occurrence.
+"""
+from bisect import bisect_left, bisect_right
+
+from django.utils import timezone
+
+from .models import MAX_SESSION_SPAN, SessionRequest, TutoringSession
+
+# request statuses that hold a place in the student's schedule
+SCHEDULED_STATUSES = ("pending", "waitlisted", "approved")
+# entries a tutor cannot schedule over; pending/waitlisted requests only warn
+BLOCKING_KINDS = ("tutoring", "approved")
+
+
+class Busy:
+    __slots__ = ("starts_at", "ends_at", "session_id", "kind", "label")
+
+    def __init__(self, starts_at, ends_at, session_id, kind, label):
+        self.starts_at = starts_at
+        self.ends_at = ends_at
+        self.session_id = session_id
+        self.kind = kind  # "tutoring" or the request status
+        self.label = label
+
+    def __repr__(self):
+        return f"<Busy {self.kind} #{self.session_id} {self.starts_at:%Y-%m-%d %H:%M}>"
+
+
+class ScheduleIndex:
+    def __init__(self, entries=()):
+        self._entries = sorted(entries, key=lambda b: (b.starts_at, b.session_id))
+        self._starts = [b.starts_at for b in self._entries]
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def for_user(cls, user, since):
+        """Everything on `user`'s schedule that could overlap a window starting at `since`."""
+        lower = since - MAX_SESSION_SPAN
+        tutoring = (
+            TutoringSession.objects
+            .filter(tutor=user, starts_at__gt=lower)  # session_tutor_starts_idx
+            .values_list("pk", "starts_at", "ends_at", "subject__name")
+        )
+        requested = (
+            SessionRequest.objects
+            .filter(student=user, status__in=SCHEDULED_STATUSES, session__starts_at__gt=lower)
+            .values_list("session_id", "session__starts_at", "session__ends_at", "session__subject__name", "status")
+        )
+        entries = [Busy(s, e, pk, "tutoring", name) for pk, s, e, name in tutoring]
+        entries += [Busy(s, e, pk, status, name) for pk, s, e, name, status in requested]
+        return cls(entries)
+
+    def conflicts(self, starts_at, ends_at, exclude=(), kinds=None):
+        """Entries overlapping [starts_at, ends_at), soonest first."""
+        if starts_at is None or ends_at is None:
+            return []
+        lo = bisect_right(self._starts, starts_at - MAX_SESSION_SPAN)
+        hi = bisect_left(self._starts, ends_at)
+        return [
+            b for b in self._entries[lo:hi]
+            if b.ends_at > starts_at
+            and b.session_id not in exclude
+            and (kinds is None or b.kind in kinds)
+        ]
+
+    def first_conflicts(self, windows, exclude=(), kinds=None, limit=5):
+        """Check many windows (e.g. a series' occurrences); returns up to `limit` (window, busy) pairs."""
+        found = []
+        for starts_at, ends_at in windows:
+            for busy in self.conflicts(starts_at, ends_at, exclude, kinds):
+                found.append(((starts_at, ends_at), busy))
+                if len(found) >= limit:
+                    return found
+        return found
+
+
+def schedule_conflicts(user, starts_at, ends_at, exclude=(), kinds=None):
+    """One-off check of a single window against `user`'s schedule."""
+    if starts_at is None:
+        return []
+    return ScheduleIndex.for_user(user, starts_at).conflicts(starts_at, ends_at, exclude, kinds)
+
+
+def describe(busy):
+    when = timezone.localtime(busy.starts_at).strftime("%b %d, %I:%M %p")
+    if busy.kind == "tutoring":
+        return f"you're tutoring {busy.label} on {when}"
+    return f"you have a {busy.kind} request for {busy.label} on {when}"
@@ -1,5 +1,5 @@
 from django import forms
-from .models import TutoringSession
+from .models import SessionSeries, TutoringSession
 from classes.models import Class
 
 class TutoringSessionForm(forms.ModelForm):
@@ -23,4 +23,36 @@ class TutoringSessionForm(forms.ModelForm):
             "location": forms.TextInput(attrs={"class": "form-control", "placeholder": "Enter location or leave blank if remote"}),
             "is_remote": forms.CheckboxInput(attrs={"class": "form-check-input"}),
             "capacity": forms.NumberInput(attrs={"class": "form-control", "min": "1"}),
-        }
\ No newline at end of file
+        }
+
+class SeriesOptionsForm(forms.Form):
+    """Recurrence options shown under the session form"""
+    repeat = forms.BooleanField(
+        required=False, label="Repeat weekly",
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+    repeat_days = forms.TypedMultipleChoiceField(
+        required=False, coerce=int, label="On",
+        choices=SessionSeries.WEEKDAYS,
+        widget=forms.CheckboxSelectMultiple,
+        help_text="Defaults to the weekday of the first session.",
+    )
+    interval_weeks = forms.IntegerField(
+        required=False, min_value=1, max_value=8, initial=1, label="Every N weeks",
+        widget=forms.NumberInput(attrs={"class": "form-control", "min": "1", "max": "8"}),
+    )
+    repeat_until = forms.DateField(
+        required=False, label="Until",
+        widget=forms.DateInput(attrs={"type": "date", "class": "form-control"}),
+    )
+
+    def weekday_mask(self, first_date):
+        days = self.cleaned_data.get("repeat_days") or [first_date.weekday()]
+        return sum(1 << day for day in set(days))
+
+
+class ApplyToFollowingForm(forms.Form):
+    apply_to_following = forms.BooleanField(
+        required=False, label="Apply to this and following sessions in the series",
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
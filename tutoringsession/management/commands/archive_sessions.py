@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from tutoringsession.archive import BATCH_SIZE, archive_cutoff, archive_sessions
+
+
+class Command(BaseCommand):
+    help = "Move sessions older than SESSION_ARCHIVE_AFTER_DAYS, with their requests, to the archive tables. Run daily."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", type=date.fromisoformat, help="Archive sessions dated before this day (YYYY-MM-DD)")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        cutoff = options["before"] or archive_cutoff()
+        moved = archive_sessions(cutoff, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} sessions dated before {cutoff}."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from tutoringsession.series import horizon_date, materialize_all
+
+
+class Command(BaseCommand):
+    help = "Create upcoming occurrences for every recurring session series. Run daily to keep the rolling horizon filled."
+
+    def handle(self, *args, **options):
+        until = horizon_date()
+        created = materialize_all(until)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} sessions through {until}."))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_approved(apps, schema_editor):
+    TutoringSession = apps.get_model('tutoringsession', 'TutoringSession')
+    SessionRequest = apps.get_model('tutoringsession', 'SessionRequest')
+    approved = (
+        SessionRequest.objects
+        .filter(session=OuterRef('pk'), status='approved')
+        .values('session')
+        .annotate(n=Count('id'))
+        .values('n')
+    )
+    TutoringSession.objects.update(approved_count=Coalesce(Subquery(approved), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutoringsession', '0004_alter_tutoringsession_subject'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tutoringsession',
+            name='approved_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_approved, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutoringsession', '0005_tutoringsession_approved_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionrequest',
+            name='waitlist_position',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tutoringsession',
+            name='waitlist_seq',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='sessionrequest',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('waitlisted', 'Waitlisted'), ('approved', 'Approved'), ('declined', 'Declined'), ('canceled', 'Canceled')], default='pending', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='sessionrequest',
+            index=models.Index(fields=['session', 'status', 'waitlist_position'], name='sessionrequest_waitlist_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='sessionrequest',
+            constraint=models.UniqueConstraint(fields=('session', 'waitlist_position'), name='unique_waitlist_position'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0005_classstats'),
+        ('tutoringsession', '0007_sessionseries'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.PositiveIntegerField(unique=True)),
+                ('subject_name', models.CharField(max_length=200)),
+                ('date', models.DateField(blank=True, null=True)),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('is_remote', models.BooleanField(default=False)),
+                ('location', models.CharField(blank=True, max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('capacity', models.PositiveIntegerField(default=1)),
+                ('approved_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-date', '-start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSessionRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.PositiveIntegerField(unique=True)),
+                ('note', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('waitlisted', 'Waitlisted'), ('approved', 'Approved'), ('declined', 'Declined'), ('canceled', 'Canceled')], max_length=16)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tutoringsession',
+            index=models.Index(fields=['date', 'start_time'], name='session_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedsession',
+            name='subject',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_sessions', to='classes.class'),
+        ),
+        migrations.AddField(
+            model_name='archivedsession',
+            name='tutor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tutor_sessions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedsessionrequest',
+            name='session',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='requests', to='tutoringsession.archivedsession'),
+        ),
+        migrations.AddField(
+            model_name='archivedsessionrequest',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_session_requests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedsession',
+            index=models.Index(fields=['tutor', 'date'], name='archived_session_tutor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedsessionrequest',
+            index=models.Index(fields=['student', 'status'], name='archived_request_student_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:01
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# frozen copy of tutoringsession.models.session_window as of this migration
+def session_window(date, start_time, end_time):
+    if date is None:
+        return None, None
+    tz = timezone.get_default_timezone()
+    starts_at = timezone.make_aware(datetime.combine(date, start_time or time.min), tz)
+    if end_time:
+        ends_at = timezone.make_aware(datetime.combine(date, end_time), tz)
+        if start_time and end_time < start_time:
+            ends_at = timezone.make_aware(datetime.combine(date + timedelta(days=1), end_time), tz)
+    else:
+        ends_at = timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min), tz)
+    return starts_at, ends_at
+
+
+def populate_windows(apps, schema_editor):
+    TutoringSession = apps.get_model('tutoringsession', 'TutoringSession')
+    updated = []
+    for session in TutoringSession.objects.exclude(date=None).only('id', 'date', 'start_time', 'end_time').iterator():
+        session.starts_at, session.ends_at = session_window(session.date, session.start_time, session.end_time)
+        updated.append(session)
+    TutoringSession.objects.bulk_update(updated, ['starts_at', 'ends_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classes', '0005_classstats'),
+        ('tutoringsession', '0008_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tutoringsession',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tutoringsession',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_windows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tutoringsession',
+            index=models.Index(fields=['starts_at', 'ends_at'], name='session_starts_ends_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tutoringsession',
+            index=models.Index(fields=['tutor', 'starts_at'], name='session_tutor_starts_idx'),
+        ),
+    ]
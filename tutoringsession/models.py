@@ -1,8 +1,121 @@
+from datetime import datetime, time, timedelta
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from .utils import geocode_address
 from classes.models import Class  # ✅ Add this import
 
+
+def geocode_location(obj):
+    """Set obj.latitude/longitude from obj.location (sessions and series)"""
+    # Geocode only in-person sessions with a real location
+    if not obj.is_remote and obj.location and obj.location.strip():
+        # Don't geocode if location is explicitly "Remote" or similar
+        if obj.location.strip().lower() not in ['remote', 'online', 'virtual']:
+            lat, lng = geocode_address(obj.location)
+            if lat and lng:
+                obj.latitude = lat
+                obj.longitude = lng
+                print(f"✅ Geocoded '{obj.location}' to ({lat}, {lng})")
+            else:
+                print(f"⚠️ Could not geocode location: '{obj.location}'")
+                # Optionally clear coordinates if geocoding fails
+                obj.latitude = None
+                obj.longitude = None
+
+
+# session_window() never spans more than a day (25 hours across a DST change),
+# which gives overlap searches a lower bound on starts_at
+MAX_SESSION_SPAN = timedelta(hours=25)
+
+
+def session_window(date, start_time, end_time):
+    """
+    Timezone-aware (starts_at, ends_at) for a session on `date`. A blank
+    start or end time stretches to the start or end of the day, and an end
+    before the start runs past midnight. Undated sessions have no window.
+    """
+    if date is None:
+        return None, None
+    tz = timezone.get_default_timezone()
+    starts_at = timezone.make_aware(datetime.combine(date, start_time or time.min), tz)
+    if end_time:
+        ends_at = timezone.make_aware(datetime.combine(date, end_time), tz)
+        if start_time and end_time < start_time:
+            ends_at = timezone.make_aware(datetime.combine(date + timedelta(days=1), end_time), tz)
+    else:
+        ends_at = timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min), tz)
+    return starts_at, ends_at
+
+
+class SessionSeries(models.Model):
+    """
+    A weekly recurring session. Occurrences are TutoringSession rows created
+    ahead of time by services.materialize_series, up to a rolling horizon.
+    """
+    WEEKDAYS = [
+        (0, "Mon"), (1, "Tue"), (2, "Wed"), (3, "Thu"), (4, "Fri"), (5, "Sat"), (6, "Sun"),
+    ]
+
+    tutor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='session_series')
+    subject = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='session_series')
+
+    # Recurrence rule: every `interval_weeks` weeks on the `weekdays` bitmask (bit 0 = Monday)
+    weekdays = models.PositiveSmallIntegerField()
+    interval_weeks = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    start_time = models.TimeField(blank=True, null=True)
+    end_time = models.TimeField(blank=True, null=True)
+
+    # Template for every occurrence
+    is_remote = models.BooleanField(default=False)
+    capacity = models.PositiveIntegerField(default=1)
+    description = models.TextField(blank=True)
+    location = models.CharField(max_length=255, blank=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+
+    # Occurrences exist up to and including this date
+    materialized_until = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Session series'
+
+    def __str__(self):
+        days = ", ".join(label for day, label in self.WEEKDAYS if self.weekdays & (1 << day))
+        return f"{self.subject.name} every {days} ({self.tutor.username})"
+
+    def occurrence_dates(self, start, end):
+        """Dates of the rule falling in [start, end], in order."""
+        start = max(start, self.start_date)
+        if self.end_date:
+            end = min(end, self.end_date)
+        # weeks are counted from the Monday of the series' first week
+        anchor = self.start_date - timedelta(days=self.start_date.weekday())
+        day = start
+        while day <= end:
+            week = (day - anchor).days // 7
+            if week % self.interval_weeks == 0 and self.weekdays & (1 << day.weekday()):
+                yield day
+            day += timedelta(days=1)
+
+    def save(self, *args, **kwargs):
+        """Geocode the shared location once for every occurrence"""
+        location_changed = True
+        if self.pk:
+            old = SessionSeries.objects.filter(pk=self.pk).values('location', 'is_remote').first()
+            location_changed = old is None or (old['location'], old['is_remote']) != (self.location, self.is_remote)
+        if location_changed:
+            geocode_location(self)
+        if self.is_remote:
+            self.latitude = None
+            self.longitude = None
+        super().save(*args, **kwargs)
+
+
 class TutoringSession(models.Model):
     # Main fields
     tutor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tutor_sessions')
@@ -15,11 +128,19 @@ class TutoringSession(models.Model):
     start_time = models.TimeField(blank=True, null=True)
     end_time = models.TimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True, blank=True, null=True)
+    # date + times as one range, set by save(); every listing filter uses these
+    starts_at = models.DateTimeField(null=True, blank=True, editable=False)
+    ends_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     # Additional fields
     is_remote = models.BooleanField(default=False)
     capacity = models.PositiveIntegerField(default=1)
+    # approved requests; only changed by the conditional UPDATEs in services.py
+    approved_count = models.PositiveIntegerField(default=0, editable=False)
+    # last waitlist position handed out; positions only ever grow
+    waitlist_seq = models.PositiveIntegerField(default=0, editable=False)
     description = models.TextField(blank=True)
+    series = models.ForeignKey(SessionSeries, on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences')
 
     # Location fields
     location = models.CharField(max_length=255, blank=True)
@@ -28,15 +149,23 @@ class TutoringSession(models.Model):
 
     class Meta:
         ordering = ['-date', 'start_time']
+        indexes = [
+            # upcoming listing and the archive sweep are range scans on date
+            models.Index(fields=['date', 'start_time'], name='session_date_idx'),
+            models.Index(fields=['series', 'date'], name='session_series_date_idx'),
+            # upcoming / day / window filters: starts_at range, ends_at checked from the index
+            models.Index(fields=['starts_at', 'ends_at'], name='session_starts_ends_idx'),
+            models.Index(fields=['tutor', 'starts_at'], name='session_tutor_starts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.subject.name} - {self.date} ({self.tutor.username})"
     
     def seats_taken(self):
-        return self.requests.filter(status="approved").count()
+        return self.approved_count
 
     def is_full(self):
-        return self.seats_taken() >= self.capacity
+        return self.approved_count >= self.capacity
     
     def save(self, *args, **kwargs):
         """
@@ -57,32 +186,30 @@ class TutoringSession(models.Model):
         else:  # New session
             location_changed = True
         
-        # Geocode if location changed and session is not remote
-        if location_changed and not self.is_remote and self.location and self.location.strip():
-            # Don't geocode if location is explicitly "Remote" or similar
-            if self.location.strip().lower() not in ['remote', 'online', 'virtual']:
-                lat, lng = geocode_address(self.location)
-                if lat and lng:
-                    self.latitude = lat
-                    self.longitude = lng
-                    print(f"✅ Geocoded '{self.location}' to ({lat}, {lng})")
-                else:
-                    print(f"⚠️ Could not geocode location: '{self.location}'")
-                    # Optionally clear coordinates if geocoding fails
-                    self.latitude = None
-                    self.longitude = None
+        if location_changed:
+            geocode_location(self)
         
         # Clear coordinates if marked as remote
         if self.is_remote:
             self.latitude = None
             self.longitude = None
         
+        self.starts_at, self.ends_at = session_window(self.date, self.start_time, self.end_time)
+        
+        # Never write back a stale seat count over a concurrent reservation
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in ('approved_count', 'waitlist_seq')
+            ]
+        
         super().save(*args, **kwargs)
 
 
 class SessionRequest(models.Model):
     STATUS = [
         ("pending", "Pending"),
+        ("waitlisted", "Waitlisted"),
         ("approved", "Approved"),
         ("declined", "Declined"),
         ("canceled", "Canceled"),
@@ -91,11 +218,77 @@ class SessionRequest(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name="session_requests")
     note = models.TextField(blank=True)
     status = models.CharField(max_length=16, choices=STATUS, default="pending")
+    # set only while waitlisted; the lowest position is promoted first
+    waitlist_position = models.PositiveIntegerField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("session", "student")
         ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["session", "waitlist_position"], name="unique_waitlist_position"),
+        ]
+        indexes = [
+            # head of a session's waitlist is one index seek
+            models.Index(fields=["session", "status", "waitlist_position"], name="sessionrequest_waitlist_idx"),
+        ]
+
+    def waitlist_rank(self):
+        """1-based place in line, counted over the index."""
+        if self.status != "waitlisted" or self.waitlist_position is None:
+            return None
+        return SessionRequest.objects.filter(
+            session_id=self.session_id, status="waitlisted",
+            waitlist_position__lt=self.waitlist_position,
+        ).count() + 1
+
+    def __str__(self):
+        return f"{self.student.username} -> {self.session} [{self.status}]"
+
+
+# ------------------------------------
+# Archive: past sessions moved out of the hot tables by archive.py
+# ------------------------------------
+class ArchivedSession(models.Model):
+    original_id = models.PositiveIntegerField(unique=True)
+    tutor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_tutor_sessions')
+    # kept if the class is later deleted
+    subject = models.ForeignKey(Class, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_sessions')
+    subject_name = models.CharField(max_length=200)
+    date = models.DateField(null=True, blank=True)
+    start_time = models.TimeField(blank=True, null=True)
+    end_time = models.TimeField(blank=True, null=True)
+    is_remote = models.BooleanField(default=False)
+    location = models.CharField(max_length=255, blank=True)
+    description = models.TextField(blank=True)
+    capacity = models.PositiveIntegerField(default=1)
+    approved_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', '-start_time']
+        indexes = [
+            models.Index(fields=['tutor', 'date'], name='archived_session_tutor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject_name} with {self.tutor.username} on {self.date} (archived)"
+
+
+class ArchivedSessionRequest(models.Model):
+    original_id = models.PositiveIntegerField(unique=True)
+    session = models.ForeignKey(ArchivedSession, on_delete=models.CASCADE, related_name="requests")
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name="archived_session_requests")
+    note = models.TextField(blank=True)
+    status = models.CharField(max_length=16, choices=SessionRequest.STATUS)
+    created_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["student", "status"], name="archived_request_student_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.student.username} -> {self.session} [{self.status}]"
\ No newline at end of file
+        return f"{self.student.username} -> {self.session} [{self.status}]"
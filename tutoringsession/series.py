@@ -0,0 +1,133 @@
+"""
+Recurring sessions: turning a SessionSeries into TutoringSession rows.
+
+Occurrences are created in bulk up to SESSION_SERIES_HORIZON_DAYS ahead,
+copying the series' already-geocoded location, so a semester of weekly
+sessions costs one geocode and one INSERT. The materialize_series command
+extends every series' horizon and is meant to run daily.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import SessionSeries, TutoringSession, geocode_location, session_window
+from . import services as seats
+
+# fields copied from the series onto each occurrence
+TEMPLATE_FIELDS = [
+    "tutor_id", "subject_id", "start_time", "end_time", "is_remote",
+    "capacity", "description", "location", "latitude", "longitude",
+]
+
+# fields "this and following" edits may change
+EDITABLE_FIELDS = {
+    "subject", "start_time", "end_time", "is_remote", "capacity", "description", "location",
+}
+
+
+def horizon_date(today=None):
+    today = today or timezone.localdate()
+    return today + timedelta(days=getattr(settings, "SESSION_SERIES_HORIZON_DAYS", 56))
+
+
+def materialize_series(series, until=None):
+    """
+    Create the occurrences between the last materialized date and `until`
+    (default: the rolling horizon). Returns the sessions created.
+    """
+    until = until or horizon_date()
+    if series.end_date:
+        until = min(until, series.end_date)
+    start = series.start_date
+    if series.materialized_until:
+        start = max(start, series.materialized_until + timedelta(days=1))
+    if start > until:
+        return []
+
+    template = {field: getattr(series, field) for field in TEMPLATE_FIELDS}
+    occurrences = []
+    for day in series.occurrence_dates(start, until):
+        starts_at, ends_at = session_window(day, series.start_time, series.end_time)
+        occurrences.append(TutoringSession(
+            series=series, date=day, starts_at=starts_at, ends_at=ends_at, **template,
+        ))
+
+    with transaction.atomic():
+        # bulk_create skips TutoringSession.save(), so no per-row geocoding
+        created = TutoringSession.objects.bulk_create(occurrences)
+        SessionSeries.objects.filter(pk=series.pk).update(materialized_until=until)
+        series.materialized_until = until
+        if created:
+            _refresh_class_stats_on_commit(series.subject_id)
+    return created
+
+
+def materialize_all(until=None):
+    """Extend every open-ended or unfinished series to the horizon."""
+    until = until or horizon_date()
+    unfinished = (
+        SessionSeries.objects
+        .filter(Q(materialized_until__isnull=True) | Q(materialized_until__lt=until))
+        .filter(Q(end_date__isnull=True) | Q(materialized_until__isnull=True) | Q(end_date__gt=F("materialized_until")))
+    )
+    total = 0
+    for series in unfinished.iterator():
+        total += len(materialize_series(series, until))
+    return total
+
+
+def update_following(occurrence, since=None, **changes):
+    """
+    Apply `changes` to `occurrence` and every occurrence of its series dated
+    from `since` on (default: the occurrence's stored date; pass the date
+    from before the edit if it has been moved) with one UPDATE, and to the
+    series so future occurrences match. A new location is geocoded at most
+    once: when `occurrence` has already been saved with it (as the edit
+    view does) its coordinates are reused. Returns the number of sessions
+    updated.
+    """
+    series = occurrence.series
+    unknown = set(changes) - EDITABLE_FIELDS
+    if series is None or unknown:
+        raise ValueError(f"Cannot apply {sorted(unknown) or 'changes'} to following occurrences")
+
+    if since is None:
+        since = TutoringSession.objects.filter(pk=occurrence.pk).values_list("date", flat=True).first()
+    old_subject_id = series.subject_id
+    for field, value in changes.items():
+        setattr(series, field, value)
+    if "location" in changes or "is_remote" in changes:
+        if (occurrence.location, occurrence.is_remote) == (series.location, series.is_remote):
+            series.latitude, series.longitude = occurrence.latitude, occurrence.longitude
+        else:
+            geocode_location(series)
+        if series.is_remote:
+            series.latitude = series.longitude = None
+        changes["latitude"], changes["longitude"] = series.latitude, series.longitude
+
+    with transaction.atomic():
+        # a plain UPDATE, since SessionSeries.save() would geocode again
+        SessionSeries.objects.filter(pk=series.pk).update(**changes)
+        following = TutoringSession.objects.filter(Q(date__gte=since) | Q(pk=occurrence.pk), series=series)
+        updated = following.update(**changes)
+        if "start_time" in changes or "end_time" in changes:
+            # the window depends on each row's date
+            windows = []
+            for session in following.only("pk", "date", "start_time", "end_time"):
+                session.starts_at, session.ends_at = session_window(session.date, session.start_time, session.end_time)
+                windows.append(session)
+            TutoringSession.objects.bulk_update(windows, ["starts_at", "ends_at"], batch_size=500)
+        if "capacity" in changes:
+            # raised capacity goes to each session's waitlist
+            for session_id in following.values_list("pk", flat=True):
+                seats.fill_open_seats(session_id)
+        _refresh_class_stats_on_commit(series.subject_id, old_subject_id)
+    return updated
+
+
+def _refresh_class_stats_on_commit(*subject_ids):
+    from classes.models import _refresh_stats_on_commit
+    _refresh_stats_on_commit(*subject_ids)
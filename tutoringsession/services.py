@@ -0,0 +1,278 @@
+"""
+Seat bookkeeping for tutoring sessions.
+
+TutoringSession.approved_count is only ever changed here, by conditional
+UPDATEs that the database applies atomically: a seat is taken with
+"approved_count = approved_count + 1 WHERE approved_count < capacity" and a
+request changes state with "WHERE status = <expected>". Two tutors (or two
+clicks) racing for the last seat cannot both win, on SQLite or a server
+database, and no row is ever read and written back.
+
+Full sessions keep a waitlist ordered by SessionRequest.waitlist_position.
+Whenever a seat frees up (an approved request is declined or canceled, or
+capacity is raised) the head of the line is promoted in the same
+transaction; finding the head is one seek on the waitlist index.
+"""
+import random
+import time
+
+from django.db import OperationalError, transaction
+from django.db.models import F
+
+from .models import SessionRequest, TutoringSession
+
+# outcomes of approve_request()
+APPROVED = "approved"
+FULL = "full"
+ALREADY_DECIDED = "already_decided"
+
+# SQLite reports a busy database immediately in some modes; retry briefly
+LOCK_RETRIES = 20
+
+
+class RequestStateChanged(Exception):
+    """The request was decided by someone else mid-transaction."""
+
+
+def _with_lock_retry(fn):
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return fn()
+        except OperationalError as e:
+            if "locked" not in str(e) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(random.uniform(0.005, 0.02) * (attempt + 1))
+
+
+def _refresh_stats(session_id):
+    from classes.stats import refresh_class_stats
+
+    def refresh_subject():
+        subject_id = TutoringSession.objects.filter(pk=session_id).values_list("subject_id", flat=True).first()
+        if subject_id:
+            refresh_class_stats([subject_id])
+
+    def refresh():
+        # runs after commit: an error here must not look like a failed booking
+        try:
+            _with_lock_retry(refresh_subject)
+        except Exception as e:
+            # counters are repaired by refresh_class_stats; never fail the booking
+            print(f"[seats] Could not refresh class stats for session {session_id}: {e}")
+
+    transaction.on_commit(refresh)
+
+
+def _reserve_seat(session_id):
+    return TutoringSession.objects.filter(
+        pk=session_id, approved_count__lt=F("capacity"),
+    ).update(approved_count=F("approved_count") + 1)
+
+
+def _release_seat(session_id):
+    return TutoringSession.objects.filter(
+        pk=session_id, approved_count__gt=0,
+    ).update(approved_count=F("approved_count") - 1)
+
+
+def _lock_sessions(session_ids):
+    """
+    Row-lock sessions before touching their requests, so every path takes
+    locks in the same order (a no-op on SQLite, which has one writer).
+    """
+    return list(
+        TutoringSession.objects.select_for_update()
+        .filter(pk__in=list(session_ids))
+        .values_list("pk", "capacity", "approved_count")
+    )
+
+
+def approve_request(req):
+    """
+    Approve a pending request if the session has a free seat. Returns
+    APPROVED, FULL or ALREADY_DECIDED; exactly one concurrent caller can
+    take any given seat.
+    """
+    def attempt():
+        try:
+            with transaction.atomic():
+                if not _reserve_seat(req.session_id):
+                    still_pending = SessionRequest.objects.filter(pk=req.pk, status="pending").exists()
+                    return FULL if still_pending else ALREADY_DECIDED
+                if not SessionRequest.objects.filter(pk=req.pk, status="pending").update(status="approved"):
+                    raise RequestStateChanged  # give the seat back
+                _refresh_stats(req.session_id)
+                return APPROVED
+        except RequestStateChanged:
+            return ALREADY_DECIDED
+
+    outcome = _with_lock_retry(attempt)
+    if outcome == APPROVED:
+        req.status = "approved"
+    return outcome
+
+
+def set_request_status(req, status, expected=None):
+    """
+    Move a request to `status` ("declined" or "canceled"), giving its seat
+    back if it was approved (which promotes the waitlist). `expected` limits
+    which current statuses may be changed. Returns True if this call
+    changed the request.
+    """
+    def attempt():
+        with transaction.atomic():
+            _lock_sessions([req.session_id])
+            current = SessionRequest.objects.filter(pk=req.pk).values_list("status", flat=True).first()
+            if current is None or current == status or (expected and current not in expected):
+                return False
+            changed = SessionRequest.objects.filter(pk=req.pk, status=current).update(
+                status=status, waitlist_position=None,
+            )
+            if changed and current == "approved":
+                _release_seat(req.session_id)
+                _promote_waitlist(req.session_id)
+                _refresh_stats(req.session_id)
+            return bool(changed)
+
+    changed = _with_lock_retry(attempt)
+    if changed:
+        req.status = status
+    return changed
+
+
+def join_waitlist(session_id, student, note=""):
+    """Create a waitlisted request at the back of the session's line."""
+    def attempt():
+        with transaction.atomic():
+            TutoringSession.objects.filter(pk=session_id).update(waitlist_seq=F("waitlist_seq") + 1)
+            # our UPDATE holds the row, so nobody else can be handed this number
+            position = TutoringSession.objects.filter(pk=session_id).values_list("waitlist_seq", flat=True).get()
+            return SessionRequest.objects.create(
+                session_id=session_id, student=student, note=note,
+                status="waitlisted", waitlist_position=position,
+            )
+
+    return _with_lock_retry(attempt)
+
+
+def _promote_waitlist(session_id):
+    """
+    Move waitlisted requests into free seats, head of the line first. Must
+    run inside a transaction. Returns the promoted request ids.
+    """
+    promoted = []
+    while _reserve_seat(session_id):
+        head = (
+            SessionRequest.objects
+            .filter(session_id=session_id, status="waitlisted")
+            .order_by("waitlist_position")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if head is None:
+            _release_seat(session_id)
+            break
+        claimed = SessionRequest.objects.filter(pk=head, status="waitlisted").update(
+            status="approved", waitlist_position=None,
+        )
+        if not claimed:
+            _release_seat(session_id)  # taken by a concurrent cancel; look again
+            continue
+        promoted.append(head)
+    return promoted
+
+
+def fill_open_seats(session_id):
+    """Promote from the waitlist after capacity changes. Returns promoted ids."""
+    def attempt():
+        with transaction.atomic():
+            _lock_sessions([session_id])
+            promoted = _promote_waitlist(session_id)
+            if promoted:
+                _refresh_stats(session_id)
+            return promoted
+
+    return _with_lock_retry(attempt)
+
+
+def bulk_decide(tutor, request_ids, status):
+    """
+    Approve or decline many requests on the tutor's sessions in one
+    transaction. Approvals are granted oldest-first up to each session's
+    free seats. Returns {"approved", "declined", "full", "skipped"} lists of
+    request ids; "skipped" covers ids that are not the tutor's or were
+    already decided.
+    """
+    if status not in ("approved", "declined"):
+        raise ValueError(f"Unsupported bulk status: {status}")
+    request_ids = {int(i) for i in request_ids}
+
+    def attempt():
+        summary = {"approved": [], "declined": [], "full": [], "skipped": []}
+        with transaction.atomic():
+            session_ids = set(
+                SessionRequest.objects
+                .filter(pk__in=request_ids, session__tutor=tutor)
+                .values_list("session_id", flat=True)
+            )
+            # one query for every session's seat state
+            free = {
+                session_id: max(capacity - taken, 0)
+                for session_id, capacity, taken in _lock_sessions(session_ids)
+            }
+            rows = (
+                SessionRequest.objects
+                .filter(pk__in=request_ids, session_id__in=session_ids)
+                .order_by("created_at", "pk")
+                .values_list("pk", "session_id", "status")
+            )
+            by_session = {}
+            for pk, session_id, current in rows:
+                by_session.setdefault(session_id, []).append((pk, current))
+            found = {pk for reqs in by_session.values() for pk, _ in reqs}
+            summary["skipped"] += sorted(request_ids - found)
+
+            for session_id, reqs in by_session.items():
+                if status == "approved":
+                    _bulk_approve(session_id, reqs, free[session_id], summary)
+                else:
+                    _bulk_decline(session_id, reqs, summary)
+        return summary
+
+    return _with_lock_retry(attempt)
+
+
+def _bulk_approve(session_id, reqs, free, summary):
+    # the session is locked, so these statuses cannot change under us
+    pending = [pk for pk, current in reqs if current == "pending"]
+    summary["skipped"] += [pk for pk, current in reqs if current != "pending"]
+    grant = pending[:free]
+    summary["full"] += pending[free:]
+    if not grant:
+        return
+    approved = SessionRequest.objects.filter(pk__in=grant, status="pending").update(status="approved")
+    TutoringSession.objects.filter(pk=session_id).update(approved_count=F("approved_count") + approved)
+    summary["approved"] += grant
+    _refresh_stats(session_id)
+
+
+def _bulk_decline(session_id, reqs, summary):
+    open_ids = [pk for pk, current in reqs if current in ("pending", "waitlisted")]
+    seated_ids = [pk for pk, current in reqs if current == "approved"]
+    summary["skipped"] += [pk for pk, current in reqs if current not in ("pending", "waitlisted", "approved")]
+
+    if open_ids:
+        SessionRequest.objects.filter(pk__in=open_ids).update(status="declined", waitlist_position=None)
+    if seated_ids:
+        SessionRequest.objects.filter(pk__in=seated_ids).update(status="declined")
+        TutoringSession.objects.filter(pk=session_id).update(approved_count=F("approved_count") - len(seated_ids))
+        _promote_waitlist(session_id)
+        _refresh_stats(session_id)
+    summary["declined"] += open_ids + seated_ids
+
+
+def recount_seats(session_id):
+    """Recompute approved_count from the requests (admin edits, repairs)."""
+    approved = SessionRequest.objects.filter(session_id=session_id, status="approved").count()
+    TutoringSession.objects.filter(pk=session_id).update(approved_count=approved)
+    return approved
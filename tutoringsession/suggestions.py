@@ -0,0 +1,129 @@
+"""
+Suggest weekly time slots for a group session in a class.
+
+Every student with a StudentClassSkill for the class and a declared
+WeeklyAvailability counts, weighted by need (skill level 1 counts most).
+For a session of `length` slots a student "fits" start slot s when they are
+free for all of s..s+length-1, which for the whole week is `length - 1`
+shifted ANDs of their bitset. Per-slot totals are kept bit-sliced: plane i
+holds bit i of every slot's running total, so adding a student's fits to
+all 672 counters at once is a ripple-carry of big-int AND/XORs. Scoring
+thousands of students stays in the low milliseconds.
+"""
+from accounts.availability import SLOT_MINUTES, SLOTS_PER_DAY, decode_mask, slot_time
+from accounts.models import StudentClassSkill, WeeklyAvailability
+
+# need weight per skill level: students who need help count most
+NEED_WEIGHTS = {1: 5, 2: 4, 3: 3, 4: 2, 5: 1}
+DEFAULT_LENGTH_MINUTES = 60
+
+
+class SlotCounter:
+    """672 counters updated in parallel, one bitplane per bit of the count."""
+
+    def __init__(self):
+        self.planes = []
+
+    def add(self, bits, weight=1):
+        # adding bits * weight is adding `bits` at every plane where weight has a 1
+        plane = 0
+        while weight:
+            if weight & 1:
+                self._add_at(bits, plane)
+            weight >>= 1
+            plane += 1
+
+    def _add_at(self, carry, plane):
+        while carry:
+            while plane >= len(self.planes):
+                self.planes.append(0)
+            self.planes[plane], carry = self.planes[plane] ^ carry, self.planes[plane] & carry
+            plane += 1
+
+    def count(self, slot):
+        return sum(((p >> slot) & 1) << i for i, p in enumerate(self.planes))
+
+
+def _valid_starts(length):
+    """Start slots whose whole session ends the same day."""
+    day = (1 << (SLOTS_PER_DAY - length + 1)) - 1
+    return sum(day << (d * SLOTS_PER_DAY) for d in range(7))
+
+
+def fitting_starts(mask, length):
+    """Start slots where `mask` is free for `length` consecutive slots."""
+    fits = mask
+    for shift in range(1, length):
+        fits &= mask >> shift
+    return fits & _valid_starts(length)
+
+
+def suggest_slots(class_id, tutor=None, length_minutes=DEFAULT_LENGTH_MINUTES, limit=5):
+    """
+    The best non-overlapping weekly slots for a session of `length_minutes`
+    in `class_id`, restricted to the tutor's availability when they have
+    declared one. Returns dicts with weekday, start/end time, score
+    (need-weighted) and students (how many can attend), best first.
+    """
+    length = max(1, -(-length_minutes // SLOT_MINUTES))
+    if length > SLOTS_PER_DAY:
+        return []
+
+    weights = dict(
+        StudentClassSkill.objects
+        .filter(class_taken_id=class_id)
+        .values_list("student__user_id", "skill_level")
+    )
+    masks = (
+        WeeklyAvailability.objects
+        .filter(user_id__in=list(weights))
+        .values_list("user_id", "slots")
+        .iterator()
+    )
+
+    score, students = SlotCounter(), SlotCounter()
+    for user_id, slots in masks:
+        fits = fitting_starts(decode_mask(slots), length)
+        if fits:
+            score.add(fits, NEED_WEIGHTS.get(weights[user_id], 1))
+            students.add(fits)
+
+    candidates = _valid_starts(length)
+    if tutor is not None:
+        tutor_slots = WeeklyAvailability.objects.filter(user=tutor).values_list("slots", flat=True).first()
+        tutor_mask = decode_mask(tutor_slots)
+        if tutor_mask:  # a missing or empty row means "not declared"
+            candidates &= fitting_starts(tutor_mask, length)
+
+    # only slots someone fits can score; everything else is 0
+    anyone = 0
+    for plane in score.planes:
+        anyone |= plane
+    candidates &= anyone
+
+    ranked = []
+    while candidates:
+        low = candidates & -candidates
+        slot = low.bit_length() - 1
+        candidates ^= low
+        ranked.append((score.count(slot), students.count(slot), slot))
+    ranked.sort(key=lambda r: (-r[0], -r[1], r[2]))
+
+    picked = []
+    for s, n, slot in ranked:
+        if any(abs(slot - other) < length for _, _, other in picked):
+            continue  # overlaps a better suggestion
+        picked.append((s, n, slot))
+        if len(picked) == limit:
+            break
+
+    return [
+        {
+            "weekday": slot // SLOTS_PER_DAY,
+            "start_time": slot_time(slot),
+            "end_time": slot_time(slot + length),
+            "score": s,
+            "students": n,
+        }
+        for s, n, slot in picked
+    ]
@@ -1,3 +1,507 @@
-from django.test import TestCase
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import DatabaseError, OperationalError, connection
+from django.db.models.query import QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from accounts.availability import blocks_to_mask
+from accounts.models import StudentClassSkill, StudentProfile, WeeklyAvailability
+from classes.models import Class
+from . import services as seats
+from .archive import archive_sessions
+from .conflicts import BLOCKING_KINDS, ScheduleIndex, schedule_conflicts
+from .suggestions import SlotCounter, suggest_slots
+from .models import ArchivedSession, ArchivedSessionRequest, SessionRequest, SessionSeries, TutoringSession, session_window
+from .series import materialize_series, update_following
+
+
+def _make_session(capacity, students):
+    tutor = User.objects.create(username="tutor")
+    subject = Class.objects.create(name="TEST 1000 - Seat Reservations")
+    session = TutoringSession.objects.create(
+        tutor=tutor, subject=subject, capacity=capacity, is_remote=True,
+        date=datetime.date.today() + datetime.timedelta(days=1),
+    )
+    requests = [
+        SessionRequest.objects.create(
+            session=session, student=User.objects.create(username=f"student{i}"),
+        )
+        for i in range(students)
+    ]
+    return session, requests
+
+
+def _in_thread(fn):
+    """Run fn on its own DB connection, closing it afterwards."""
+    def run(*args):
+        try:
+            return fn(*args)
+        finally:
+            connection.close()
+    return run
+
+
+class SeatReservationTests(TestCase):
+    def test_approve_until_full(self):
+        session, requests = _make_session(capacity=2, students=3)
+
+        outcomes = [seats.approve_request(r) for r in requests]
+
+        self.assertEqual(outcomes, [seats.APPROVED, seats.APPROVED, seats.FULL])
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 2)
+        self.assertTrue(session.is_full())
+        self.assertEqual(SessionRequest.objects.get(pk=requests[2].pk).status, "pending")
+
+    def test_cancel_gives_seat_back(self):
+        session, requests = _make_session(capacity=1, students=2)
+        seats.approve_request(requests[0])
+
+        self.assertTrue(seats.set_request_status(requests[0], "canceled"))
+        self.assertEqual(seats.approve_request(requests[1]), seats.APPROVED)
+        self.assertEqual(seats.approve_request(requests[0]), seats.ALREADY_DECIDED)
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 1)
+
+    def test_session_edit_keeps_seat_count(self):
+        session, requests = _make_session(capacity=2, students=1)
+        stale = TutoringSession.objects.get(pk=session.pk)
+        seats.approve_request(requests[0])
+
+        stale.description = "Bring a laptop"
+        stale.save()
+
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 1)
+
+
+class ConcurrentSeatReservationTests(TransactionTestCase):
+    def test_parallel_approvals_never_overbook(self):
+        session, requests = _make_session(capacity=3, students=24)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            outcomes = list(pool.map(_in_thread(seats.approve_request), requests))
+
+        self.assertEqual(outcomes.count(seats.APPROVED), 3)
+        self.assertEqual(outcomes.count(seats.FULL), 21)
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 3)
+        self.assertEqual(session.requests.filter(status="approved").count(), 3)
+
+    def test_parallel_clicks_on_one_request(self):
+        session, requests = _make_session(capacity=5, students=1)
+        copies = [SessionRequest.objects.get(pk=requests[0].pk) for _ in range(10)]
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            outcomes = list(pool.map(_in_thread(seats.approve_request), copies))
+
+        self.assertEqual(outcomes.count(seats.APPROVED), 1)
+        self.assertEqual(outcomes.count(seats.ALREADY_DECIDED), 9)
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 1)
+
+    def test_stats_refresh_failing_after_commit_keeps_the_approval(self):
+        # the refresh runs once the booking has committed; a locked database
+        # there must not send approve_request back round its retry loop
+        session, requests = _make_session(capacity=2, students=1)
+        locked = OperationalError("database table is locked")
+        with mock.patch.object(seats, "LOCK_RETRIES", 2), \
+                mock.patch.object(QuerySet, "first", side_effect=locked):
+            outcome = seats.approve_request(requests[0])
+
+        self.assertEqual(outcome, seats.APPROVED)
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 1)
+
+
+class WaitlistTests(TestCase):
+    def test_cancel_promotes_head_of_waitlist(self):
+        session, requests = _make_session(capacity=1, students=1)
+        seats.approve_request(requests[0])
+        first = seats.join_waitlist(session.id, User.objects.create(username="late1"))
+        second = seats.join_waitlist(session.id, User.objects.create(username="late2"))
+        self.assertEqual((first.waitlist_rank(), second.waitlist_rank()), (1, 2))
+
+        seats.set_request_status(requests[0], "canceled")
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, first.waitlist_position), ("approved", None))
+        self.assertEqual((second.status, second.waitlist_rank()), ("waitlisted", 1))
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 1)
+
+    def test_raising_capacity_fills_from_waitlist(self):
+        session, _ = _make_session(capacity=0, students=0)
+        waiting = [seats.join_waitlist(session.id, User.objects.create(username=f"w{i}")) for i in range(3)]
+
+        session.capacity = 2
+        session.save()
+        promoted = seats.fill_open_seats(session.id)
+
+        self.assertEqual(promoted, [waiting[0].pk, waiting[1].pk])
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 2)
+        self.assertEqual(SessionRequest.objects.get(pk=waiting[2].pk).status, "waitlisted")
+
+
+class BulkDecisionTests(TestCase):
+    def test_bulk_approve_respects_capacity(self):
+        session, requests = _make_session(capacity=2, students=4)
+        seats.set_request_status(requests[3], "declined")
+        ids = [r.pk for r in requests]
+
+        summary = seats.bulk_decide(session.tutor, ids + [999999], "approved")
+
+        self.assertEqual(summary["approved"], ids[:2])
+        self.assertEqual(summary["full"], [ids[2]])
+        self.assertEqual(sorted(summary["skipped"]), sorted([ids[3], 999999]))
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 2)
+
+    def test_bulk_decline_frees_seats_for_waitlist(self):
+        session, requests = _make_session(capacity=1, students=2)
+        seats.approve_request(requests[0])
+        waiting = seats.join_waitlist(session.id, User.objects.create(username="late"))
+
+        summary = seats.bulk_decide(session.tutor, [requests[0].pk, requests[1].pk], "declined")
+
+        self.assertEqual(sorted(summary["declined"]), sorted([requests[0].pk, requests[1].pk]))
+        self.assertEqual(SessionRequest.objects.get(pk=waiting.pk).status, "approved")
+        session.refresh_from_db()
+        self.assertEqual(session.approved_count, 1)
+
+    def test_other_tutors_requests_are_skipped(self):
+        session, requests = _make_session(capacity=5, students=1)
+        stranger = User.objects.create(username="stranger")
+
+        summary = seats.bulk_decide(stranger, [requests[0].pk], "approved")
+
+        self.assertEqual(summary["skipped"], [requests[0].pk])
+        self.assertEqual(SessionRequest.objects.get(pk=requests[0].pk).status, "pending")
+
+
+class SessionSeriesTests(TestCase):
+    def _make_series(self, **kwargs):
+        monday = datetime.date(2030, 1, 7)
+        return SessionSeries.objects.create(
+            tutor=User.objects.create(username="tutor"),
+            subject=Class.objects.create(name="TEST 1000 - Series"),
+            weekdays=0b101,  # Monday and Wednesday
+            start_date=monday, is_remote=True, capacity=3,
+            **kwargs,
+        )
+
+    def test_materialize_up_to_horizon_once(self):
+        series = self._make_series()
+        until = series.start_date + datetime.timedelta(days=13)
+
+        created = materialize_series(series, until)
+
+        self.assertEqual([s.date.day for s in created], [7, 9, 14, 16])
+        self.assertEqual(series.occurrences.count(), 4)
+        self.assertEqual(materialize_series(series, until), [])
+
+    def test_update_following_leaves_earlier_occurrences(self):
+        series = self._make_series(end_date=datetime.date(2030, 1, 16))
+        first, second, *rest = materialize_series(series, datetime.date(2030, 2, 1))
+
+        updated = update_following(second, description="Room changed", capacity=5)
+
+        self.assertEqual(updated, 1 + len(rest))
+        self.assertEqual(TutoringSession.objects.get(pk=first.pk).capacity, 3)
+        self.assertEqual(
+            set(series.occurrences.filter(date__gte=second.date).values_list("description", "capacity")),
+            {("Room changed", 5)},
+        )
+        series.refresh_from_db()
+        self.assertEqual(series.capacity, 5)
+
+    def test_location_edit_geocodes_once(self):
+        series = self._make_series(end_date=datetime.date(2030, 1, 16))
+        first, second, *rest = materialize_series(series, datetime.date(2030, 2, 1))
+
+        # what edit_session does: save the occurrence, then spread the edit
+        with mock.patch("tutoringsession.models.geocode_address", return_value=(33.78, -84.40)) as geocode:
+            second.is_remote, second.location = False, "Library room 2"
+            second.save()
+            update_following(second, is_remote=False, location="Library room 2")
+        self.assertEqual(geocode.call_count, 1)
+
+        series.refresh_from_db()
+        self.assertEqual((float(series.latitude), float(series.longitude)), (33.78, -84.40))
+        self.assertEqual(
+            {(s.location, float(s.latitude)) for s in series.occurrences.filter(date__gte=second.date)},
+            {("Library room 2", 33.78)},
+        )
+        self.assertIsNone(TutoringSession.objects.get(pk=first.pk).latitude)
+
+    def test_subject_change_moves_series_and_following(self):
+        series = self._make_series(end_date=datetime.date(2030, 1, 16))
+        first, second, *rest = materialize_series(series, datetime.date(2030, 2, 1))
+        other = Class.objects.create(name="TEST 1001 - Series Moved")
+
+        update_following(second, subject=other)
+
+        series.refresh_from_db()
+        self.assertEqual(series.subject, other)
+        self.assertEqual(set(series.occurrences.values_list("date", "subject_id")), {
+            (first.date, first.subject_id), *((s.date, other.pk) for s in [second, *rest]),
+        })
+
+    def _edit_following(self, occurrence, **fields):
+        data = {
+            "description": "", "date": occurrence.date, "start_time": "", "end_time": "",
+            "location": "", "is_remote": "on", "capacity": 3,
+            "subject": occurrence.subject_id, "apply_to_following": "on", **fields,
+        }
+        self.client.force_login(occurrence.tutor)
+        return self.client.post(reverse("tutoringsession:edit", args=[occurrence.pk]), data)
+
+    def test_moving_an_occurrence_later_still_edits_those_in_between(self):
+        series = self._make_series(end_date=datetime.date(2030, 1, 16))
+        first, *rest = materialize_series(series, datetime.date(2030, 2, 1))
+
+        # the 7th moves past the 9th; the 9th is still "following"
+        response = self._edit_following(first, date="2030-01-10", description="New room")
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            sorted(series.occurrences.values_list("date", "description")),
+            [(datetime.date(2030, 1, day), "New room") for day in (9, 10, 14, 16)],
+        )
+
+    def test_moving_an_occurrence_later_checks_those_in_between(self):
+        series = self._make_series(end_date=datetime.date(2030, 1, 16))
+        first, second, *rest = materialize_series(series, datetime.date(2030, 2, 1))
+        TutoringSession.objects.create(
+            tutor=series.tutor, subject=series.subject, is_remote=True, date=second.date,
+        )
+
+        response = self._edit_following(first, date="2030-01-10", description="New room")
+
+        self.assertEqual(response.status_code, 200)  # the clash on the 9th is reported
+        self.assertEqual(TutoringSession.objects.get(pk=first.pk).date, first.date)
+        self.assertFalse(series.occurrences.filter(description="New room").exists())
+
+    def test_failed_update_leaves_the_series_alone(self):
+        series = self._make_series(end_date=datetime.date(2030, 1, 16))
+        first, second, *rest = materialize_series(series, datetime.date(2030, 2, 1))
+        real_update = QuerySet.update
+
+        def fail_on_sessions(qs, **kwargs):
+            if qs.model is TutoringSession:
+                raise DatabaseError("disk I/O error")
+            return real_update(qs, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", autospec=True, side_effect=fail_on_sessions):
+            with self.assertRaises(DatabaseError):
+                update_following(second, description="Never applied")
+        series.refresh_from_db()
+        self.assertEqual(series.description, "")
+
+
+class ArchiveTests(TestCase):
+    def test_archive_moves_old_sessions_with_requests(self):
+        session, requests = _make_session(capacity=2, students=2)
+        seats.approve_request(requests[0])
+        recent = TutoringSession.objects.create(
+            tutor=session.tutor, subject=session.subject, is_remote=True,
+            date=datetime.date.today(),
+        )
+        TutoringSession.objects.filter(pk=session.pk).update(date=datetime.date(2020, 1, 6))
+
+        with mock.patch("classes.stats.refresh_class_stats") as refresh, \
+                self.captureOnCommitCallbacks(execute=True):
+            moved = archive_sessions(cutoff=datetime.date.today(), batch_size=1)
+        # the delete signals ran, so the class's stats were refreshed, once
+        refresh.assert_called_once_with({session.subject_id})
+
+        self.assertEqual(moved, 1)
+        self.assertEqual(list(TutoringSession.objects.values_list("pk", flat=True)), [recent.pk])
+        self.assertFalse(SessionRequest.objects.exists())
+        archived = ArchivedSession.objects.get(original_id=session.pk)
+        self.assertEqual((archived.subject_name, archived.approved_count), (session.subject.name, 1))
+        self.assertEqual(
+            set(ArchivedSessionRequest.objects.values_list("original_id", "session_id", "status")),
+            {(requests[0].pk, archived.pk, "approved"), (requests[1].pk, archived.pk, "pending")},
+        )
+
+
+class SessionWindowTests(TestCase):
+    def test_blank_and_overnight_times(self):
+        day = datetime.date(2030, 3, 1)
+
+        starts_at, ends_at = session_window(day, None, None)
+        self.assertEqual((starts_at.hour, ends_at.date()), (0, datetime.date(2030, 3, 2)))
+
+        starts_at, ends_at = session_window(day, datetime.time(22), datetime.time(1))
+        self.assertEqual(ends_at - starts_at, datetime.timedelta(hours=3))
+        self.assertEqual(session_window(None, datetime.time(9), None), (None, None))
+
+    def test_listing_filters_use_the_window(self):
+        session, _ = _make_session(capacity=2, students=0)
+        session.date = datetime.date(2030, 3, 1)
+        session.start_time, session.end_time = datetime.time(22), datetime.time(1)
+        session.save()
+
+        def listed(**params):
+            response = self.client.get(reverse("tutoringsession:index"), params)
+            return [s.pk for s in response.context["sessions"]]
+
+        self.assertEqual(listed(), [session.pk])
+        self.assertEqual(listed(date="2030-03-01"), [session.pk])
+        # still running just after midnight
+        self.assertEqual(listed(date="2030-03-02", time="00:30"), [session.pk])
+        self.assertEqual(listed(date="2030-03-01", time="21:00"), [])
+
+
+class ScheduleConflictTests(TestCase):
+    def _at(self, day, start, end):
+        session, _ = _make_session(capacity=1, students=0)
+        session.date, session.start_time, session.end_time = day, datetime.time(start), datetime.time(end)
+        session.save()
+        return session
+
+    def test_overlap_edges_and_exclude(self):
+        day = datetime.date(2030, 3, 1)
+        session = self._at(day, 10, 12)
+
+        def clashes(start, end, **kwargs):
+            window = session_window(day, datetime.time(start), datetime.time(end))
+            return [b.session_id for b in schedule_conflicts(session.tutor, *window, **kwargs)]
+
+        self.assertEqual(clashes(11, 13), [session.pk])
+        self.assertEqual(clashes(12, 13), [])  # back to back is fine
+        self.assertEqual(clashes(8, 10), [])
+        self.assertEqual(clashes(9, 14, exclude={session.pk}), [])
+
+    def test_series_checked_against_one_index(self):
+        tutor = User.objects.create(username="busy")
+        subject = Class.objects.create(name="TEST 1000 - Conflicts")
+        first = datetime.date(2030, 3, 4)
+        for week in range(200):
+            TutoringSession.objects.create(
+                tutor=tutor, subject=subject, is_remote=True,
+                date=first + datetime.timedelta(weeks=week),
+                start_time=datetime.time(15), end_time=datetime.time(16),
+            )
+        index = ScheduleIndex.for_user(tutor, session_window(first, None, None)[0])
+        windows = [
+            session_window(first + datetime.timedelta(days=d), datetime.time(15, 30), datetime.time(17))
+            for d in range(0, 70)
+        ]
+
+        with self.assertNumQueries(0):
+            found = index.first_conflicts(windows, kinds=BLOCKING_KINDS, limit=100)
+
+        self.assertEqual(len(index), 200)
+        self.assertEqual(len(found), 10)  # one Monday a week
+
+    def test_create_session_blocks_double_booking(self):
+        session = self._at(datetime.date(2030, 3, 1), 10, 12)
+        self.client.force_login(session.tutor)
+
+        response = self.client.post(reverse("tutoringsession:create"), {
+            "subject": session.subject_id, "date": "2030-03-01",
+            "start_time": "11:00", "end_time": "13:00", "is_remote": "on", "capacity": 1,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].non_field_errors())
+        self.assertEqual(TutoringSession.objects.filter(tutor=session.tutor).count(), 1)
+
+
+class SlotSuggestionTests(TestCase):
+    def test_slot_counter_adds_weighted_bitsets(self):
+        counter = SlotCounter()
+        counter.add(0b0110, weight=5)
+        counter.add(0b0011, weight=3)
+        counter.add(0b0010)
+
+        self.assertEqual([counter.count(slot) for slot in range(4)], [3, 9, 5, 0])
+
+    def test_suggests_slot_covering_most_need(self):
+        subject = Class.objects.create(name="TEST 1000 - Suggestions")
+        # Monday 9-11 for everyone; Tuesday 14-15 for the students who need help
+        people = [("a", 1, [(0, 36, 44), (1, 56, 60)]), ("b", 1, [(0, 36, 44), (1, 56, 60)]),
+                  ("c", 5, [(0, 36, 44)]), ("d", 5, [(0, 40, 44)]), ("e", 3, [])]
+        for name, level, blocks in people:
+            user = User.objects.create(username=name)
+            profile = StudentProfile.objects.create(user=user)
+            StudentClassSkill.objects.create(student=profile, class_taken=subject, skill_level=level)
+            availability = WeeklyAvailability(user=user)
+            availability.mask = blocks_to_mask(blocks)
+            availability.save()
+
+        best = suggest_slots(subject.id, length_minutes=60, limit=3)
+
+        # 9:15-10:15 also scores 11 but overlaps the 10:00 pick
+        self.assertEqual(
+            [(s["weekday"], s["start_time"], s["students"], s["score"]) for s in best],
+            [(0, datetime.time(10), 4, 12), (0, datetime.time(9), 3, 11), (1, datetime.time(14), 2, 10)],
+        )
+
+    def test_tutor_with_empty_availability_is_not_restricted(self):
+        subject = Class.objects.create(name="TEST 1001 - Empty Tutor Availability")
+        student = User.objects.create(username="student")
+        profile = StudentProfile.objects.create(user=student)
+        StudentClassSkill.objects.create(student=profile, class_taken=subject, skill_level=1)
+        availability = WeeklyAvailability(user=student)
+        availability.mask = blocks_to_mask([(0, 36, 40)])
+        availability.save()
+        # the row an unsaved or all-blank availability form leaves behind
+        tutor = User.objects.create(username="tutor")
+        WeeklyAvailability.objects.create(user=tutor)
+
+        best = suggest_slots(subject.id, tutor=tutor, length_minutes=60)
+
+        self.assertEqual([(s["weekday"], s["start_time"]) for s in best], [(0, datetime.time(9))])
+
+
+class MyRequestsTests(TestCase):
+    def _request_sessions(self, student, count, day):
+        tutor = User.objects.create(username=f"tutor{day}")
+        subject = Class.objects.create(name=f"My Requests {'past' if day < 0 else 'upcoming'} {abs(day)}")
+        for _ in range(count):
+            session = TutoringSession.objects.create(
+                tutor=tutor, subject=subject, capacity=1, is_remote=True,
+                date=datetime.date.today() + datetime.timedelta(days=day),
+            )
+            SessionRequest.objects.create(session=session, student=student)
+
+    def _get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("tutoringsession:my_requests"))
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_requests(self):
+        student = User.objects.create(username="student")
+        self.client.force_login(student)
+        self._request_sessions(student, 2, day=3)
+        self._request_sessions(student, 1, day=-3)
+        _, few = self._get()
+
+        self._request_sessions(student, 8, day=5)
+        self._request_sessions(student, 6, day=-5)
+        response, many = self._get()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context["pending"]), 10)
+        self.assertEqual(response.context["past_page"].paginator.count, 7)
+
+    def test_waitlist_rank_in_list(self):
+        session, _ = _make_session(capacity=0, students=0)
+        seats.join_waitlist(session.id, User.objects.create(username="first"))
+        student = User.objects.create(username="second")
+        seats.join_waitlist(session.id, student)
+        self.client.force_login(student)
+
+        response, _ = self._get()
+
+        self.assertEqual([r.rank for r in response.context["waitlisted"]], [2])
@@ -10,6 +10,8 @@ urlpatterns = [
     path("dashboard/", views.tutor_dashboard, name="dashboard"),
     # CREATE
     path("create/", views.create_session, name="create"),
+    # SUGGESTED TIMES (from student availability)
+    path("suggest-times/", views.suggest_times, name="suggest_times"),
     # DETAIL
     path("<int:session_id>/", views.session_detail, name="detail"),
     # EDIT
@@ -25,9 +27,12 @@ urlpatterns = [
     # APPROVE / DECLINE 
     path("request/<int:request_id>/approve/", views.approve_request, name="approve_request"),
     path("request/<int:request_id>/decline/", views.decline_request, name="decline_request"),
+    path("requests/bulk/", views.bulk_update_requests, name="bulk_update_requests"),
     # MY REQUESTS
     path("my-requests/", views.my_requests, name="my_requests"),
     # CANCEL REQUEST
     path("request/<int:request_id>/cancel/", views.cancel_request, name="cancel_request"),
+    # PAST SESSIONS (archive)
+    path("history/", views.session_history, name="history"),
 
 ]
@@ -1,22 +1,37 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
-from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.core.paginator import Paginator
+from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+from django.db.models import Count, F, OuterRef, Q, Subquery
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from accounts.models import Friendship, StudentClassSkill
-from .models import TutoringSession, SessionRequest
+from .models import ArchivedSession, ArchivedSessionRequest, SessionSeries, TutoringSession, SessionRequest, MAX_SESSION_SPAN, session_window
+from . import services as seats
+from .series import EDITABLE_FIELDS, horizon_date, materialize_series, update_following
+from .conflicts import BLOCKING_KINDS, ScheduleIndex, describe, schedule_conflicts
+from .suggestions import DEFAULT_LENGTH_MINUTES, suggest_slots
+from accounts.availability import WEEKDAY_NAMES
 from django.contrib.auth.models import User
 from accounts.models import TutorProfile, StudentProfile
 import json
 from tutoringsession.utils import haversine
-from .forms import TutoringSessionForm
-from classes.models import Class
+from .forms import ApplyToFollowingForm, SeriesOptionsForm, TutoringSessionForm
+from classes.models import Class, ClassStats
+from classes.stats import classes_needing_tutors
 
 
 REMOTE_TOKENS = {"remote", "online"}
 
+# ?when= listing windows, in days from the start of today
+WHEN_WINDOWS = {"today": 1, "week": 7}
+# past requests / archived sessions per page
+HISTORY_PAGE_SIZE = 20
+
 def _parse_time(s: str):
     if not s:
         return None
@@ -29,7 +44,9 @@ def _parse_time(s: str):
     return None
 
 def index(request):
-    qs = TutoringSession.objects.select_related("tutor", "subject").all()
+    qs = TutoringSession.objects.select_related("tutor", "subject").order_by(
+        F("starts_at").asc(nulls_last=True), "pk",
+    )
 
     # --- basic text filters ---
     subject = (request.GET.get("subject") or "").strip()
@@ -52,22 +69,50 @@ def index(request):
         else:
             qs = qs.filter(location__icontains=location)
 
-    # --- date ---
+    # --- date / time / window (range scans on session_starts_ends_idx) ---
     date_str = (request.GET.get("date") or "").strip()
+    day = None
     if date_str:
         try:
-            qs = qs.filter(date=datetime.strptime(date_str, "%Y-%m-%d").date())
+            day = datetime.strptime(date_str, "%Y-%m-%d").date()
         except ValueError:
             pass
 
-    # --- time containment ---
     time_str = (request.GET.get("time") or "").strip()
     t = _parse_time(time_str)
-    if t is not None:
+
+    when = (request.GET.get("when") or "").strip()
+    if when not in WHEN_WINDOWS:
+        when = ""
+
+    if day and t is not None:
+        # sessions running at that moment
+        at = timezone.make_aware(datetime.combine(day, t), timezone.get_default_timezone())
         qs = qs.filter(
-            Q(start_time__isnull=True) | Q(end_time__isnull=True) |
-            (Q(start_time__lte=t) & Q(end_time__gte=t))
+            starts_at__gte=at - MAX_SESSION_SPAN, starts_at__lte=at, ends_at__gte=at,
         )
+    elif day:
+        day_start, day_end = session_window(day, None, None)
+        qs = qs.filter(starts_at__gte=day_start, starts_at__lt=day_end)
+    else:
+        today_start, _ = session_window(timezone.localdate(), None, None)
+        if when:
+            # sessions overlapping [today, today + N days)
+            window_end = today_start + timedelta(days=WHEN_WINDOWS[when])
+            qs = qs.filter(
+                starts_at__gte=today_start - MAX_SESSION_SPAN, starts_at__lt=window_end,
+                ends_at__gt=today_start,
+            )
+        else:
+            # ✅ Upcoming only; past sessions live on the history page
+            qs = qs.filter(Q(starts_at__gte=today_start) | Q(starts_at__isnull=True))
+
+        # time of day on any date: checked on the rows the range above selected
+        if t is not None:
+            qs = qs.filter(
+                Q(start_time__isnull=True) | Q(end_time__isnull=True) |
+                (Q(start_time__lte=t) & Q(end_time__gte=t))
+            )
 
     # --- capacity type ---
     capacity_type = (request.GET.get("capacity_type") or "").strip()
@@ -78,10 +123,8 @@ def index(request):
 
     include_full = request.GET.get("include_full") == "1"
     if not include_full:
-        qs = [s for s in qs]
-        qs = [s for s in qs if not s.is_full()]
-    else:
-        qs = list(qs)
+        qs = qs.filter(approved_count__lt=F("capacity"))
+    qs = list(qs)
 
     # --- Get user's location for distance calculations ---
     user_lat = None
@@ -131,6 +174,7 @@ def index(request):
             "location": location,
             "date": date_str,
             "time": time_str,
+            "when": when,
             "capacity_type": capacity_type,
             "include_full": "1" if include_full else "0",
         }
@@ -159,17 +203,22 @@ def friends_sessions(request):
 def request_session(request, session_id):
     session = get_object_or_404(TutoringSession, id=session_id)
 
-    if session.is_full():
-        messages.error(request, "Sorry, this session is already full.")
-        return redirect("tutoringsession:index")
-
     existing = SessionRequest.objects.filter(session=session, student=request.user).first()
     if existing:
         messages.info(request, f"You already have a request ({existing.status}).")
+    elif session.is_full():
+        # ✅ Full sessions take a waitlist; a freed seat promotes the head of the line
+        req = seats.join_waitlist(session.id, request.user)
+        messages.info(request, f"This session is full. You're #{req.waitlist_rank()} on the waitlist.")
     else:
         SessionRequest.objects.create(session=session, student=request.user, status="pending")
         messages.success(request, "Request sent!")
 
+    if not existing:
+        # ✅ Overlaps only warn: pending requests may never be approved
+        for busy in schedule_conflicts(request.user, session.starts_at, session.ends_at, exclude={session.id}):
+            messages.warning(request, f"Heads up: this overlaps another session ({describe(busy)}).")
+
     return redirect("tutoringsession:index")
 
 @login_required
@@ -180,14 +229,13 @@ def approve_request(request, request_id):
         messages.error(request, "You cannot approve requests for this session.")
         return redirect("tutoringsession:dashboard")
 
-    if req.session.is_full():
+    outcome = seats.approve_request(req)
+    if outcome == seats.FULL:
         messages.error(request, "This session is full.")
-        return redirect("tutoringsession:detail", req.session.id)
-
-    req.status = "approved"
-    req.save()
-
-    messages.success(request, f"{req.student.username} has been approved!")
+    elif outcome == seats.ALREADY_DECIDED:
+        messages.info(request, f"The request from {req.student.username} was already handled.")
+    else:
+        messages.success(request, f"{req.student.username} has been approved!")
     return redirect("tutoringsession:detail", req.session.id)
 
 
@@ -199,24 +247,117 @@ def decline_request(request, request_id):
         messages.error(request, "You cannot decline requests for this session.")
         return redirect("tutoringsession:dashboard")
 
-    req.status = "declined"
-    req.save()
+    seats.set_request_status(req, "declined")
 
     messages.info(request, f"Request from {req.student.username} declined.")
     return redirect("tutoringsession:detail", req.session.id)
 
+@login_required
+@require_POST
+def bulk_update_requests(request):
+    """
+    Approve or decline several requests at once (session detail and dashboard).
+    Returns a JSON summary for fetch() callers, otherwise redirects back.
+    """
+    status = request.POST.get("status", "")
+    request_ids = [i for i in request.POST.getlist("request_ids") if i.isdigit()]
+    wants_json = "application/json" in request.headers.get("Accept", "")
+
+    if status not in ("approved", "declined") or not request_ids:
+        if wants_json:
+            return JsonResponse({"error": "Choose at least one request and an action."}, status=400)
+        messages.error(request, "Choose at least one request and an action.")
+        return redirect(_safe_next(request, "tutoringsession:dashboard"))
+
+    summary = seats.bulk_decide(request.user, request_ids, status)
+    if wants_json:
+        return JsonResponse(summary)
+
+    if summary["approved"]:
+        messages.success(request, f"Approved {len(summary['approved'])} request(s).")
+    if summary["declined"]:
+        messages.info(request, f"Declined {len(summary['declined'])} request(s).")
+    if summary["full"]:
+        messages.error(request, f"{len(summary['full'])} request(s) not approved: session full.")
+    if summary["skipped"]:
+        messages.info(request, f"{len(summary['skipped'])} request(s) were already handled.")
+    return redirect(_safe_next(request, "tutoringsession:dashboard"))
+
+
+def _safe_next(request, default):
+    next_url = request.POST.get("next", "")
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return next_url
+    return default
+
+
 @login_required
 def my_requests(request):
-    requests_qs = SessionRequest.objects.filter(student=request.user).select_related("session")
+    now = timezone.now()
+    requests_qs = (
+        SessionRequest.objects
+        .filter(student=request.user)
+        .select_related("session__subject", "session__tutor")
+    )
 
-    pending = requests_qs.filter(status="pending").order_by("session__date", "session__start_time")
-    approved = requests_qs.filter(status="approved").order_by("session__date", "session__start_time")
-    declined = requests_qs.filter(status="declined").order_by("session__date", "session__start_time")
+    # ✅ One query for everything still ahead, split by status in Python
+    upcoming = (
+        requests_qs
+        .filter(Q(session__ends_at__gte=now) | Q(session__ends_at__isnull=True))
+        .annotate(
+            # place in line, computed in the same query
+            rank=Subquery(
+                SessionRequest.objects
+                .filter(
+                    session_id=OuterRef("session_id"), status="waitlisted",
+                    waitlist_position__lte=OuterRef("waitlist_position"),
+                )
+                .values("session_id")
+                .annotate(n=Count("pk"))
+                .values("n")
+            )
+        )
+        .order_by(F("session__starts_at").asc(nulls_last=True), "pk")
+    )
+    groups = {"pending": [], "waitlisted": [], "approved": [], "declined": []}
+    for r in upcoming:
+        if r.status in groups:
+            groups[r.status].append(r)
+
+    # long histories are paged; older sessions move on to the archive
+    past = (
+        requests_qs
+        .filter(session__ends_at__lt=now)
+        .exclude(status="canceled")
+        .order_by("-session__starts_at", "-pk")
+    )
+    past_page = Paginator(past, HISTORY_PAGE_SIZE).get_page(request.GET.get("page"))
 
     return render(request, "tutoringsession/my_requests.html", {
-        "pending": pending,
-        "approved": approved,
-        "declined": declined,
+        **groups,
+        "past_page": past_page,
+    })
+
+@login_required
+def session_history(request):
+    """Past sessions the user tutored or attended, read from the archive."""
+    tutored = (
+        ArchivedSession.objects
+        .filter(tutor=request.user)
+        .order_by("-date", "-start_time")
+    )
+    attended = (
+        ArchivedSessionRequest.objects
+        .filter(student=request.user, status="approved")
+        .select_related("session__tutor")
+        .order_by("-session__date", "-session__start_time")
+    )
+    tutored_page = Paginator(tutored, HISTORY_PAGE_SIZE).get_page(request.GET.get("tutored_page"))
+    attended_page = Paginator(attended, HISTORY_PAGE_SIZE).get_page(request.GET.get("attended_page"))
+
+    return render(request, "tutoringsession/history.html", {
+        "tutored_page": tutored_page,
+        "attended_page": attended_page,
     })
 
 @login_required
@@ -227,8 +368,7 @@ def cancel_request(request, request_id):
         messages.error(request, "This request cannot be canceled.")
         return redirect("tutoringsession:my_requests")
 
-    req.status = "canceled"
-    req.save()
+    seats.set_request_status(req, "canceled", expected={"pending", "waitlisted", "approved"})
 
     messages.success(request, "Your request has been canceled.")
     return redirect("tutoringsession:my_requests")
@@ -285,32 +425,109 @@ def search_students(request):
         }
     })
 
+def _reject_clashes(request, form, windows, exclude=()):
+    """Add form errors for windows overlapping the tutor's schedule; True if any."""
+    windows = [w for w in windows if w[0] is not None]
+    if not windows:
+        return False
+    index = ScheduleIndex.for_user(request.user, min(starts_at for starts_at, _ in windows))
+    clashes = index.first_conflicts(windows, exclude=exclude, kinds=BLOCKING_KINDS)
+    for (starts_at, _), busy in clashes:
+        form.add_error(None, f"{timezone.localtime(starts_at):%b %d, %I:%M %p} overlaps your schedule: {describe(busy)}.")
+    if clashes:
+        messages.error(request, 'This time conflicts with your schedule.')
+    return bool(clashes)
+
+@login_required
+def suggest_times(request):
+    """Weekly slots that suit the most students in a class (create-session helper)."""
+    if not hasattr(request.user, "tutorprofile"):
+        return JsonResponse({"error": "Only tutors can request suggestions."}, status=403)
+
+    class_id = (request.GET.get("class_id") or "").strip()
+    if not class_id.isdigit():
+        return JsonResponse({"error": "class_id is required."}, status=400)
+    try:
+        minutes = min(max(int(request.GET.get("minutes") or DEFAULT_LENGTH_MINUTES), 15), 240)
+    except ValueError:
+        minutes = DEFAULT_LENGTH_MINUTES
+
+    slots = suggest_slots(int(class_id), tutor=request.user, length_minutes=minutes)
+    return JsonResponse({
+        "slots": [
+            {
+                "weekday": slot["weekday"],
+                "weekday_name": WEEKDAY_NAMES[slot["weekday"]],
+                "start_time": slot["start_time"].strftime("%H:%M"),
+                "end_time": slot["end_time"].strftime("%H:%M"),
+                "score": slot["score"],
+                "students": slot["students"],
+            }
+            for slot in slots
+        ]
+    })
+
 @login_required
 def create_session(request):
     if request.method == 'POST':
         form = TutoringSessionForm(request.POST)
+        series_form = SeriesOptionsForm(request.POST, prefix='series')
         
         class_id = request.POST.get('subject', '').strip()
         
         if not class_id or not class_id.isdigit():
             messages.error(request, 'Please select a class.')
-            classes = list(Class.objects.values('id', 'name'))
             return render(request, 'tutoringsession/create_session.html', {
                 'form': form,
-                'classes': classes,
+                'series_form': series_form,
             })
         
         try:
             selected_class = Class.objects.get(id=int(class_id))
         except Class.DoesNotExist:
             messages.error(request, 'Invalid class selected.')
-            classes = list(Class.objects.values('id', 'name'))
             return render(request, 'tutoringsession/create_session.html', {
                 'form': form,
-                'classes': classes,
+                'series_form': series_form,
             })
         
-        if form.is_valid():
+        if form.is_valid() and series_form.is_valid():
+            data = form.cleaned_data
+            series = None
+            if series_form.cleaned_data['repeat'] and data.get('date'):
+                # ✅ Weekly series: one geocode, occurrences created in bulk
+                series = SessionSeries(
+                    tutor=request.user,
+                    subject=selected_class,
+                    weekdays=series_form.weekday_mask(data['date']),
+                    interval_weeks=series_form.cleaned_data.get('interval_weeks') or 1,
+                    start_date=data['date'],
+                    end_date=series_form.cleaned_data.get('repeat_until'),
+                    start_time=data.get('start_time'),
+                    end_time=data.get('end_time'),
+                    is_remote=data.get('is_remote', False),
+                    capacity=data.get('capacity') or 1,
+                    description=data.get('description', ''),
+                    location=data.get('location', ''),
+                )
+                dates = series.occurrence_dates(series.start_date, series.end_date or horizon_date())
+            else:
+                dates = [data.get('date')]
+            
+            # ✅ Don't double-book the tutor
+            windows = [session_window(day, data.get('start_time'), data.get('end_time')) for day in dates]
+            if _reject_clashes(request, form, windows):
+                return render(request, 'tutoringsession/create_session.html', {
+                    'form': form,
+                    'series_form': series_form,
+                })
+            
+            if series is not None:
+                series.save()
+                created = materialize_series(series)
+                messages.success(request, f'Recurring session created with {len(created)} upcoming occurrences!')
+                return redirect('tutoringsession:dashboard')
+            
             session = form.save(commit=False)
             session.tutor = request.user
             session.subject = selected_class
@@ -321,11 +538,11 @@ def create_session(request):
             messages.error(request, 'Please correct the errors below.')
     else:
         form = TutoringSessionForm()
+        series_form = SeriesOptionsForm(prefix='series')
     
-    classes = list(Class.objects.values('id', 'name'))
     return render(request, 'tutoringsession/create_session.html', {
         'form': form,
-        'classes': classes,
+        'series_form': series_form,
     })
 
 
@@ -334,18 +551,20 @@ def edit_session(request, session_id):
     session = get_object_or_404(TutoringSession, id=session_id, tutor=request.user)
     
     if request.method == 'POST':
+        # binding the form edits `session` in place; "following" means from its stored date
+        stored_date = session.date
         form = TutoringSessionForm(request.POST, instance=session)
+        apply_form = ApplyToFollowingForm(request.POST)
         
         class_id = request.POST.get('subject', '').strip()
         
         if not class_id or not class_id.isdigit():
             messages.error(request, 'Please select a class.')
-            classes = list(Class.objects.values('id', 'name'))
             current_class = {'id': session.subject.id, 'name': session.subject.name}
             return render(request, 'tutoringsession/edit_session.html', {
                 'form': form,
+                'apply_form': apply_form,
                 'session': session,
-                'classes': classes,
                 'current_class': current_class,
             })
         
@@ -353,33 +572,58 @@ def edit_session(request, session_id):
             selected_class = Class.objects.get(id=int(class_id))
         except Class.DoesNotExist:
             messages.error(request, 'Invalid class selected.')
-            classes = list(Class.objects.values('id', 'name'))
             current_class = {'id': session.subject.id, 'name': session.subject.name}
             return render(request, 'tutoringsession/edit_session.html', {
                 'form': form,
+                'apply_form': apply_form,
                 'session': session,
-                'classes': classes,
                 'current_class': current_class,
             })
         
-        if form.is_valid():
+        if form.is_valid() and apply_form.is_valid():
             session = form.save(commit=False)
             session.subject = selected_class
+            following = session.series_id and stored_date and apply_form.cleaned_data['apply_to_following']
+            occurrences = [(session.pk, session.date)]
+            if following:
+                occurrences += (
+                    TutoringSession.objects
+                    .filter(series_id=session.series_id, date__gte=stored_date)
+                    .exclude(pk=session.pk)
+                    .values_list('pk', 'date')
+                )
+            windows = [session_window(day, session.start_time, session.end_time) for _, day in occurrences]
+            if _reject_clashes(request, form, windows, exclude={pk for pk, _ in occurrences}):
+                return render(request, 'tutoringsession/edit_session.html', {
+                    'form': form,
+                    'apply_form': apply_form,
+                    'session': session,
+                    'current_class': {'id': selected_class.id, 'name': selected_class.name},
+                })
             session.save()
-            messages.success(request, 'Session updated successfully!')
+            # raised capacity goes to the waitlist first
+            seats.fill_open_seats(session.id)
+            if following:
+                # ✅ One UPDATE for this and every later occurrence
+                updated = update_following(
+                    session, since=stored_date, **{f: getattr(session, f) for f in EDITABLE_FIELDS}
+                )
+                messages.success(request, f'Updated {updated} sessions in this series!')
+            else:
+                messages.success(request, 'Session updated successfully!')
             return redirect('tutoringsession:dashboard')
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
         form = TutoringSessionForm(instance=session)
+        apply_form = ApplyToFollowingForm()
     
-    classes = list(Class.objects.values('id', 'name'))
     current_class = {'id': session.subject.id, 'name': session.subject.name}
     
     return render(request, 'tutoringsession/edit_session.html', {
         'form': form,
+        'apply_form': apply_form,
         'session': session,
-        'classes': classes,
         'current_class': current_class,
     })
 
@@ -406,10 +650,30 @@ def tutor_dashboard(request):
         messages.error(request, "You must be a tutor to access this page.")
         return redirect("tutoringsession:index")
 
-    sessions = TutoringSession.objects.filter(tutor=request.user).order_by("date", "start_time")
+    sessions = TutoringSession.objects.filter(tutor=request.user).order_by(F("starts_at").asc(nulls_last=True), "pk")
+    pending_requests = (
+        SessionRequest.objects
+        .filter(session__tutor=request.user, status="pending")
+        .select_related("student", "session__subject")
+        .order_by("session__date", "created_at")
+    )
+
+    # ✅ Recommendations read the precomputed ClassStats counters
+    my_class_ids = list(request.user.tutorprofile.classes.values_list("id", flat=True))
+    class_demand = (
+        ClassStats.objects
+        .filter(class_obj_id__in=my_class_ids, students_needing_help__gt=0)
+        .select_related("class_obj")
+        .order_by("-students_needing_help", "open_seats")[:5]
+    )
+    suggested_classes = classes_needing_tutors(limit=5 + len(my_class_ids))
+    suggested_classes = [c for c in suggested_classes if c.class_obj_id not in my_class_ids][:5]
 
     return render(request, "tutoringsession/dashboard.html", {
-        "sessions": sessions
+        "sessions": sessions,
+        "pending_requests": pending_requests,
+        "class_demand": class_demand,
+        "suggested_classes": suggested_classes,
     })
 
 @login_required